@@ -0,0 +1,29 @@
+"""Add transaction filter indexes
+
+Revision ID: 4e8a1c6f0b92
+Revises: 9d2f4b7c1e35
+Create Date: 2026-10-17 14:21:48.305117
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4e8a1c6f0b92"
+down_revision: str | None = "9d2f4b7c1e35"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_user_category_date", "transactions", ["user_id", "category_id", "date"], unique=False)
+    op.create_index("idx_user_currency_date", "transactions", ["user_id", "currency", "date"], unique=False)
+    op.create_index("idx_user_amount", "transactions", ["user_id", "amount"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_user_amount", table_name="transactions")
+    op.drop_index("idx_user_currency_date", table_name="transactions")
+    op.drop_index("idx_user_category_date", table_name="transactions")
@@ -0,0 +1,39 @@
+"""Add daily category totals
+
+Revision ID: 615bd90962be
+Revises: cce853397740
+Create Date: 2026-10-17 11:40:52.107316
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "615bd90962be"
+down_revision: str | None = "cce853397740"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_category_totals",
+        sa.Column("user_id", sa.Text(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Numeric(precision=14, scale=2), server_default="0", nullable=False),
+        sa.Column("tx_count", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["category_id"], ["categories.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "day", "category_id"),
+    )
+    # Rollups are built per user on first analytics read, or eagerly via `python manage.py backfill-rollups`
+    op.add_column("users", sa.Column("rollup_ready", sa.Boolean(), server_default=sa.text("false"), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "rollup_ready")
+    op.drop_table("daily_category_totals")
@@ -0,0 +1,49 @@
+"""Add transaction note search
+
+Revision ID: 9d2f4b7c1e35
+Revises: 615bd90962be
+Create Date: 2026-10-17 13:05:27.640913
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d2f4b7c1e35"
+down_revision: str | None = "615bd90962be"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "transactions",
+        sa.Column(
+            "note_search",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', coalesce(note, ''))", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "idx_transactions_note_search", "transactions", ["note_search"], unique=False, postgresql_using="gin"
+    )
+
+    # Fuzzy (typo-tolerant) matching additionally needs pg_trgm, which not every server ships
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transactions_note_trgm ON transactions USING gin (note gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_transactions_note_trgm")
+    op.drop_index("idx_transactions_note_search", table_name="transactions", postgresql_using="gin")
+    op.drop_column("transactions", "note_search")
@@ -0,0 +1,27 @@
+"""Add exchange rate next_update
+
+Revision ID: a4c8e1f7b2d9
+Revises: f3b9d6e0a1c4
+Create Date: 2026-10-17 19:41:12.284310
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c8e1f7b2d9"
+down_revision: str | None = "f3b9d6e0a1c4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("exchange_rates", sa.Column("next_update", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("exchange_rates", "next_update")
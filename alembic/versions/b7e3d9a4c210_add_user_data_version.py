@@ -0,0 +1,27 @@
+"""Add user data version
+
+Revision ID: b7e3d9a4c210
+Revises: 4e8a1c6f0b92
+Create Date: 2026-10-17 15:02:36.517240
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3d9a4c210"
+down_revision: str | None = "4e8a1c6f0b92"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("data_version", sa.BigInteger(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "data_version")
@@ -0,0 +1,86 @@
+"""Seed default categories
+
+Revision ID: b9d3f5a2c6e8
+Revises: a4c8e1f7b2d9
+Create Date: 2026-10-17 20:26:55.730148
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b9d3f5a2c6e8"
+down_revision: str | None = "a4c8e1f7b2d9"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Copy of app.services.categories.DEFAULT_CATEGORIES as of this revision
+DEFAULT_CATEGORIES = [
+    ("Food", "expense"),
+    ("Transport", "expense"),
+    ("Housing", "expense"),
+    ("Other", "expense"),
+    ("Salary", "income"),
+    ("Freelance", "income"),
+    ("Gifts", "income"),
+    ("Other", "income"),
+]
+
+
+def upgrade() -> None:
+    # Concurrent first requests could seed the defaults twice: keep the oldest of each (name, type)
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicate_defaults ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY name, type) AS keep_id
+        FROM categories
+        WHERE user_id IS NULL
+        """
+    )
+    op.execute("DELETE FROM duplicate_defaults WHERE id = keep_id")
+    op.execute(
+        """
+        UPDATE transactions t SET category_id = d.keep_id
+        FROM duplicate_defaults d
+        WHERE t.category_id = d.id
+        """
+    )
+    # Rollup buckets of the duplicates would collide with the kept ones: drop the affected
+    # users' rollups, which are rebuilt on their next analytics read
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE stale_rollups ON COMMIT DROP AS
+        SELECT DISTINCT user_id FROM daily_category_totals
+        WHERE category_id IN (SELECT id FROM duplicate_defaults)
+        """
+    )
+    op.execute("UPDATE users SET rollup_ready = false WHERE id IN (SELECT user_id FROM stale_rollups)")
+    op.execute("DELETE FROM daily_category_totals WHERE user_id IN (SELECT user_id FROM stale_rollups)")
+    op.execute("DELETE FROM categories WHERE id IN (SELECT id FROM duplicate_defaults)")
+    # Every user's category list lost ids: move all ETags on so clients don't keep them after a 304
+    op.execute("UPDATE users SET data_version = data_version + 1 WHERE EXISTS (SELECT 1 FROM duplicate_defaults)")
+
+    op.create_index(
+        "uq_category_system_default",
+        "categories",
+        ["name", "type"],
+        unique=True,
+        postgresql_where=sa.text("user_id IS NULL"),
+    )
+
+    values = ", ".join(f"('{name}', '{type_}', NULL, true)" for name, type_ in DEFAULT_CATEGORIES)
+    op.execute(
+        f"""
+        INSERT INTO categories (name, type, user_id, is_active) VALUES {values}
+        ON CONFLICT (name, type) WHERE user_id IS NULL DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    # Seeded rows stay: transactions may reference them
+    op.drop_index("uq_category_system_default", table_name="categories")
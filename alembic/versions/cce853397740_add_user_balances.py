@@ -0,0 +1,44 @@
+"""Add user balances
+
+Revision ID: cce853397740
+Revises: 0133b1936eb4
+Create Date: 2026-10-17 10:02:11.418203
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "cce853397740"
+down_revision: str | None = "0133b1936eb4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_balances",
+        sa.Column("user_id", sa.Text(), nullable=False),
+        sa.Column("balance", sa.Numeric(precision=14, scale=2), server_default="0", nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+    # Backfill so existing users get O(1) reads right away
+    op.execute(
+        """
+        INSERT INTO user_balances (user_id, balance)
+        SELECT t.user_id, SUM(CASE WHEN c.type = 'income' THEN t.amount ELSE -t.amount END)
+        FROM transactions t
+        JOIN categories c ON t.category_id = c.id
+        GROUP BY t.user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_balances")
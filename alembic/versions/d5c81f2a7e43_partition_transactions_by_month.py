@@ -0,0 +1,136 @@
+"""Partition transactions by month
+
+Revision ID: d5c81f2a7e43
+Revises: b7e3d9a4c210
+Create Date: 2026-10-17 16:10:52.118604
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d5c81f2a7e43"
+down_revision: str | None = "b7e3d9a4c210"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Kept in sync with app.services.partitions.PARTITION_MONTHS_AHEAD
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, user_id, amount, original_amount, currency, date, category_id, is_deleted, note"
+
+TABLE_DDL = """
+CREATE TABLE {name} (
+    id integer NOT NULL DEFAULT nextval('transactions_id_seq'::regclass),
+    user_id text NOT NULL,
+    amount numeric(10, 2) NOT NULL,
+    original_amount numeric(10, 2),
+    currency varchar(3) NOT NULL DEFAULT 'KZT',
+    date timestamptz {date_null} DEFAULT now(),
+    category_id integer NOT NULL CONSTRAINT transactions_category_id_fkey REFERENCES categories (id) ON DELETE CASCADE,
+    is_deleted boolean NOT NULL DEFAULT false,
+    note text,
+    note_search tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(note, ''))) STORED
+) {partitioning}
+"""
+
+
+def _create_indexes() -> None:
+    op.create_index("ix_transactions_id", "transactions", ["id"])
+    op.create_index("ix_transactions_user_id", "transactions", ["user_id"])
+    op.create_index("ix_transactions_category_id", "transactions", ["category_id"])
+    op.create_index("ix_transactions_date", "transactions", ["date"])
+    op.create_index("idx_user_date", "transactions", ["user_id", "date"])
+    op.create_index("idx_user_category_date", "transactions", ["user_id", "category_id", "date"])
+    op.create_index("idx_user_currency_date", "transactions", ["user_id", "currency", "date"])
+    op.create_index("idx_user_amount", "transactions", ["user_id", "amount"])
+    op.create_index("idx_transactions_note_search", "transactions", ["note_search"], postgresql_using="gin")
+
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar():
+        op.execute("CREATE INDEX idx_transactions_note_trgm ON transactions USING gin (note gin_trgm_ops)")
+
+
+def _set_aside_old_table() -> None:
+    """Renames transactions out of the way and drops its indexes so their names can be reused."""
+    op.execute("ALTER TABLE transactions RENAME TO transactions_old")
+    op.execute("ALTER TABLE transactions_old DROP CONSTRAINT transactions_pkey")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+    for index in (
+        "ix_transactions_id",
+        "ix_transactions_user_id",
+        "ix_transactions_category_id",
+        "ix_transactions_date",
+        "idx_user_date",
+        "idx_user_category_date",
+        "idx_user_currency_date",
+        "idx_user_amount",
+        "idx_transactions_note_search",
+        "idx_transactions_note_trgm",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def upgrade() -> None:
+    _set_aside_old_table()
+
+    # The partition key must be part of the primary key and cannot be NULL
+    op.execute(TABLE_DDL.format(name="transactions", date_null="NOT NULL", partitioning="PARTITION BY RANGE (date)"))
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    # One partition per UTC month from the oldest transaction through MONTHS_AHEAD months ahead;
+    # later months are created by the maintenance task (app.services.partitions)
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', (SELECT coalesce(min(date), now()) FROM transactions_old) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                    'transactions_' || to_char(month, '"y"YYYY"m"MM'),
+                    (month AT TIME ZONE 'UTC'),
+                    ((month + interval '1 month') AT TIME ZONE 'UTC')
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+
+    op.execute(
+        f"""
+        INSERT INTO transactions ({COLUMNS})
+        SELECT id, user_id, amount, original_amount, currency, coalesce(date, 'epoch'), category_id, is_deleted, note
+        FROM transactions_old
+        """
+    )
+    op.execute("DROP TABLE transactions_old")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+
+    op.execute("ALTER TABLE transactions ADD PRIMARY KEY (id, date)")
+    _create_indexes()
+
+
+def downgrade() -> None:
+    _set_aside_old_table()
+
+    op.execute(TABLE_DDL.format(name="transactions", date_null="", partitioning=""))
+    op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old")
+    # Drops every partition with it
+    op.execute("DROP TABLE transactions_old")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+
+    op.execute("ALTER TABLE transactions ADD PRIMARY KEY (id)")
+    _create_indexes()
@@ -0,0 +1,33 @@
+"""Add exchange rates
+
+Revision ID: e2a7c4d91b58
+Revises: d5c81f2a7e43
+Create Date: 2026-10-17 17:24:09.381452
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c4d91b58"
+down_revision: str | None = "d5c81f2a7e43"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exchange_rates",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("rate", sa.Numeric(precision=20, scale=10), nullable=False),
+        sa.PrimaryKeyConstraint("day", "currency"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("exchange_rates")
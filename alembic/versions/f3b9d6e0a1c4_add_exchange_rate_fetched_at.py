@@ -0,0 +1,30 @@
+"""Add exchange rate fetched_at
+
+Revision ID: f3b9d6e0a1c4
+Revises: e2a7c4d91b58
+Create Date: 2026-10-17 18:02:47.915326
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b9d6e0a1c4"
+down_revision: str | None = "e2a7c4d91b58"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "exchange_rates",
+        sa.Column("fetched_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("exchange_rates", "fetched_at")
@@ -13,6 +13,9 @@ EXCHANGE_RATE_API_KEY = os.getenv("EXCHANGE_RATE_API_KEY")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Base-currency changes for users with more transactions than this run as a background job
+CURRENCY_RECALC_SYNC_LIMIT = int(os.getenv("CURRENCY_RECALC_SYNC_LIMIT", "5000"))
+
 if not DATABASE_URL:
     print("❌ CRITICAL ERROR: DATABASE_URL is missing!")
     sys.exit(1)
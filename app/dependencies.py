@@ -1,15 +1,39 @@
 import hashlib
 import hmac
 import json
+import time
 import urllib.parse
 from collections.abc import AsyncGenerator
 
+from cachetools import TLRUCache
 from fastapi import Header, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import BOT_TOKEN
 from app.database import async_session_maker
 
+# How long (seconds) a signed initData payload is trusted after its auth_date
+AUTH_MAX_AGE = 86400
+AUTH_CACHE_SIZE = 4096
+
+# The WebAppData secret only depends on BOT_TOKEN, so derive it once at startup
+WEBAPP_SECRET_KEY = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest() if BOT_TOKEN else None
+
+
+def _auth_entry_expiry(_key, value, _now):
+    auth_date, _user = value
+    return auth_date + AUTH_MAX_AGE
+
+
+# Verified headers -> (auth_date, user). Keyed by the raw header, which embeds the hash,
+# so a tampered payload can never match a cached entry.
+_auth_cache = TLRUCache(maxsize=AUTH_CACHE_SIZE, ttu=_auth_entry_expiry, timer=time.time)
+_auth_cache_stats = {"hits": 0, "misses": 0}
+
+
+def get_auth_cache_stats() -> dict:
+    return {**_auth_cache_stats, "size": len(_auth_cache)}
+
 
 async def get_session() -> AsyncGenerator[AsyncSession]:
     async with async_session_maker() as session:
@@ -24,6 +48,13 @@ async def verify_telegram_authentication(x_telegram_init_data: str = Header(None
         print("❌ [AUTH]: BOT_TOKEN is missing on server")
         raise HTTPException(status_code=500, detail="Server config error")
 
+    cached = _auth_cache.get(x_telegram_init_data)
+    if cached:
+        _auth_cache_stats["hits"] += 1
+        return dict(cached[1])
+
+    _auth_cache_stats["misses"] += 1
+
     try:
         parsed_data = dict(urllib.parse.parse_qsl(x_telegram_init_data))
         received_hash = parsed_data.pop("hash", None)
@@ -33,8 +64,7 @@ async def verify_telegram_authentication(x_telegram_init_data: str = Header(None
         # Telegram data-check-string requires alphabetical sorting of keys
         data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(parsed_data.items()))
 
-        secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
-        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        calculated_hash = hmac.new(WEBAPP_SECRET_KEY, data_check_string.encode(), hashlib.sha256).hexdigest()
 
         if calculated_hash != received_hash:
             print("❌ [AUTH FAIL] Hash mismatch")
@@ -43,7 +73,11 @@ async def verify_telegram_authentication(x_telegram_init_data: str = Header(None
         user_data = json.loads(parsed_data.get("user", "{}"))
         user_data["id"] = str(user_data["id"])
 
-        return user_data
+        # Entries whose auth_date is already outside the freshness window are not stored
+        auth_date = int(parsed_data.get("auth_date", 0))
+        _auth_cache[x_telegram_init_data] = (auth_date, user_data)
+
+        return dict(user_data)
 
     except Exception as e:
         print(f"❌ [AUTH ERROR]: {e}")
@@ -12,5 +12,7 @@ from .schemas import (
 )
 from .sql import Base as Base
 from .sql import CategoryDB as CategoryDB
+from .sql import DailyCategoryTotalDB as DailyCategoryTotalDB
 from .sql import TransactionDB as TransactionDB
+from .sql import UserBalanceDB as UserBalanceDB
 from .sql import UserDB as UserDB
@@ -1,5 +1,22 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Text, UniqueConstraint
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -13,6 +30,12 @@ class UserDB(Base):
 
     base_currency = Column(String(3), default="USD", nullable=False)
 
+    # Set once daily_category_totals holds this user's full history (built lazily on first analytics read)
+    rollup_ready = Column(Boolean, server_default="false", nullable=False)
+
+    # Bumped by every write to the user's data; served as the ETag of GET endpoints
+    data_version = Column(BigInteger, server_default="0", nullable=False)
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -29,13 +52,19 @@ class CategoryDB(Base):
 
     transactions = relationship("TransactionDB", back_populates="category")
 
-    __table_args__ = (UniqueConstraint("name", "type", "user_id", name="uq_category_user"),)
+    __table_args__ = (
+        UniqueConstraint("name", "type", "user_id", name="uq_category_user"),
+        # NULLs never conflict in uq_category_user, so system defaults need their own index
+        Index("uq_category_system_default", "name", "type", unique=True, postgresql_where=user_id.is_(None)),
+    )
 
 
 class TransactionDB(Base):
     __tablename__ = "transactions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Range-partitioned by month on `date` (see app/services/partitions.py). Postgres requires the
+    # partition key in the primary key, but `id` alone stays unique and is the ORM identity.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Text, nullable=False, index=True)
 
     # Amount converted to user's base currency (for reports)
@@ -47,12 +76,109 @@ class TransactionDB(Base):
     # Original currency code (e.g., "TRY")
     currency = Column(String(3), default="USD", nullable=False)
 
-    date = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    date = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
 
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, index=True)
 
     note = Column(Text, nullable=True)
 
+    # Lexemes of `note` for GET /transactions/search ('simple' config: no stemming, any language)
+    note_search = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(note, ''))", persisted=True)))
+
     category = relationship("CategoryDB", back_populates="transactions")
 
-    __table_args__ = (Index("idx_user_date", "user_id", "date"),)
+    __table_args__ = (
+        Index("idx_user_date", "user_id", "date"),
+        # Filters of GET /transactions; trailing `date` keeps the newest-first order index-driven
+        Index("idx_user_category_date", "user_id", "category_id", "date"),
+        Index("idx_user_currency_date", "user_id", "currency", "date"),
+        Index("idx_user_amount", "user_id", "amount"),
+        Index("idx_transactions_note_search", "note_search", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
+
+# Catch-all for dates without a monthly partition yet; maintenance moves them out
+event.listen(
+    TransactionDB.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT"),
+)
+
+
+class UserBalanceDB(Base):
+    __tablename__ = "user_balances"
+
+    user_id = Column(Text, primary_key=True)
+
+    # Running income - expense total in the user's base currency, maintained by every transaction write
+    balance = Column(Numeric(14, 2), nullable=False, server_default="0")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DailyCategoryTotalDB(Base):
+    __tablename__ = "daily_category_totals"
+
+    user_id = Column(Text, primary_key=True)
+
+    # Calendar day in UTC
+    day = Column(Date, primary_key=True)
+
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+
+    # Sum of transactions.amount (base currency) and number of transactions for the bucket
+    total = Column(Numeric(14, 2), nullable=False, server_default="0")
+    tx_count = Column(Integer, nullable=False, server_default="0")
+
+
+class ExchangeRateDB(Base):
+    __tablename__ = "exchange_rates"
+
+    # Calendar day in UTC; the periodic update overwrites the current day until it ends
+    day = Column(Date, primary_key=True)
+
+    currency = Column(String(3), primary_key=True)
+
+    # Units of `currency` per 1 USD
+    rate = Column(Numeric(20, 10), nullable=False)
+
+    # When the provider was last asked for this day's rates; the newest one dates the startup snapshot
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # When the provider announced its next publication; until then the stored rates are current
+    next_update = Column(DateTime(timezone=True), nullable=True)
+
+
+class JobDB(Base):
+    __tablename__ = "jobs"
+
+    # Background jobs started by API requests (see app/services/jobs.py)
+    id = Column(Text, primary_key=True)
+    user_id = Column(Text, nullable=False)
+    kind = Column(Text, nullable=False)
+    # What the job works towards, when a kind has variants (e.g. the new base currency)
+    target = Column(Text, nullable=True)
+
+    # pending -> running -> done | failed
+    status = Column(Text, nullable=False, server_default="pending")
+    progress = Column(JSONB, nullable=False, server_default="{}")
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Heartbeat of the worker running the job; a stale one means that worker is gone
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # One unfinished job per user and kind, across workers
+        Index(
+            "uq_job_active",
+            "user_id",
+            "kind",
+            unique=True,
+            postgresql_where=status.in_(["pending", "running"]),
+        ),
+    )
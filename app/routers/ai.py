@@ -2,13 +2,12 @@ from datetime import UTC, datetime, timedelta
 
 import google.generativeai as genai
 from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import GOOGLE_API_KEY
 from app.dependencies import get_session, verify_telegram_authentication
-from app.models.sql import UserDB
 from app.services.analytics import AnalyticsService
+from app.services.user_settings import get_user_settings
 
 router = APIRouter(tags=["ai"])
 
@@ -56,10 +55,8 @@ async def get_ai_advice(
     user_id = user["id"]
     analytics_service = AnalyticsService(session)
 
-    # Fetch User Currency
-    user_result = await session.execute(select(UserDB).where(UserDB.id == user_id))
-    user_db = user_result.scalar_one_or_none()
-    currency = user_db.base_currency if user_db else "USD"
+    # User currency (cached settings)
+    currency = (await get_user_settings(session, user_id, "ai_advice")).base_currency
 
     # Date Calculation
     server_now = datetime.now(UTC)
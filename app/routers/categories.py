@@ -1,6 +1,4 @@
-import asyncio
-
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import func, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,67 +6,39 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_session, verify_telegram_authentication
 from app.models.schemas import Category, CategoryCreate
 from app.models.sql import CategoryDB, TransactionDB
+from app.services.analytics_cache import invalidate_analytics_cache
+from app.services.categories import get_user_categories, invalidate_category_cache
+from app.services.data_version import bump_data_version, get_data_version, not_modified_since
 
 router = APIRouter(tags=["categories"])
 
-# Global lock for default categories initialization
-init_lock = asyncio.Lock()
-
-DEFAULT_CATEGORIES = [
-    {"name": "Food", "type": "expense"},
-    {"name": "Transport", "type": "expense"},
-    {"name": "Housing", "type": "expense"},
-    {"name": "Other", "type": "expense"},
-    {"name": "Salary", "type": "income"},
-    {"name": "Freelance", "type": "income"},
-    {"name": "Gifts", "type": "income"},
-    {"name": "Other", "type": "income"},
-]
-
-
-async def _init_defaults(session: AsyncSession):
-    for cat in DEFAULT_CATEGORIES:
-        # Check existence to avoid duplicates
-        stmt = select(CategoryDB).where(
-            (CategoryDB.name == cat["name"]) & (CategoryDB.type == cat["type"]) & (CategoryDB.user_id.is_(None))
-        )
-        existing = await session.execute(stmt)
-
-        if not existing.scalar_one_or_none():
-            stmt = insert(CategoryDB).values(user_id=None, name=cat["name"], type=cat["type"], is_active=True)
-            await session.execute(stmt)
-    await session.commit()
-
 
 @router.get("/categories", response_model=list[Category])
 async def get_categories(
-    type: str = Query(None), user=Depends(verify_telegram_authentication), session: AsyncSession = Depends(get_session)
+    request: Request,
+    response: Response,
+    type: str = Query(None),
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
 ):
     user_id = user["id"]
 
-    # Check if system categories exist
-    check_stmt = select(CategoryDB.id).where(CategoryDB.user_id.is_(None)).limit(1)
-    res = await session.execute(check_stmt)
-    has_defaults = res.scalar_one_or_none()
-
-    if not has_defaults:
-        async with init_lock:
-            # Double-checked locking
-            res_retry = await session.execute(check_stmt)
-            if not res_retry.scalar_one_or_none():
-                await _init_defaults(session)
+    version = await get_data_version(session, user_id)
+    if cached := not_modified_since(request, response, user_id, version):
+        return cached
 
-    stmt = select(CategoryDB).where(
-        ((CategoryDB.user_id == user_id) | (CategoryDB.user_id.is_(None))) & (CategoryDB.is_active)
-    )
-
-    if type:
-        stmt = stmt.where(CategoryDB.type == type)
-
-    stmt = stmt.order_by(CategoryDB.user_id.nullsfirst(), CategoryDB.id.asc())
+    # System defaults are seeded at deploy time and startup (app.services.categories), so the
+    # user's category map is all there is to read: one query on a cache miss, none on a hit.
+    # A map cached before `version` may miss a change another worker has not announced yet.
+    categories = await get_user_categories(session, user_id, min_version=version)
 
-    result = await session.execute(stmt)
-    return result.scalars().all()
+    # Defaults first, then the user's own, each by id
+    ordered = sorted(categories.items(), key=lambda item: (not item[1].is_default, item[0]))
+    return [
+        Category(id=cat_id, name=cat.name, type=cat.type, user_id=None if cat.is_default else user_id)
+        for cat_id, cat in ordered
+        if cat.is_active and (not type or cat.type == type)
+    ]
 
 
 @router.post("/categories")
@@ -85,8 +55,11 @@ async def add_category(
 
     try:
         result = await session.execute(do_update_stmt)
-        await session.commit()
         new_id = result.scalar_one()
+        await session.execute(bump_data_version(user_id, invalidate=("analytics", "categories")))
+        await session.commit()
+        invalidate_analytics_cache(user_id, notified=True)
+        invalidate_category_cache(user_id, notified=True)
         return {"id": new_id, "status": "created"}
     except Exception as e:
         await session.rollback()
@@ -114,7 +87,10 @@ async def update_category(
     category.name = category_data.name
     # Changing category type (income/expense) is not allowed to preserve consistency
 
+    await session.execute(bump_data_version(user_id, invalidate=("analytics", "categories")))
     await session.commit()
+    invalidate_analytics_cache(user_id, notified=True)
+    invalidate_category_cache(user_id, notified=True)
     await session.refresh(category)
     return {"status": "updated", "id": category.id, "name": category.name}
 
@@ -133,7 +109,10 @@ async def delete_category(
         raise HTTPException(status_code=403, detail="Cannot delete this category (Access denied or Default)")
 
     category.is_active = False
+    await session.execute(bump_data_version(user_id, invalidate=("analytics", "categories")))
     await session.commit()
+    invalidate_analytics_cache(user_id, notified=True)
+    invalidate_category_cache(user_id, notified=True)
 
     return {"status": "deleted"}
 
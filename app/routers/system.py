@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+
+from app.dependencies import get_auth_cache_stats
+from app.services.analytics_cache import get_analytics_cache_stats
+from app.services.categories import get_category_cache_stats
+from app.services.currency import CurrencyService
+from app.services.invalidation import invalidation_bus
+from app.services.scheduler import scheduler
+from app.services.user_settings import get_settings_cache_stats
+
+router = APIRouter(tags=["system"])
+
+
+@router.get("/health")
+async def health_check():
+    """
+    Liveness probe that also exposes in-process cache counters, exchange-rate freshness
+    and this worker's scheduler role for monitoring.
+    """
+    return {
+        "status": "ok",
+        "auth_cache": get_auth_cache_stats(),
+        "analytics_cache": get_analytics_cache_stats(),
+        "category_cache": get_category_cache_stats(),
+        "user_settings_cache": get_settings_cache_stats(),
+        "invalidation_bus": invalidation_bus.status(),
+        "exchange_rates": CurrencyService().rates_status(),
+        "scheduler": scheduler.status(),
+    }
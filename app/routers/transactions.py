@@ -1,17 +1,63 @@
+import base64
+import binascii
+from collections.abc import Mapping
 from datetime import UTC, datetime, timedelta
-
-from fastapi import APIRouter, Depends, Header, HTTPException
-from sqlalchemy import case, delete, desc, func, select, text
+from decimal import Decimal
+from functools import partial
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    DateTime,
+    Numeric,
+    Text,
+    delete,
+    desc,
+    func,
+    literal,
+    select,
+    text,
+    true,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.dependencies import get_session, verify_telegram_authentication
 from app.models.schemas import Transaction, TransactionCreate, TransactionUpdate
 from app.models.sql import CategoryDB, TransactionDB, UserDB
+from app.services.analytics import AnalyticsService
+from app.services.analytics_cache import cached_analytics, invalidate_analytics_cache
+from app.services.balance import apply_balance_delta, get_balance, signed_total
+from app.services.categories import CachedCategory, invalidate_category_cache, lookup_categories
 from app.services.currency import CurrencyService
+from app.services.data_version import bump_data_version, not_modified
+from app.services.export import encode_batches, gzip_chunks
+from app.services.importer import ImportFormatError, TransactionImporter
+from app.services.jobs import start_job
+from app.services.reset import delete_user_data
+from app.services.rollup import apply_rollup_delta, rollup_rows
+from app.services.search import note_search_condition
+from app.services.user_settings import (
+    UserSettings,
+    invalidate_user_settings,
+    peek_user_settings,
+    remember_user_settings,
+)
 
 router = APIRouter(tags=["transactions"])
 
+# Upper bound for POST /transactions/bulk (keeps the INSERT well below the bind-parameter limit)
+BULK_MAX_TRANSACTIONS = 500
+
+# Rows fetched per round trip by GET /transactions/export
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
 
 # --- Helpers ---
 def _get_date_for_storage(date_input: str | datetime, timezone_offset_str: str | None) -> datetime:
@@ -50,19 +96,72 @@ def _get_date_for_storage(date_input: str | datetime, timezone_offset_str: str |
         return datetime.now(UTC)
 
 
-# --- Endpoints ---
+def _encode_cursor(date: datetime, tx_id: int) -> str:
+    """
+    Builds an opaque keyset cursor pointing at the (date, id) of the last returned row.
+    """
+    raw = f"{date.isoformat()}|{tx_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
 
-@router.get("/transactions", response_model=list[Transaction])
-async def get_transactions(
-    limit: int = 50,
-    offset: int = 0,
-    user=Depends(verify_telegram_authentication),
-    session: AsyncSession = Depends(get_session),
-):
-    user_id = user["id"]
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, tx_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_str), int(tx_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+_RETURNING_COLUMNS = (
+    TransactionDB.id,
+    TransactionDB.amount,
+    TransactionDB.original_amount,
+    TransactionDB.currency,
+    TransactionDB.date,
+    TransactionDB.category_id,
+    TransactionDB.note,
+)
+
+
+async def _usable_categories(
+    session: AsyncSession, user_id: str, category_ids: set[int]
+) -> Mapping[int, CachedCategory]:
+    """
+    The user's cached categories, after checking that every one of `category_ids` is theirs
+    or a system default (no round-trip while the cache is warm).
+    """
+    categories = await lookup_categories(session, user_id, category_ids)
+    if unknown := sorted(category_ids - categories.keys()):
+        raise HTTPException(status_code=404, detail=f"Category not found: {', '.join(map(str, unknown))}")
+    return categories
 
-    stmt = (
+
+def _to_transaction(row, categories: Mapping[int, CachedCategory]) -> Transaction:
+    """Builds the response for a written row from the cached name and type of its category."""
+    category = categories[row["category_id"]]
+    return Transaction(**row, category=category.name, type=category.type)
+
+
+def _rate_to(rate_map: dict[str, Decimal], base_currency):
+    """
+    SQL expression picking the rate for `base_currency` out of a CurrencyService.get_rate_map() result.
+    Unknown currencies fall back to the USD rate, mirroring CurrencyService.get_rate.
+    """
+    rates = type_coerce({code: str(rate) for code, rate in rate_map.items()}, JSONB)
+    return func.coalesce(rates[base_currency].astext.cast(Numeric), rates["USD"].astext.cast(Numeric))
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Query parameters without an offset are taken as UTC."""
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value
+
+
+def _list_query(user_id: str):
+    """
+    Base SELECT for transaction listings: the user's rows joined to their category.
+    """
+    return (
         select(
             TransactionDB.id,
             TransactionDB.amount,
@@ -76,14 +175,68 @@ async def get_transactions(
         )
         .join(CategoryDB, TransactionDB.category_id == CategoryDB.id)
         .where(TransactionDB.user_id == user_id)
-        .order_by(desc(TransactionDB.date), desc(TransactionDB.id))
-        .limit(limit)
-        .offset(offset)
     )
 
-    result = await session.execute(stmt)
+
+def _filtered_list_query(
+    user_id: str,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    category_ids: list[int] | None = None,
+    type: str | None = None,
+    min_amount: Decimal | None = None,
+    max_amount: Decimal | None = None,
+    currency: str | None = None,
+):
+    """
+    _list_query narrowed by the GET /transactions filters.
+    Every combination is served by idx_user_date or one of the idx_user_* indexes.
+    """
+    stmt = _list_query(user_id)
+
+    if date_from:
+        stmt = stmt.where(TransactionDB.date >= _as_utc(date_from))
+    if date_to:
+        stmt = stmt.where(TransactionDB.date < _as_utc(date_to))
+    if category_ids:
+        stmt = stmt.where(TransactionDB.category_id.in_(category_ids))
+    if type:
+        stmt = stmt.where(CategoryDB.type == type)
+    if min_amount is not None:
+        stmt = stmt.where(TransactionDB.amount >= min_amount)
+    if max_amount is not None:
+        stmt = stmt.where(TransactionDB.amount <= max_amount)
+    if currency:
+        stmt = stmt.where(TransactionDB.currency == currency.upper())
+
+    return stmt
+
+
+def _paginate(stmt, limit: int, cursor: str | None = None, offset: int = 0):
+    """Newest first, starting after `cursor` (or at `offset` for older clients)."""
+    stmt = stmt.order_by(desc(TransactionDB.date), desc(TransactionDB.id)).limit(limit)
+
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(TransactionDB.date, TransactionDB.id) < tuple_(cursor_date, cursor_id))
+    elif offset:
+        stmt = stmt.offset(offset)
+
+    return stmt
+
+
+async def _fetch_page(
+    session: AsyncSession, stmt, response: Response, limit: int, cursor: str | None = None, offset: int = 0
+) -> list[dict]:
+    """
+    Runs one page of a listing and sets X-Next-Cursor when more rows may follow.
+    """
+    result = await session.execute(_paginate(stmt, limit, cursor, offset))
     rows = result.mappings().all()
 
+    if len(rows) == limit and rows[-1]["date"] is not None:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1]["date"], rows[-1]["id"])
+
     processed_transactions = []
     for row in rows:
         tx_dict = dict(row)
@@ -98,18 +251,121 @@ async def get_transactions(
     return processed_transactions
 
 
-@router.get("/balance")
-async def get_total_balance(user=Depends(verify_telegram_authentication), session: AsyncSession = Depends(get_session)):
-    user_id = user["id"]
+# --- Endpoints ---
+
 
+@router.get("/transactions", response_model=list[Transaction])
+async def get_transactions(
+    request: Request,
+    response: Response,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: str | None = None,
+    date_from: datetime | None = Query(None, alias="from"),
+    date_to: datetime | None = Query(None, alias="to"),
+    category_id: list[int] | None = Query(None),
+    type: Literal["income", "expense"] | None = None,
+    min_amount: Decimal | None = None,
+    max_amount: Decimal | None = None,
+    currency: str | None = Query(None, min_length=3, max_length=3),
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Lists transactions newest first. Clients should page with the opaque `cursor`
+    returned in the X-Next-Cursor header (index seek on idx_user_date);
+    `offset` is kept for older clients.
+
+    Optional filters: `from` (inclusive) / `to` (exclusive) dates, repeated `category_id`,
+    category `type`, `min_amount` / `max_amount` in the base currency and original `currency`.
+    """
+    if cached := await not_modified(request, response, session, user["id"]):
+        return cached
+
+    stmt = _filtered_list_query(user["id"], date_from, date_to, category_id, type, min_amount, max_amount, currency)
+    return await _fetch_page(session, stmt, response, limit, cursor, offset)
+
+
+@router.get("/transactions/search", response_model=list[Transaction])
+async def search_transactions(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Searches notes: every word of `q` matches as a prefix (GIN index on note_search),
+    and misspelled words match too where pg_trgm is installed. Newest first, paged like GET /transactions.
+    """
+    if cached := await not_modified(request, response, session, user["id"]):
+        return cached
+
+    stmt = _list_query(user["id"]).where(await note_search_condition(session, q))
+    return await _fetch_page(session, stmt, response, limit, cursor)
+
+
+@router.get("/transactions/export")
+async def export_transactions(
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Streams every transaction of the user, newest first.
+    Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE,
+    so memory use does not depend on the size of the history.
+    """
     stmt = (
-        select(func.sum(case((CategoryDB.type == "income", TransactionDB.amount), else_=-TransactionDB.amount)))
-        .join(CategoryDB)
-        .where(TransactionDB.user_id == user_id)
+        select(
+            TransactionDB.id,
+            TransactionDB.date,
+            CategoryDB.type,
+            CategoryDB.name.label("category"),
+            TransactionDB.amount,
+            TransactionDB.original_amount,
+            TransactionDB.currency,
+            TransactionDB.note,
+        )
+        .join(CategoryDB, TransactionDB.category_id == CategoryDB.id)
+        .where(TransactionDB.user_id == user["id"])
+        .order_by(desc(TransactionDB.date), desc(TransactionDB.id))
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
     )
 
-    result = await session.execute(stmt)
-    balance = result.scalar() or 0.0
+    async def batches():
+        result = await session.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield partition
+
+    body = encode_batches(batches(), format)
+    filename = f"transactions.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        body = gzip_chunks(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/balance")
+async def get_total_balance(
+    request: Request,
+    response: Response,
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+):
+    user_id = user["id"]
+    if cached := await not_modified(request, response, session, user_id):
+        return cached
+
+    balance = await get_balance(session, user_id)
     return {"balance": balance}
 
 
@@ -120,60 +376,172 @@ async def add_transaction(
     session: AsyncSession = Depends(get_session),
     x_timezone_offset: str | None = Header(None, alias="X-Timezone-Offset"),
 ):
+    """
+    Upserts the user, converts into their base currency and inserts the transaction in a single
+    statement (one round-trip to Postgres). The category comes from the category cache.
+    """
     user_id = user["id"]
+    categories = await _usable_categories(session, user_id, {tx.category_id})
     final_date = _get_date_for_storage(tx.date, x_timezone_offset)
+    currency_service = CurrencyService()
+
+    try:
+        row = None
+        if cached := peek_user_settings(user_id):
+            # One rate for the cached base currency; nothing is inserted if it has changed meanwhile
+            rate = await currency_service.get_rate(tx.currency, cached.base_currency, on=final_date)
+            stmt = _insert_transaction(
+                user_id, tx, final_date, lambda _: literal(tx.amount * rate, Numeric), cached.base_currency
+            )
+            row = (await session.execute(stmt)).mappings().one_or_none()
+            if row is None:
+                invalidate_user_settings(user_id, conflict=True)
+
+        if row is None:
+            # The base currency is only known inside the statement, so ship rates to every candidate
+            rate_map = await currency_service.get_rate_map(tx.currency, on=final_date)
+            stmt = _insert_transaction(
+                user_id, tx, final_date, lambda base: literal(tx.amount, Numeric) * _rate_to(rate_map, base)
+            )
+            row = (await session.execute(stmt)).mappings().one()
+            remember_user_settings(user_id, UserSettings(row["base_currency"]))
+
+        await session.commit()
+        invalidate_analytics_cache(user_id, notified=True)
+        return _to_transaction(row, categories)
 
-    insert_stmt = (
-        pg_insert(UserDB).values(id=user_id, base_currency="USD").on_conflict_do_nothing(index_elements=["id"])
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+def _insert_transaction(
+    user_id: str, tx: TransactionCreate, final_date: datetime, convert, expected_currency: str | None = None
+):
+    """
+    add_transaction's statement: upserts the user, inserts the row with `convert(base_currency)` as its
+    amount and applies the balance and rollup deltas. Returns the row and the user's base currency.
+    With `expected_currency`, inserts nothing unless that is still the user's base currency.
+    """
+    account = bump_data_version(user_id).cte("account")
+    values = select(
+        literal(user_id),
+        literal(tx.amount, Numeric),
+        literal(tx.currency),
+        convert(account.c.base_currency),
+        literal(tx.category_id),
+        literal(final_date, DateTime(timezone=True)),
+        literal(tx.note, Text),
+    ).select_from(account)
+    if expected_currency is not None:
+        values = values.where(account.c.base_currency == expected_currency)
+
+    inserted = (
+        pg_insert(TransactionDB)
+        .from_select(["user_id", "original_amount", "currency", "amount", "category_id", "date", "note"], values)
+        .returning(*_RETURNING_COLUMNS)
+        .cte("inserted")
     )
-    await session.execute(insert_stmt)
+    balance = apply_balance_delta(user_id, signed_total(inserted.c.amount, inserted.c.category_id)).cte("balance")
+    rollup = apply_rollup_delta(
+        user_id, rollup_rows(inserted.c.date, inserted.c.category_id, inserted.c.amount), ready=account.c.rollup_ready
+    ).cte("rollup")
+    # account holds exactly one row
+    rows = select(inserted, account.c.base_currency).select_from(inserted.join(account, true()))
+    return rows.add_cte(balance, rollup)
+
+
+@router.post("/transactions/bulk", response_model=list[Transaction])
+async def add_transactions_bulk(
+    items: list[TransactionCreate],
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+    x_timezone_offset: str | None = Header(None, alias="X-Timezone-Offset"),
+):
+    """
+    Creates up to BULK_MAX_TRANSACTIONS transactions with one user upsert,
+    one rate lookup per distinct currency and a single multi-row INSERT.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="No transactions provided")
+    if len(items) > BULK_MAX_TRANSACTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_TRANSACTIONS} transactions per request")
 
-    user_stmt = select(UserDB).where(UserDB.id == user_id)
-    result = await session.execute(user_stmt)
-    user_db = result.scalar_one()
-    target_currency = user_db.base_currency
+    user_id = user["id"]
+    categories = await _usable_categories(session, user_id, {tx.category_id for tx in items})
+
+    target_currency = (await session.execute(bump_data_version(user_id))).scalar_one()
+
+    dates = [_get_date_for_storage(tx.date, x_timezone_offset) for tx in items]
+    rate_keys = [(tx.currency, tx_date.date()) for tx, tx_date in zip(items, dates, strict=True)]
 
+    # One lookup per distinct (currency, UTC day): amounts convert at their transaction's date
     currency_service = CurrencyService()
-    rate = await currency_service.get_rate(tx.currency, target_currency)
-    amount_in_base = tx.amount * rate
-
-    new_tx = TransactionDB(
-        user_id=user_id,
-        original_amount=tx.amount,
-        currency=tx.currency,
-        amount=amount_in_base,
-        category_id=tx.category_id,
-        date=final_date,
-        note=tx.note,
+    rates = {}
+    for currency, day in set(rate_keys):
+        rates[(currency, day)] = await currency_service.get_rate(currency, target_currency, on=day)
+
+    rows = [
+        {
+            "user_id": user_id,
+            "original_amount": tx.amount,
+            "currency": tx.currency,
+            "amount": tx.amount * rates[key],
+            "category_id": tx.category_id,
+            "date": tx_date,
+            "note": tx.note,
+        }
+        for tx, tx_date, key in zip(items, dates, rate_keys, strict=True)
+    ]
+
+    inserted = pg_insert(TransactionDB).values(rows).returning(*_RETURNING_COLUMNS).cte("inserted")
+    balance = apply_balance_delta(user_id, signed_total(inserted.c.amount, inserted.c.category_id)).cte("balance")
+    rollup = apply_rollup_delta(user_id, rollup_rows(inserted.c.date, inserted.c.category_id, inserted.c.amount)).cte(
+        "rollup"
     )
 
-    session.add(new_tx)
     try:
+        result = await session.execute(select(inserted).add_cte(balance, rollup).order_by(inserted.c.id))
+        created = [_to_transaction(row, categories) for row in result.mappings()]
         await session.commit()
-        await session.refresh(new_tx)
-
-        # Fetch category details to return a complete Transaction object for the UI
-        cat_stmt = select(CategoryDB).where(CategoryDB.id == new_tx.category_id)
-        cat_result = await session.execute(cat_stmt)
-        category_db = cat_result.scalar_one()
-
-        return Transaction(
-            id=new_tx.id,
-            amount=new_tx.amount,
-            original_amount=new_tx.original_amount,
-            currency=new_tx.currency,
-            date=new_tx.date,
-            category_id=new_tx.category_id,
-            category=category_db.name,  # Required for UI
-            type=category_db.type,  # Required for UI
-            note=new_tx.note,
-        )
+        invalidate_analytics_cache(user_id, notified=True)
+        return created
 
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+@router.post("/transactions/import")
+async def import_transactions(
+    request: Request,
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Imports a CSV file sent as the raw request body (Content-Type: text/csv).
+    Columns: date, amount, category (required) and currency, type, note (optional).
+    The body is parsed as it streams in; invalid rows are skipped and reported by line number.
+    """
+    importer = TransactionImporter(session, user["id"])
+
+    try:
+        report = await importer.run(request.stream())
+        await session.commit()
+        # The import may have created categories
+        invalidate_analytics_cache(user["id"], notified=True)
+        invalidate_category_cache(user["id"], notified=True)
+        return report
+
+    except ImportFormatError as e:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except Exception as e:
+        await session.rollback()
+        print(f"Error importing transactions: {e}")
+        raise HTTPException(status_code=500, detail="Import failed") from e
+
+
 @router.patch("/transactions/{tx_id}")
 async def update_transaction(
     tx_id: int,
@@ -181,88 +549,190 @@ async def update_transaction(
     user=Depends(verify_telegram_authentication),
     session: AsyncSession = Depends(get_session),
     x_timezone_offset: str | None = Header(None, alias="X-Timezone-Offset"),
+    stored_date: datetime | None = Query(None, alias="date"),
 ):
+    """
+    Applies the partial update in one statement; the category in the response comes from the category cache.
+    `date` is the transaction's current date as returned by the API: it lets Postgres touch only
+    that month's partition. A date that no longer matches (re-dated elsewhere) falls back to the id.
+    """
     user_id = user["id"]
+    if update_data.category_id is not None:
+        await _usable_categories(session, user_id, {update_data.category_id})
 
-    stmt = select(TransactionDB).where((TransactionDB.id == tx_id) & (TransactionDB.user_id == user_id))
-    result = await session.execute(stmt)
-    transaction = result.scalar_one_or_none()
-
-    if not transaction:
+    row = await _apply_update(session, user_id, tx_id, update_data, x_timezone_offset, stored_date)
+    if row is None and stored_date is not None:
+        row = await _apply_update(session, user_id, tx_id, update_data, x_timezone_offset, None)
+    if row is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
-    should_recalculate = False
+    categories = await lookup_categories(session, user_id, {row["category_id"]})
+    return _to_transaction(row, categories)
+
+
+async def _apply_update(
+    session: AsyncSession,
+    user_id: str,
+    tx_id: int,
+    update_data: TransactionUpdate,
+    x_timezone_offset: str | None,
+    stored_date: datetime | None,
+) -> Mapping | None:
+    """update_transaction's write; commits and returns the updated row, or rolls back and returns None if not found."""
+    owned = (TransactionDB.id == tx_id) & (TransactionDB.user_id == user_id)
+    if stored_date is not None:
+        owned &= TransactionDB.date == _as_utc(stored_date)
+
+    changes = {}
 
     if update_data.amount is not None:
-        transaction.original_amount = update_data.amount
-        should_recalculate = True
+        changes["original_amount"] = update_data.amount
 
     if update_data.currency is not None:
-        transaction.currency = update_data.currency
-        should_recalculate = True
+        changes["currency"] = update_data.currency
 
-    # Recalculate base amount if currency or amount changes
-    if should_recalculate:
-        user_stmt = select(UserDB).where(UserDB.id == user_id)
-        u_result = await session.execute(user_stmt)
-        user_db = u_result.scalar_one_or_none()
-        target_currency = user_db.base_currency if user_db else "USD"
-
-        service = CurrencyService()
-        base_val = transaction.original_amount if transaction.original_amount is not None else transaction.amount
-        rate = await service.get_rate(transaction.currency, target_currency)
-        transaction.amount = base_val * rate
+    if update_data.date is not None:
+        changes["date"] = _get_date_for_storage(update_data.date, x_timezone_offset)
+
+    # Recalculate base amount if currency, amount or date (and with it the rate) changes
+    if changes:
+        source_currency = update_data.currency
+        rate_date = changes.get("date")
+        if source_currency is None or rate_date is None:
+            # Partial edits need the stored currency / date to pick the rate
+            stored = (await session.execute(select(TransactionDB.currency, TransactionDB.date).where(owned))).first()
+            if stored is None:
+                return None
+            source_currency = source_currency or stored.currency
+            rate_date = rate_date or stored.date
+            if stored_date is None:
+                # Known now: the write below only touches the row's partition
+                owned &= TransactionDB.date == stored.date
+
+        rate_map = await CurrencyService().get_rate_map(source_currency, on=rate_date)
+        base_currency = func.coalesce(
+            select(UserDB.base_currency).where(UserDB.id == user_id).scalar_subquery(), literal("USD")
+        )
+        if update_data.amount is not None:
+            base_val = literal(update_data.amount, Numeric)
+        else:
+            # Handle legacy data: fallback to current amount if original is missing
+            base_val = func.coalesce(TransactionDB.original_amount, TransactionDB.amount)
+        changes["amount"] = base_val * _rate_to(rate_map, base_currency)
 
     if update_data.category_id is not None:
-        transaction.category_id = update_data.category_id
+        changes["category_id"] = update_data.category_id
 
     if update_data.note is not None:
-        transaction.note = update_data.note
+        changes["note"] = update_data.note
+
+    if not changes.keys() & {"amount", "category_id", "date"}:
+        # Nothing that affects balances or rollups
+        if changes:
+            target = update(TransactionDB).where(owned).values(**changes).returning(*_RETURNING_COLUMNS)
+        else:
+            target = select(*_RETURNING_COLUMNS).where(owned)
+        stmt = select(target.cte("updated"))
+        if changes:
+            stmt = stmt.add_cte(bump_data_version(user_id).cte("version"))
+    else:
+        # Self-join on the locked pre-update row so RETURNING exposes both old and new values
+        previous = select(TransactionDB.id, TransactionDB.amount, TransactionDB.category_id, TransactionDB.date)
+        previous = previous.where(owned).with_for_update().subquery("previous")
+        target = (
+            update(TransactionDB)
+            .where(owned, TransactionDB.id == previous.c.id)
+            .values(**changes)
+            .returning(
+                *_RETURNING_COLUMNS,
+                previous.c.amount.label("previous_amount"),
+                previous.c.category_id.label("previous_category_id"),
+                previous.c.date.label("previous_date"),
+            )
+            .cte("updated")
+        )
+        delta = signed_total(target.c.amount, target.c.category_id) - signed_total(
+            target.c.previous_amount, target.c.previous_category_id
+        )
+        balance = apply_balance_delta(user_id, delta).cte("balance")
+        version = bump_data_version(user_id).cte("version")
+        rollup = apply_rollup_delta(
+            user_id,
+            rollup_rows(target.c.date, target.c.category_id, target.c.amount),
+            rollup_rows(target.c.previous_date, target.c.previous_category_id, target.c.previous_amount, sign=-1),
+            ready=version.c.rollup_ready,
+        ).cte("rollup")
+        stmt = select(target).add_cte(balance, version, rollup)
 
-    if update_data.date is not None:
-        new_date_val = _get_date_for_storage(update_data.date, x_timezone_offset)
-        transaction.date = new_date_val
+    result = await session.execute(stmt)
+    row = result.mappings().one_or_none()
+
+    if not row:
+        await session.rollback()
+        return None
 
     await session.commit()
-    await session.refresh(transaction)
-
-    # Fetch category logic for UI return
-    cat_stmt = select(CategoryDB).where(CategoryDB.id == transaction.category_id)
-    cat_result = await session.execute(cat_stmt)
-    category_db = cat_result.scalar_one()
-
-    return Transaction(
-        id=transaction.id,
-        amount=transaction.amount,
-        original_amount=transaction.original_amount,
-        currency=transaction.currency,
-        date=transaction.date,
-        category_id=transaction.category_id,
-        category=category_db.name,
-        type=category_db.type,
-        note=transaction.note,
-    )
+    if changes:
+        invalidate_analytics_cache(user_id, notified=True)
+    return row
 
 
 @router.delete("/transactions/{tx_id}")
 async def delete_transaction(
-    tx_id: int, user=Depends(verify_telegram_authentication), session: AsyncSession = Depends(get_session)
+    tx_id: int,
+    user=Depends(verify_telegram_authentication),
+    session: AsyncSession = Depends(get_session),
+    stored_date: datetime | None = Query(None, alias="date"),
 ):
+    """
+    `date` is the transaction's current date as returned by the API: it lets Postgres touch only
+    that month's partition. A date that no longer matches (re-dated elsewhere) falls back to the id.
+    """
     user_id = user["id"]
-    stmt = delete(TransactionDB).where((TransactionDB.id == tx_id) & (TransactionDB.user_id == user_id))
-    await session.execute(stmt)
-    await session.commit()
+    if not await _delete_row(session, user_id, tx_id, stored_date) and stored_date is not None:
+        await _delete_row(session, user_id, tx_id, None)
     return {"status": "deleted"}
 
 
-@router.delete("/users/me/reset")
+async def _delete_row(session: AsyncSession, user_id: str, tx_id: int, stored_date: datetime | None) -> bool:
+    """delete_transaction's write; commits and returns True, or rolls back and returns False if not found."""
+    owned = (TransactionDB.id == tx_id) & (TransactionDB.user_id == user_id)
+    if stored_date is not None:
+        owned &= TransactionDB.date == _as_utc(stored_date)
+    removed = (
+        delete(TransactionDB)
+        .where(owned)
+        .returning(TransactionDB.amount, TransactionDB.category_id, TransactionDB.date)
+        .cte("removed")
+    )
+    # One statement, so the balance and rollup deltas see the row as it was before the delete
+    balance = apply_balance_delta(user_id, -signed_total(removed.c.amount, removed.c.category_id)).cte("balance")
+    version = bump_data_version(user_id).cte("version")
+    rollup = apply_rollup_delta(
+        user_id,
+        rollup_rows(removed.c.date, removed.c.category_id, removed.c.amount, sign=-1),
+        ready=version.c.rollup_ready,
+    ).cte("rollup")
+    stmt = select(func.count()).select_from(removed).add_cte(balance, version, rollup)
+    if not (await session.execute(stmt)).scalar_one():
+        # Nothing to delete: keep the version (and the balance row) as they were
+        await session.rollback()
+        return False
+
+    await session.commit()
+    invalidate_analytics_cache(user_id, notified=True)
+    return True
+
+
+@router.delete("/users/me/reset", status_code=202)
 async def reset_user_data(user=Depends(verify_telegram_authentication), session: AsyncSession = Depends(get_session)):
+    """
+    Starts deleting all of the user's data in the background; poll GET /users/me/jobs/{job_id}.
+    """
     user_id = user["id"]
-    await session.execute(delete(TransactionDB).where(TransactionDB.user_id == user_id))
-    await session.execute(delete(CategoryDB).where(CategoryDB.user_id == user_id))
-    await session.execute(delete(UserDB).where(UserDB.id == user_id))
-    await session.commit()
-    return {"status": "success"}
+    session_maker = async_sessionmaker(session.bind, expire_on_commit=False)
+    job = await start_job(session, user_id, "reset", partial(delete_user_data, session_maker, user_id))
+    return {"status": "accepted", "job_id": job["id"]}
 
 
 # --- Analytics Endpoints ---
@@ -292,78 +762,72 @@ async def get_summary(
     elif range == "year":
         start_date = user_now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    query_str = """
-        SELECT c.name as category, SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = :user_id AND c.type = :type
-    """
-    params = {"user_id": user_id, "type": type}
-
-    if start_date:
-        query_start_utc = (start_date + timedelta(minutes=offset_minutes)).replace(tzinfo=None)
-        query_str += " AND t.date >= :start_date"
-        params["start_date"] = query_start_utc
+    # user_now carries a UTC tzinfo but holds local wall time; shift back to real UTC
+    query_start_utc = start_date + timedelta(minutes=offset_minutes) if start_date else None
 
-    query_str += " GROUP BY c.name HAVING SUM(t.amount) > 0 ORDER BY total DESC"
+    async def compute():
+        return await AnalyticsService(session).get_category_totals(user_id, type, query_start_utc)
 
-    result = await session.execute(text(query_str), params)
-    return result.mappings().all()
+    return await cached_analytics(user_id, ("summary", type, query_start_utc), compute)
 
 
 @router.get("/analytics/calendar")
 async def get_calendar_data(
-    month: int,
-    year: int,
+    month: int = Query(..., ge=1, le=12),
+    year: int = Query(..., ge=1, le=9998),
     user=Depends(verify_telegram_authentication),
     session: AsyncSession = Depends(get_session),
     x_timezone_offset: str | None = Header(None, alias="X-Timezone-Offset"),
 ):
+    """
+    Month totals and per-day breakdown in the user's local time.
+    """
     user_id = user["id"]
     offset = int(x_timezone_offset) if x_timezone_offset and x_timezone_offset.lstrip("-").isdigit() else 0
-    params = {"user_id": user_id, "month": month, "year": year, "offset": offset}
 
-    query_month = text(
-        """
-        SELECT c.type, SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = :user_id
-          AND EXTRACT(MONTH FROM (t.date - (:offset * INTERVAL '1 minute'))) = :month
-          AND EXTRACT(YEAR FROM (t.date - (:offset * INTERVAL '1 minute'))) = :year
-        GROUP BY c.type
-    """
-    )
-    result_month = await session.execute(query_month, params)
-    rows = result_month.mappings().all()
-
-    summary = {"income": 0, "expense": 0, "net": 0}
-    for r in rows:
-        val = r["total"] or 0
-        if r["type"] == "income":
-            summary["income"] = val
-        if r["type"] == "expense":
-            summary["expense"] = val
-    summary["net"] = summary["income"] - summary["expense"]
-
-    query_days = text(
+    # Local month boundaries as a UTC [start, end) range keeps the filter sargable on idx_user_date
+    month_start = datetime(year, month, 1, tzinfo=UTC)
+    next_month = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=UTC)
+    params = {
+        "user_id": user_id,
+        "offset": offset,
+        "start": month_start + timedelta(minutes=offset),
+        "end": next_month + timedelta(minutes=offset),
+    }
+
+    async def compute():
+        # One pass: (day, type) buckets plus the month-level (type) totals via GROUPING SETS
+        query = text(
+            """
+            SELECT day, type, SUM(amount) AS total, GROUPING(day) AS is_month_total
+            FROM (
+                SELECT TO_CHAR(t.date - (:offset * INTERVAL '1 minute'), 'YYYY-MM-DD') AS day, c.type, t.amount
+                FROM transactions t
+                JOIN categories c ON t.category_id = c.id
+                WHERE t.user_id = :user_id AND t.date >= :start AND t.date < :end
+            ) month_rows
+            GROUP BY GROUPING SETS ((day, type), (type))
+            ORDER BY day
         """
-        SELECT TO_CHAR(t.date - (:offset * INTERVAL '1 minute'), 'YYYY-MM-DD') as date, c.type, SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = :user_id
-          AND EXTRACT(MONTH FROM (t.date - (:offset * INTERVAL '1 minute'))) = :month
-          AND EXTRACT(YEAR FROM (t.date - (:offset * INTERVAL '1 minute'))) = :year
-        GROUP BY date, c.type ORDER BY date
-    """
-    )
-    result_days = await session.execute(query_days, params)
+        )
+        result = await session.execute(query, params)
+
+        summary = {"income": 0, "expense": 0, "net": 0}
+        days = {}
+        for r in result.mappings():
+            val = r["total"] or 0
+            if r["is_month_total"]:
+                if r["type"] in ("income", "expense"):
+                    summary[r["type"]] = val
+                continue
+
+            d = r["day"]
+            if d not in days:
+                days[d] = {"income": 0, "expense": 0}
+            days[d][r["type"]] += val
+
+        summary["net"] = summary["income"] - summary["expense"]
 
-    days = {}
-    for r in result_days.mappings():
-        d = r["date"]
-        if d not in days:
-            days[d] = {"income": 0, "expense": 0}
-        days[d][r["type"]] += r["total"] or 0
+        return {"month_summary": summary, "days": days}
 
-    return {"month_summary": summary, "days": days}
+    return await cached_analytics(user_id, ("calendar", year, month, offset), compute)
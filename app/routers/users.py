@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends
+from functools import partial
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.config import CURRENCY_RECALC_SYNC_LIMIT
 from app.dependencies import get_session, verify_telegram_authentication
-from app.models.sql import TransactionDB, UserDB
+from app.models.sql import UserDB
+from app.services.base_currency import change_base_currency, change_base_currency_job, count_transactions
 from app.services.currency import CurrencyService
+from app.services.data_version import not_modified_since
+from app.services.jobs import find_active_job, get_job, start_job
+from app.services.user_settings import DEFAULT_SETTINGS, UserSettings, remember_user_settings
 
 router = APIRouter(tags=["users"])
 
@@ -17,68 +24,80 @@ class UserSettingsUpdate(BaseModel):
 @router.post("/users/me/settings/currency")
 async def update_base_currency(
     settings: UserSettingsUpdate,
+    response: Response,
     user_data=Depends(verify_telegram_authentication),
     session: AsyncSession = Depends(get_session),
 ):
     """
-    Updates the user's base currency and triggers a soft recalculation
-    of all historical transactions.
+    Updates the user's base currency and recalculates all historical transactions.
+    Users with more than CURRENCY_RECALC_SYNC_LIMIT transactions get a background job instead
+    (202 + job id, see GET /users/me/jobs/{job_id}). While a change runs, asking for the same
+    currency returns that job and asking for another one is a 409.
     """
     user_id = user_data["id"]
     new_currency = settings.base_currency.upper()
 
-    stmt = select(UserDB).where(UserDB.id == user_id)
-    result = await session.execute(stmt)
-    user_db = result.scalar_one_or_none()
-
-    if not user_db:
-        user_db = UserDB(id=user_id, base_currency="USD")
-        session.add(user_db)
+    if running := await find_active_job(session, user_id, "base_currency"):
+        return _accepted(response, running, new_currency)
 
-    if user_db.base_currency == new_currency:
+    stmt = select(UserDB.base_currency).where(UserDB.id == user_id)
+    current_currency = (await session.execute(stmt)).scalar_one_or_none() or "USD"
+    if current_currency == new_currency:
         return {"status": "no_change", "currency": new_currency}
 
-    user_db.base_currency = new_currency
-
-    # Recalculate all historical transactions
-    tx_stmt = select(TransactionDB).where(TransactionDB.user_id == user_id)
-    tx_result = await session.execute(tx_stmt)
-    transactions = tx_result.scalars().all()
-
-    currency_service = CurrencyService()
-
-    count = 0
-    for tx in transactions:
-        # Handle legacy data: fallback to current amount if original is missing
-        base_val = tx.original_amount if tx.original_amount is not None else tx.amount
-        source_currency = tx.currency
-
-        # Calculate rate: Source Currency -> New Base Currency
-        rate = await currency_service.get_rate(source_currency, new_currency)
+    if await count_transactions(session, user_id) > CURRENCY_RECALC_SYNC_LIMIT:
+        session_maker = async_sessionmaker(session.bind, expire_on_commit=False)
+        work = partial(change_base_currency_job, session_maker, user_id, new_currency)
+        job = await start_job(session, user_id, "base_currency", work, target=new_currency)
+        return _accepted(response, job, new_currency)
 
-        tx.amount = base_val * rate
-        count += 1
+    count = await change_base_currency(session, user_id, new_currency)
+    return {"status": "updated", "recalculated_transactions": count, "new_currency": new_currency}
 
-    await session.commit()
 
-    return {"status": "updated", "recalculated_transactions": count, "new_currency": new_currency}
+def _accepted(response: Response, job: dict, new_currency: str) -> dict:
+    if job["target"] != new_currency:
+        raise HTTPException(status_code=409, detail=f"A change of the base currency to {job['target']} is in progress")
+    response.status_code = 202
+    return {"status": "accepted", "job_id": job["id"], "new_currency": new_currency}
 
 
 @router.get("/users/me")
 async def get_user_profile(
+    request: Request,
+    response: Response,
     user_data=Depends(verify_telegram_authentication),
     session: AsyncSession = Depends(get_session),
 ):
     user_id = user_data["id"]
-    stmt = select(UserDB).where(UserDB.id == user_id)
-    result = await session.execute(stmt)
-    user_db = result.scalar_one_or_none()
 
+    # The profile embeds the shared rates, so their refresh time is part of the ETag
     currency_service = CurrencyService()
+    rates_stamp = int(currency_service.last_update.timestamp()) if currency_service.last_update else 0
+
+    # The version and the settings in one read, so the body always matches its ETag.
+    # Users not found in DB get the default settings.
+    stmt = select(UserDB.data_version, UserDB.base_currency).where(UserDB.id == user_id)
+    row = (await session.execute(stmt)).one_or_none()
+    version, settings = (row.data_version, UserSettings(row.base_currency)) if row else (0, DEFAULT_SETTINGS)
+    if cached := not_modified_since(request, response, user_id, version, rates_stamp):
+        return cached
+
+    # Fresh from the database: warms the cache for the writes that usually follow
+    remember_user_settings(user_id, settings)
     rates = await currency_service.get_all_rates()
 
-    # Return default profile if user not found in DB
-    if not user_db:
-        return {"id": user_id, "base_currency": "USD", "rates": rates}
+    return {"id": user_id, "base_currency": settings.base_currency, "rates": rates}
+
 
-    return {"id": user_db.id, "base_currency": user_db.base_currency, "rates": rates}
+@router.get("/users/me/jobs/{job_id}")
+async def get_job_status(
+    job_id: str, user_data=Depends(verify_telegram_authentication), session: AsyncSession = Depends(get_session)
+):
+    """
+    Status and progress of a background job started by one of the user's requests.
+    """
+    job = await get_job(session, user_data["id"], job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,24 +1,76 @@
 from datetime import datetime
 
-from sqlalchemy import desc, func, select
+from sqlalchemy import desc, func, literal, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.sql import CategoryDB, TransactionDB
+from app.models.sql import CategoryDB, DailyCategoryTotalDB, TransactionDB
+from app.services.rollup import ensure_rollup, split_at_day_boundary
 
 
 class AnalyticsService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_aggregated_summary(self, user_id: int, start_date: datetime):
+    async def _category_totals(self, user_id: str, start_date: datetime | None):
+        """
+        Subquery of (category_id, total, tx_count) rows covering [start_date, ...).
+        Whole UTC days come from daily_category_totals, the partial first day from raw transactions.
+        """
+        if start_date == datetime.min:
+            start_date = None
+
+        def raw_rows(since: datetime | None, until: datetime | None = None):
+            stmt = select(
+                TransactionDB.category_id, TransactionDB.amount.label("total"), literal(1).label("tx_count")
+            ).where(TransactionDB.user_id == user_id)
+            if since:
+                stmt = stmt.where(TransactionDB.date >= since)
+            if until:
+                stmt = stmt.where(TransactionDB.date < until)
+            return stmt
+
+        if not await ensure_rollup(self.session, user_id):
+            return raw_rows(start_date).subquery("category_totals")
+
+        rollup = select(
+            DailyCategoryTotalDB.category_id, DailyCategoryTotalDB.total, DailyCategoryTotalDB.tx_count
+        ).where(DailyCategoryTotalDB.user_id == user_id)
+
+        if start_date is None:
+            return rollup.subquery("category_totals")
+
+        boundary, first_full_day = split_at_day_boundary(start_date)
+        rollup = rollup.where(DailyCategoryTotalDB.day >= first_full_day)
+        return union_all(rollup, raw_rows(start_date, boundary)).subquery("category_totals")
+
+    async def get_category_totals(self, user_id: str, type: str, start_date: datetime | None):
+        """
+        Totals per category name for one type ('income'/'expense'), largest first.
+        """
+        totals = await self._category_totals(user_id, start_date)
+        total = func.sum(totals.c.total)
+        stmt = (
+            select(CategoryDB.name.label("category"), total.label("total"))
+            .join(CategoryDB, totals.c.category_id == CategoryDB.id)
+            .where(CategoryDB.type == type)
+            .group_by(CategoryDB.name)
+            .having(total > 0)
+            .order_by(desc("total"))
+        )
+
+        result = await self.session.execute(stmt)
+        return result.mappings().all()
+
+    async def get_aggregated_summary(self, user_id: str, start_date: datetime):
         """
         Returns total income/expense and a breakdown by category.
         """
+        totals = await self._category_totals(user_id, start_date)
         stmt = (
-            select(CategoryDB.name, CategoryDB.type, func.sum(TransactionDB.amount).label("total"))
-            .join(CategoryDB, TransactionDB.category_id == CategoryDB.id)
-            .where(TransactionDB.user_id == user_id, TransactionDB.date >= start_date)
+            select(CategoryDB.name, CategoryDB.type, func.sum(totals.c.total).label("total"))
+            .join(CategoryDB, totals.c.category_id == CategoryDB.id)
             .group_by(CategoryDB.name, CategoryDB.type)
+            .having(func.sum(totals.c.tx_count) > 0)
             .order_by(desc("total"))
         )
 
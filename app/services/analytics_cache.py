@@ -0,0 +1,82 @@
+from collections.abc import Awaitable, Callable, Hashable
+
+from cachetools import TTLCache
+
+from app.services.invalidation import invalidation_bus, register_scope
+
+# Analytics responses are pure functions of (user, parameters, data). Entries are dropped by
+# the user's next write (invalidate_analytics_cache) or after ANALYTICS_CACHE_TTL seconds,
+# whichever comes first. Other workers evict through the invalidation bus; the TTL is the fallback
+# while they are disconnected from it.
+ANALYTICS_CACHE_SIZE = 2048
+ANALYTICS_CACHE_TTL = 300
+# Users whose eviction generation is remembered (see _generations)
+ANALYTICS_GENERATIONS_SIZE = 4 * ANALYTICS_CACHE_SIZE
+
+# (user_id, endpoint, *parameters) -> response body
+_analytics_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+_analytics_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "discarded": 0}
+
+# Bumped by every eviction (local writes and the invalidation bus): per user, and once for all users
+# when everything is dropped. A response whose computation overlapped an eviction may predate the
+# write behind it, so it is returned but not stored. A user's counter only has to outlive the
+# computations running at their last eviction, so it is kept for as long as a cached response.
+_generations = TTLCache(maxsize=ANALYTICS_GENERATIONS_SIZE, ttl=ANALYTICS_CACHE_TTL)
+_epoch = 0
+
+
+def get_analytics_cache_stats() -> dict:
+    lookups = _analytics_cache_stats["hits"] + _analytics_cache_stats["misses"]
+    hit_ratio = _analytics_cache_stats["hits"] / lookups if lookups else 0.0
+    return {**_analytics_cache_stats, "size": len(_analytics_cache), "hit_ratio": round(hit_ratio, 4)}
+
+
+async def cached_analytics(user_id: str, key: tuple[Hashable, ...], compute: Callable[[], Awaitable]):
+    """
+    Returns the cached response for (user_id, *key), computing and storing it on a miss.
+    """
+    cache_key = (user_id, *key)
+    try:
+        value = _analytics_cache[cache_key]
+    except KeyError:
+        _analytics_cache_stats["misses"] += 1
+    else:
+        _analytics_cache_stats["hits"] += 1
+        return value
+
+    generation = (_epoch, _generations.get(user_id, 0))
+    value = await compute()
+    if generation == (_epoch, _generations.get(user_id, 0)):
+        _analytics_cache[cache_key] = value
+    else:
+        _analytics_cache_stats["discarded"] += 1
+    return value
+
+
+def invalidate_analytics_cache(user_id: str, notified: bool = False) -> None:
+    """
+    Drops every cached response of the user, here and in the other workers.
+    Call it after a write to their data has committed. `notified` means the write's
+    bump_data_version() already told the other workers.
+    """
+    _evict_user(user_id)
+    _analytics_cache_stats["invalidations"] += 1
+    if not notified:
+        invalidation_bus.publish(user_id, "analytics")
+
+
+def _evict_user(user_id: str) -> None:
+    _generations[user_id] = _generations.get(user_id, 0) + 1
+    stale = [key for key in list(_analytics_cache.keys()) if key[0] == user_id]
+    for key in stale:
+        _analytics_cache.pop(key, None)
+
+
+def _evict_all() -> None:
+    global _epoch
+    _epoch += 1
+    _generations.clear()
+    _analytics_cache.clear()
+
+
+register_scope("analytics", _evict_user, _evict_all)
@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+from sqlalchemy import Numeric, case, exists, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import CategoryDB, TransactionDB, UserBalanceDB
+
+# Balances are maintained incrementally by the transaction write paths:
+#   * every write upserts its signed delta in the same statement;
+#   * a user's row is created by their first write or GET /balance, whichever comes first, with
+#     a full recompute. Concurrent creators queue on the primary key: the losers of a write
+#     add their delta to the winner's row, so no committed transaction is counted twice or missed.
+
+
+def signed_amount(amount, category_type):
+    """Income counts positive, everything else negative."""
+    return case((category_type == "income", amount), else_=-amount)
+
+
+def signed_total(amount, category_id):
+    """
+    Scalar subquery summing signed `amount` over the rows of the CTE these columns belong to.
+    """
+    return (
+        select(func.coalesce(func.sum(signed_amount(amount, CategoryDB.type)), 0))
+        .select_from(amount.table)
+        .join(CategoryDB, category_id == CategoryDB.id)
+        .scalar_subquery()
+    )
+
+
+def _computed_balance(user_id: str):
+    return (
+        select(func.coalesce(func.sum(signed_amount(TransactionDB.amount, CategoryDB.type)), 0))
+        .select_from(TransactionDB)
+        .join(CategoryDB, TransactionDB.category_id == CategoryDB.id)
+        .where(TransactionDB.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def apply_balance_delta(user_id: str, delta):
+    """
+    Upsert adding `delta` to the stored balance; meant to be attached to a write as a CTE.
+    Without a row yet it stores the full balance as of the statement's snapshot plus `delta`
+    (the full aggregation only runs then).
+    """
+    stored = exists().where(UserBalanceDB.user_id == user_id)
+    initial = case((stored, literal(0, Numeric)), else_=_computed_balance(user_id))
+    stmt = pg_insert(UserBalanceDB).from_select(["user_id", "balance"], select(literal(user_id), initial + delta))
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"], set_={"balance": UserBalanceDB.balance + delta, "updated_at": func.now()}
+    )
+
+
+def recompute_balance(user_id: str):
+    """UPDATE replacing the stored balance with a full recomputation (used after mass rewrites)."""
+    return (
+        update(UserBalanceDB)
+        .where(UserBalanceDB.user_id == user_id)
+        .values(balance=_computed_balance(user_id), updated_at=func.now())
+    )
+
+
+async def get_balance(session: AsyncSession, user_id: str) -> Decimal:
+    """
+    O(1) primary-key read; falls back to a one-off full aggregation for users without a row yet.
+    """
+    result = await session.execute(select(UserBalanceDB.balance).where(UserBalanceDB.user_id == user_id))
+    balance = result.scalar_one_or_none()
+    if balance is not None:
+        return balance
+
+    init_stmt = (
+        pg_insert(UserBalanceDB)
+        .from_select(["user_id", "balance"], select(literal(user_id), _computed_balance(user_id)))
+        .on_conflict_do_nothing(index_elements=["user_id"])
+        .returning(UserBalanceDB.balance)
+    )
+    result = await session.execute(init_stmt)
+    balance = result.scalar_one_or_none()
+    await session.commit()
+
+    if balance is None:
+        # Lost the race against a concurrent initialization
+        result = await session.execute(select(UserBalanceDB.balance).where(UserBalanceDB.user_id == user_id))
+        balance = result.scalar_one()
+    return balance
+
+
+async def find_balance_drift(session: AsyncSession) -> list[dict]:
+    """
+    Recomputes every stored balance from scratch and returns the rows that disagree.
+    """
+    actual = (
+        select(
+            TransactionDB.user_id,
+            func.sum(signed_amount(TransactionDB.amount, CategoryDB.type)).label("total"),
+        )
+        .join(CategoryDB, TransactionDB.category_id == CategoryDB.id)
+        .group_by(TransactionDB.user_id)
+        .subquery()
+    )
+    actual_total = func.coalesce(actual.c.total, 0)
+    stmt = (
+        select(UserBalanceDB.user_id, UserBalanceDB.balance.label("stored"), actual_total.label("actual"))
+        .outerjoin(actual, actual.c.user_id == UserBalanceDB.user_id)
+        .where(UserBalanceDB.balance != actual_total)
+        .order_by(UserBalanceDB.user_id)
+    )
+    result = await session.execute(stmt)
+    return [dict(row) for row in result.mappings()]
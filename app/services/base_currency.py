@@ -0,0 +1,85 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import Date, Numeric, String, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.sql import TransactionDB
+from app.services.analytics_cache import invalidate_analytics_cache
+from app.services.balance import recompute_balance
+from app.services.currency import CurrencyService
+from app.services.data_version import bump_data_version
+from app.services.rollup import rebuild_rollup, utc_day
+from app.services.user_settings import invalidate_user_settings
+
+
+def rate_table(rates: dict[tuple[str, date], Decimal]):
+    """
+    `rates` as a (currency, day, rate) table valued unnest(...). Shipped as three arrays, so the
+    parameter count stays fixed however many pairs there are.
+    """
+    currencies, days = zip(*rates, strict=True) if rates else ((), ())
+    return (
+        func.unnest(
+            literal(list(currencies), ARRAY(String)),
+            literal(list(days), ARRAY(Date)),
+            literal(list(rates.values()), ARRAY(Numeric)),
+        )
+        .table_valued("currency", "day", "rate")
+        .render_derived(name="rates")
+    )
+
+
+async def count_transactions(session: AsyncSession, user_id: str) -> int:
+    stmt = select(func.count()).select_from(TransactionDB).where(TransactionDB.user_id == user_id)
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def change_base_currency(session: AsyncSession, user_id: str, new_currency: str) -> int:
+    """
+    Switches the user to `new_currency` and converts every transaction into it with one rate per
+    distinct (source currency, day) and a single UPDATE ... FROM unnest(...). Commits.
+    Returns the number of transactions recalculated.
+    """
+    # Updating the users row first holds its lock, so transactions written meanwhile
+    # wait and then convert into the new currency themselves
+    await session.execute(bump_data_version(user_id, invalidate=("analytics", "settings"), base_currency=new_currency))
+
+    # One rate per distinct (currency, UTC day): amounts convert at their transaction's date
+    day = utc_day(TransactionDB.date)
+    pairs = select(TransactionDB.currency, day).where(TransactionDB.user_id == user_id).distinct()
+    currency_service = CurrencyService()
+    rates: dict[tuple[str, date], Decimal] = {}
+    for currency, tx_day in (await session.execute(pairs)).all():
+        rates[(currency, tx_day)] = await currency_service.get_rate(currency, new_currency, on=tx_day)
+
+    count = 0
+    if rates:
+        rates_table = rate_table(rates)
+        # Legacy rows without original_amount convert their current amount
+        stmt = (
+            update(TransactionDB)
+            .where(
+                TransactionDB.user_id == user_id,
+                TransactionDB.currency == rates_table.c.currency,
+                day == rates_table.c.day,
+            )
+            .values(amount=func.coalesce(TransactionDB.original_amount, TransactionDB.amount) * rates_table.c.rate)
+        )
+        count = (await session.execute(stmt)).rowcount
+
+    await session.execute(recompute_balance(user_id))
+    await rebuild_rollup(session, user_id)
+    await session.commit()
+    invalidate_analytics_cache(user_id, notified=True)
+    invalidate_user_settings(user_id, notified=True)
+    return count
+
+
+async def change_base_currency_job(session_maker: async_sessionmaker, user_id: str, new_currency: str, job: dict):
+    """change_base_currency() for a background job (see app.services.jobs)."""
+    async with session_maker() as session:
+        job["progress"] = {"total": await count_transactions(session, user_id)}
+        count = await change_base_currency(session, user_id, new_currency)
+    return {"recalculated_transactions": count, "new_currency": new_currency}
@@ -0,0 +1,135 @@
+from collections.abc import Iterable, Mapping
+from types import MappingProxyType
+from typing import NamedTuple
+
+from cachetools import TTLCache
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import CategoryDB, UserDB
+from app.services.invalidation import invalidation_bus, register_scope
+
+# System categories (user_id NULL) offered to every user. Seeded at deploy time by a migration and
+# again at startup; uq_category_system_default makes both idempotent, so the read path never checks.
+DEFAULT_CATEGORIES = [
+    {"name": "Food", "type": "expense"},
+    {"name": "Transport", "type": "expense"},
+    {"name": "Housing", "type": "expense"},
+    {"name": "Other", "type": "expense"},
+    {"name": "Salary", "type": "income"},
+    {"name": "Freelance", "type": "income"},
+    {"name": "Gifts", "type": "income"},
+    {"name": "Other", "type": "income"},
+]
+
+
+async def seed_default_categories(session: AsyncSession) -> int:
+    """Inserts the missing default categories with one statement and commits. Returns how many were added."""
+    rows = [{**category, "user_id": None, "is_active": True} for category in DEFAULT_CATEGORIES]
+    stmt = (
+        pg_insert(CategoryDB)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["name", "type"], index_where=CategoryDB.user_id.is_(None))
+    )
+    count = (await session.execute(stmt)).rowcount
+    await session.commit()
+    return count
+
+
+class CachedCategory(NamedTuple):
+    name: str
+    type: str
+    is_active: bool
+    # System default (user_id NULL) rather than one of the user's own
+    is_default: bool
+
+
+# Categories visible to a user (their own and the system defaults) by id, for paths that only need a
+# category's name and type. Least recently used users are evicted first; the category endpoints drop
+# the user's entry here and, through the invalidation bus, in the other workers. The TTL bounds
+# staleness while a worker is disconnected from the bus. Entries carry the users.data_version read
+# with them, so a response tagged with a newer version (see GET /categories) never gets an older body.
+CATEGORY_CACHE_SIZE = 4096
+CATEGORY_CACHE_TTL = 300
+
+# user_id -> (data_version, read-only {category_id: CachedCategory})
+_category_cache = TTLCache(maxsize=CATEGORY_CACHE_SIZE, ttl=CATEGORY_CACHE_TTL)
+_category_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def get_category_cache_stats() -> dict:
+    lookups = _category_cache_stats["hits"] + _category_cache_stats["misses"]
+    hit_ratio = _category_cache_stats["hits"] / lookups if lookups else 0.0
+    return {**_category_cache_stats, "size": len(_category_cache), "hit_ratio": round(hit_ratio, 4)}
+
+
+async def get_user_categories(
+    session: AsyncSession, user_id: str, min_version: int = 0
+) -> Mapping[int, CachedCategory]:
+    """
+    The user's categories (inactive ones included), loaded with one query on a miss.
+    Entries read before data_version `min_version` count as misses.
+    """
+    cached = _category_cache.get(user_id)
+    if cached is None or cached[0] < min_version:
+        _category_cache_stats["misses"] += 1
+        return await _load_user_categories(session, user_id)
+    _category_cache_stats["hits"] += 1
+    return cached[1]
+
+
+async def lookup_categories(
+    session: AsyncSession, user_id: str, category_ids: Iterable[int]
+) -> Mapping[int, CachedCategory]:
+    """
+    get_user_categories(), reloaded once if any of `category_ids` is unknown, so a category created
+    by another process is never rejected. Ids still missing afterwards are not the user's to use.
+    """
+    categories = await get_user_categories(session, user_id)
+    if not all(category_id in categories for category_id in category_ids):
+        categories = await _load_user_categories(session, user_id)
+    return categories
+
+
+async def _load_user_categories(session: AsyncSession, user_id: str) -> Mapping[int, CachedCategory]:
+    # The version comes from the same snapshot as the categories; the outer join keeps it for
+    # users without any category
+    user_version = select(UserDB.data_version).where(UserDB.id == user_id).scalar_subquery()
+    version = select(func.coalesce(user_version, 0).label("data_version")).subquery("version")
+    stmt = (
+        select(
+            version.c.data_version,
+            CategoryDB.id,
+            CategoryDB.name,
+            CategoryDB.type,
+            CategoryDB.is_active,
+            CategoryDB.user_id,
+        )
+        .select_from(version)
+        .outerjoin(CategoryDB, ((CategoryDB.user_id == user_id) | CategoryDB.user_id.is_(None)))
+    )
+    rows = (await session.execute(stmt)).all()
+    categories = MappingProxyType(
+        {
+            cat_id: CachedCategory(name, type_, is_active, owner is None)
+            for _, cat_id, name, type_, is_active, owner in rows
+            if cat_id is not None
+        }
+    )
+    _category_cache[user_id] = (rows[0].data_version, categories)
+    return categories
+
+
+def invalidate_category_cache(user_id: str, notified: bool = False) -> None:
+    """
+    Drops the user's categories in every worker; call after committing a change to them.
+    `notified` means the write's bump_data_version() already told the other workers.
+    """
+    _category_cache.pop(user_id, None)
+    _category_cache_stats["invalidations"] += 1
+    if not notified:
+        invalidation_bus.publish(user_id, "categories")
+
+
+register_scope("categories", lambda user_id: _category_cache.pop(user_id, None), _category_cache.clear)
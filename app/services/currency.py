@@ -1,19 +1,120 @@
 import asyncio
 import logging
-from datetime import datetime
+import random
+import time
+from collections.abc import Mapping
+from datetime import UTC, date, datetime, timedelta
 from decimal import Decimal, InvalidOperation
+from email.utils import format_datetime
+from types import MappingProxyType
 
 import httpx
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import EXCHANGE_RATE_API_KEY
+from app.database import async_session_maker
+from app.models.sql import ExchangeRateDB
 
 logger = logging.getLogger(__name__)
 
+# Days of stored rates kept in memory for conversions at a transaction's date
+RATE_HISTORY_DAYS = 366
+
+RATES_UPDATE_INTERVAL = 3600
+# Next attempt after a refresh that failed all its retries
+RATES_FAILURE_RETRY_INTERVAL = 300
+# Rates older than this (e.g. the provider has been unreachable for a while) are reported as stale
+RATES_STALE_AFTER = 3 * RATES_UPDATE_INTERVAL
+# How often workers that do not refresh pick up the rates stored by the one that does
+RATES_SYNC_INTERVAL = 60
+
+# Provider requests: attempts per refresh and full-jitter exponential backoff between them (seconds)
+RATES_HTTP_TIMEOUT = 5.0
+RATES_MAX_ATTEMPTS = 4
+RATES_BACKOFF_BASE = 1.0
+RATES_BACKOFF_CAP = 30.0
+
+
+def _utc_day(value: date | datetime | None) -> date | None:
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=UTC)).astimezone(UTC).date()
+    return value
+
+
+ONE = Decimal("1.00")
+
+
+class RateTable:
+    """
+    Immutable USD-based rates (units of each currency per 1 USD), converted to Decimal once.
+    Cross rates are memoized per (from, to) pair; the memo only caches values derived from the
+    frozen rates, so a table can be shared freely and is replaced, never updated.
+    """
+
+    __slots__ = ("rates", "_cross")
+
+    def __init__(self, rates: Mapping[str, object]):
+        self.rates: Mapping[str, Decimal] = MappingProxyType({code: Decimal(str(rate)) for code, rate in rates.items()})
+        self._cross: dict[tuple[str, str], Decimal] = {}
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def cross(self, from_currency: str, to_currency: str) -> Decimal:
+        """Rate converting `from_currency` into `to_currency`; unknown currencies count as USD."""
+        try:
+            return self._cross[(from_currency, to_currency)]
+        except KeyError:
+            pass
+
+        try:
+            # Calculate cross-rate via USD
+            # Formula: (1 / Rate_From_USD) * Rate_To_USD
+            rate = (ONE / self.rates.get(from_currency, ONE)) * self.rates.get(to_currency, ONE)
+        except (InvalidOperation, ZeroDivisionError) as e:
+            logger.error(f"Error calculating rate: {e}")
+            return ONE
+
+        # Only pairs of known currencies are kept, so arbitrary codes cannot grow the memo
+        if from_currency in self.rates and to_currency in self.rates:
+            self._cross[(from_currency, to_currency)] = rate
+        return rate
+
+
+EMPTY_RATES = RateTable({})
+
 
 class CurrencyService:
     _instance = None
-    _rates: dict = {}
+    # Current rates; replaced as a whole by each refresh, so readers never see a partial table
+    _snapshot: RateTable = EMPTY_RATES
     _last_update: datetime = None
+    # "api" once refreshed in this process, "snapshot" while serving the rates stored by a previous one
+    _rates_source: str | None = None
+
+    # Provider publication times of the current rates (from its time_*_update_unix fields)
+    _provider_last_update: datetime | None = None
+    _provider_next_update: datetime | None = None
+
+    # Pooled client owned by the app lifespan (see use_http_client); None outside the app
+    _http_client: httpx.AsyncClient | None = None
+    _refresh_stats: dict = {
+        "success": 0,
+        "not_modified": 0,
+        "failure": 0,
+        "skipped": 0,
+        "retries": 0,
+        "requests": 0,
+        "total_latency_ms": 0.0,
+        "last_latency_ms": None,
+    }
+
+    # UTC day -> rates in effect that day. Dense between the first and last known day
+    # (gaps repeat the previous day's table), so a lookup is a single dict access.
+    _history: Mapping[date, RateTable] = MappingProxyType({})
+    _history_range: tuple[date, date] | None = None
 
     BASE_API_URL = "https://v6.exchangerate-api.com/v6"
 
@@ -22,71 +123,310 @@ class CurrencyService:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    async def start_periodic_update(self):
-        """Starts the infinite loop for updating currency rates."""
-        logger.info("Starting background currency update task...")
-        while True:
-            try:
-                await self._update_rates_from_api("USD")
-            except Exception as e:
-                logger.error(f"Error in periodic update: {e}")
+    @property
+    def last_update(self) -> datetime | None:
+        """When the cached rates were fetched from the provider, None when there are none."""
+        return self._last_update
+
+    def use_http_client(self, client: httpx.AsyncClient | None) -> None:
+        """Sets the long-lived client for provider requests; the caller owns (and closes) it."""
+        self._http_client = client
+
+    def rates_status(self) -> dict:
+        """Where the current rates come from, how old they are and how refreshes went, for monitoring."""
+        now = datetime.now(UTC)
+        age = (now - self._last_update).total_seconds() if self._last_update else None
+        # Old rates are fine while the provider has not published newer ones
+        up_to_date = self._provider_next_update is not None and now < self._provider_next_update
+        stats = self._refresh_stats
+        requests = stats["requests"]
+        return {
+            "source": self._rates_source,
+            "currencies": len(self._snapshot),
+            "last_update": self._last_update.isoformat() if self._last_update else None,
+            "age_seconds": round(age) if age is not None else None,
+            "provider_next_update": self._provider_next_update.isoformat() if self._provider_next_update else None,
+            "stale": age is None or (age > RATES_STALE_AFTER and not up_to_date),
+            "refresh": {
+                **{key: value for key, value in stats.items() if key != "total_latency_ms"},
+                "avg_latency_ms": round(stats["total_latency_ms"] / requests, 1) if requests else None,
+            },
+        }
+
+    async def refresh(self) -> float:
+        """
+        One scheduled refresh (run by the scheduler leader only): asks the provider for new rates
+        and stores them for every worker. Returns the seconds until the next refresh.
+        """
+        delay = RATES_UPDATE_INTERVAL
+        try:
+            if not self._provider_has_newer_rates():
+                self._refresh_stats["skipped"] += 1
+            elif await self._update_rates_from_api("USD"):
+                async with async_session_maker() as session:
+                    await self.save_rates(
+                        session, self._last_update.date(), self._snapshot, self._last_update, self._provider_next_update
+                    )
+            else:
+                delay = RATES_FAILURE_RETRY_INTERVAL
+        except Exception as e:
+            logger.error(f"Error in periodic update: {e}")
+            delay = RATES_FAILURE_RETRY_INTERVAL
+        return self._next_refresh_delay(delay)
+
+    async def sync_from_storage(self) -> float:
+        """
+        Scheduled on workers that are not the leader: adopts rates the leader stored since ours.
+        One query, usually returning nothing. Returns the seconds until the next check.
+        """
+        try:
+            async with async_session_maker() as session:
+                if self._last_update is None:
+                    await self.load_history(session)
+                else:
+                    await self._load_stored_since(session, self._last_update)
+        except Exception as e:
+            logger.error(f"Error syncing stored rates: {e}")
+        return RATES_SYNC_INTERVAL
+
+    def _provider_has_newer_rates(self) -> bool:
+        return self._provider_next_update is None or datetime.now(UTC) >= self._provider_next_update
 
-            # Wait for 1 hour before next update
-            await asyncio.sleep(3600)
+    def _next_refresh_delay(self, delay: float) -> float:
+        """Wakes up shortly after the provider's announced next update when that comes sooner."""
+        if self._provider_next_update is None:
+            return delay
+        until_next = (self._provider_next_update - datetime.now(UTC)).total_seconds() + 60
+        return max(60.0, min(delay, until_next))
 
-    async def get_rate(self, from_currency: str, to_currency: str = "USD") -> Decimal:
+    def rate(self, from_currency: str, to_currency: str = "USD", on: date | datetime | None = None) -> Decimal:
+        """
+        Rate converting `from_currency` into `to_currency` on the UTC day of `on` (latest rates when None).
+        Synchronous: a couple of dict lookups once the pair is memoized.
+        """
         from_currency = from_currency.upper()
         to_currency = to_currency.upper()
 
         if from_currency == to_currency:
-            return Decimal("1.00")
+            return ONE
 
         if not EXCHANGE_RATE_API_KEY:
             logger.error("EXCHANGE_RATE_API_KEY is missing in .env")
-            return Decimal("1.00")
+            return ONE
 
-        # NOTE: We do NOT wait for API here anymore.
-        # If cache is empty, we return 1.00 immediately to avoid blocking.
-        # The background task is responsible for filling/updating _rates.
+        # NOTE: We do NOT wait for API here.
+        # If there are no rates yet, unknown currencies count as 1.00 to avoid blocking.
+        # The background task is responsible for publishing new snapshots.
+        return self._rates_on(_utc_day(on)).cross(from_currency, to_currency)
 
-        try:
-            rate_base_to_from = self._get_rate_value(from_currency)
-            rate_base_to_target = self._get_rate_value(to_currency)
+    def convert(
+        self, amount: Decimal, from_currency: str, to_currency: str = "USD", on: date | datetime | None = None
+    ) -> Decimal:
+        """`amount` in `to_currency`, for hot loops that should not await per row."""
+        return amount * self.rate(from_currency, to_currency, on)
 
-            # Calculate cross-rate via USD
-            # Formula: (1 / Rate_From_USD) * Rate_To_USD
-            rate = (Decimal("1.00") / rate_base_to_from) * rate_base_to_target
-            return rate
+    async def get_rate(
+        self, from_currency: str, to_currency: str = "USD", on: date | datetime | None = None
+    ) -> Decimal:
+        """Awaitable rate(); kept for callers (and tests) that treat the rate source as async."""
+        return self.rate(from_currency, to_currency, on)
 
-        except (InvalidOperation, ZeroDivisionError, TypeError) as e:
-            logger.error(f"Error calculating rate: {e}")
-            return Decimal("1.00")
+    async def get_rate_map(self, from_currency: str, on: date | datetime | None = None) -> dict[str, Decimal]:
+        """
+        Returns rates from `from_currency` to every known currency on the day of `on`.
+        Lets a single SQL statement convert into a base currency it reads itself.
+        """
+        targets = set(self._rates_on(_utc_day(on)).rates) | {from_currency.upper(), "USD"}
+        return {code: await self.get_rate(from_currency, code, on) for code in targets}
+
+    def _rates_on(self, day: date | None) -> RateTable:
+        """
+        Rates in effect on `day`. The latest rates serve None and days after the history;
+        days before it get the oldest rates known.
+        """
+        if day is None or self._history_range is None:
+            return self._snapshot
+        first, last = self._history_range
+        if day > last:
+            return self._snapshot if len(self._snapshot) else self._history[last]
+        return self._history[max(day, first)]
+
+    def _record_day(self, day: date, table: RateTable) -> None:
+        """Publishes a new history with `day` added, carrying the last known rates over any gap."""
+        history = dict(self._history)
+        if self._history_range is None:
+            first = last = day
+        else:
+            first, last = self._history_range
+            if day < first:
+                return
+            while last + timedelta(days=1) < day:
+                last += timedelta(days=1)
+                history[last] = history[last - timedelta(days=1)]
+            last = max(day, last)
+        history[day] = table
+        self._history, self._history_range = MappingProxyType(history), (first, last)
+
+    async def load_history(self, session: AsyncSession, days: int = RATE_HISTORY_DAYS) -> int:
+        """
+        Loads the last `days` days of stored rates with a single query. Returns the number of stored days.
+        Until the first refresh succeeds, the newest stored day also serves as the current rates,
+        so startup never waits for the provider.
+        """
+        since = datetime.now(UTC).date() - timedelta(days=days)
+        by_day, fetched_at, next_update = await self._stored_rates(session, ExchangeRateDB.day >= since)
+
+        # Days arrive in order; gaps repeat the previous day's table
+        history: dict[date, RateTable] = {}
+        last = None
+        for day, rates in by_day.items():
+            while last is not None and last + timedelta(days=1) < day:
+                history[last + timedelta(days=1)] = history[last]
+                last += timedelta(days=1)
+            history[day] = RateTable(rates)
+            last = day
+
+        self._history = MappingProxyType(history)
+        self._history_range = (min(by_day), last) if by_day else None
 
-    def _get_rate_value(self, currency: str) -> Decimal:
-        if currency in self._rates:
-            return Decimal(str(self._rates[currency]))
-        return Decimal("1.00")
+        if by_day and not len(self._snapshot):
+            self._adopt_stored(history[last], fetched_at, next_update)
+        return len(by_day)
+
+    async def _load_stored_since(self, session: AsyncSession, since: datetime) -> int:
+        """Adds the days stored (or re-stored) after `since`; the newest becomes the current rates."""
+        by_day, fetched_at, next_update = await self._stored_rates(session, ExchangeRateDB.fetched_at > since)
+        for day, rates in by_day.items():
+            self._record_day(day, RateTable(rates))
+        if by_day:
+            self._adopt_stored(self._history[self._history_range[1]], fetched_at, next_update)
+        return len(by_day)
+
+    @staticmethod
+    async def _stored_rates(session: AsyncSession, condition) -> tuple[dict[date, dict], datetime, datetime | None]:
+        """Stored rates matching `condition` by day (in order), with the newest fetched_at and next_update."""
+        stmt = (
+            select(
+                ExchangeRateDB.day,
+                ExchangeRateDB.currency,
+                ExchangeRateDB.rate,
+                ExchangeRateDB.fetched_at,
+                ExchangeRateDB.next_update,
+            )
+            .where(condition)
+            .order_by(ExchangeRateDB.day)
+        )
+        by_day: dict[date, dict] = {}
+        fetched_at = next_update = None
+        for day, currency, rate, row_fetched_at, row_next_update in (await session.execute(stmt)).all():
+            by_day.setdefault(day, {})[currency] = rate
+            if fetched_at is None or row_fetched_at > fetched_at:
+                fetched_at, next_update = row_fetched_at, row_next_update
+        return by_day, fetched_at, next_update
+
+    def _adopt_stored(self, table: RateTable, fetched_at: datetime, next_update: datetime | None) -> None:
+        self._snapshot = table
+        self._last_update = fetched_at
+        self._provider_next_update = next_update
+        self._rates_source = "snapshot"
+
+    async def save_rates(
+        self,
+        session: AsyncSession,
+        day: date,
+        table: RateTable,
+        fetched_at: datetime,
+        next_update: datetime | None = None,
+    ) -> None:
+        """Stores `table` as the rates of `day` (one multi-row upsert) and commits."""
+        rows = [
+            {"day": day, "currency": code, "rate": rate, "fetched_at": fetched_at, "next_update": next_update}
+            for code, rate in table.rates.items()
+        ]
+        if not rows:
+            return
+        stmt = pg_insert(ExchangeRateDB).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "currency"],
+            set_={
+                "rate": stmt.excluded.rate,
+                "fetched_at": stmt.excluded.fetched_at,
+                "next_update": stmt.excluded.next_update,
+            },
+        )
+        await session.execute(stmt)
+        await session.commit()
+        self._record_day(day, table)
 
     async def get_all_rates(self) -> dict:
-        """Returns the cached dictionary of all rates (Base: USD)."""
-        if not self._rates:
-            try:
-                await self._update_rates_from_api("USD")
-            except Exception:
-                pass
-        return self._rates
+        """
+        Returns the current rates (Base: USD), possibly none yet. Never calls the provider: the
+        scheduled refresh (or sync on followers) fills the snapshot, so requests don't wait on it.
+        """
+        return dict(self._snapshot.rates)
 
-    async def _update_rates_from_api(self, base: str):
+    async def _update_rates_from_api(self, base: str) -> bool:
+        """
+        Fetches the latest rates, retrying network errors, 429 and 5xx with jittered exponential backoff.
+        Conditional on the provider's last publication time: a 304 keeps the current snapshot.
+        Returns True when the current rates are confirmed up to date.
+        """
         url = f"{self.BASE_API_URL}/{EXCHANGE_RATE_API_KEY}/latest/{base}"
+        headers = {}
+        if self._provider_last_update and self._rates_source == "api":
+            headers["If-Modified-Since"] = format_datetime(self._provider_last_update, usegmt=True)
+
+        for attempt in range(RATES_MAX_ATTEMPTS):
+            if attempt:
+                self._refresh_stats["retries"] += 1
+                await asyncio.sleep(random.uniform(0, min(RATES_BACKOFF_CAP, RATES_BACKOFF_BASE * 2**attempt)))
+
+            try:
+                resp = await self._request(url, headers)
+            except httpx.HTTPError as e:
+                logger.warning(f"Network error updating rates (attempt {attempt + 1}): {e}")
+                continue
+
+            if resp.status_code == 304:
+                self._last_update = datetime.now(UTC)
+                self._refresh_stats["not_modified"] += 1
+                return True
+            if resp.status_code == 200:
+                self._publish(resp.json())
+                self._refresh_stats["success"] += 1
+                logger.info("Currency rates updated from API (background).")
+                return True
+
+            logger.warning(f"Failed to update rates: {resp.status_code}")
+            if resp.status_code != 429 and resp.status_code < 500:
+                # e.g. an invalid key: retrying will not help
+                break
+
+        self._refresh_stats["failure"] += 1
+        return False
+
+    async def _request(self, url: str, headers: dict) -> httpx.Response:
+        started = time.perf_counter()
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, timeout=5.0)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    self._rates = data.get("conversion_rates", {})
-                    self._last_update = datetime.now()
-                    logger.info("Currency rates updated from API (background).")
-                else:
-                    logger.warning(f"Failed to update rates: {resp.status_code}")
-        except Exception as e:
-            logger.error(f"Network error updating rates: {e}")
+            if self._http_client is not None:
+                return await self._http_client.get(url, headers=headers)
+            # Outside the app (scripts, first-request fallback) use a one-off client
+            async with httpx.AsyncClient(timeout=RATES_HTTP_TIMEOUT) as client:
+                return await client.get(url, headers=headers)
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._refresh_stats["requests"] += 1
+            self._refresh_stats["total_latency_ms"] += latency_ms
+            self._refresh_stats["last_latency_ms"] = round(latency_ms, 1)
+
+    def _publish(self, data: dict) -> None:
+        """Swaps in the rates of a provider response."""
+        self._snapshot = RateTable(data.get("conversion_rates", {}))
+        self._last_update = datetime.now(UTC)
+        self._rates_source = "api"
+        for attribute, key in [
+            ("_provider_last_update", "time_last_update_unix"),
+            ("_provider_next_update", "time_next_update_unix"),
+        ]:
+            timestamp = data.get(key)
+            setattr(self, attribute, datetime.fromtimestamp(timestamp, UTC) if timestamp else None)
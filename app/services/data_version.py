@@ -0,0 +1,77 @@
+import hashlib
+from collections.abc import Iterable
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import UserDB
+from app.services.invalidation import INVALIDATION_CHANNEL, invalidation_payload
+
+# users.data_version increases with every write to a user's data. GET endpoints send it as a
+# weak ETag and answer a matching If-None-Match with 304 after a single primary-key read.
+# The tag also names the user: versions are small numbers that different accounts share, and
+# accounts signed in on the same webview share its HTTP cache.
+# Users without a row are at version 0; the first write creates the row at version 1.
+
+
+def bump_data_version(user_id: str, invalidate: Iterable[str] = ("analytics",), **changes):
+    """
+    Upsert of the user's row that increments data_version (and applies `changes`); RETURNING
+    base_currency and rollup_ready. Run it in the same transaction as the write, or attach it to
+    the write as a CTE. It locks the row until the write commits.
+    It also notifies the other workers to drop the user's cached `invalidate` scopes. Postgres
+    delivers that on commit only, so after committing callers just evict locally (notified=True).
+    """
+    notify = func.pg_notify(INVALIDATION_CHANNEL, invalidation_payload(user_id, invalidate))
+    stmt = pg_insert(UserDB).values({"id": user_id, "base_currency": "USD", "data_version": 1, **changes})
+    return stmt.on_conflict_do_update(
+        index_elements=["id"], set_={"data_version": UserDB.data_version + 1, **changes}
+    ).returning(UserDB.base_currency, UserDB.rollup_ready, notify.label("notified"))
+
+
+async def get_data_version(session: AsyncSession, user_id: str) -> int:
+    result = await session.execute(select(UserDB.data_version).where(UserDB.id == user_id))
+    return result.scalar_one_or_none() or 0
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110): proxies may strip or add the W/ prefix
+    bare = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == bare for candidate in if_none_match.split(","))
+
+
+async def not_modified(
+    request: Request, response: Response, session: AsyncSession, user_id: str, *extra
+) -> Response | None:
+    """
+    Sets the ETag for the user's current data version (plus any `extra` parts the body depends on).
+    Returns a 304 response to send instead of running the query when the client is up to date.
+
+    The version is read before the endpoint's query, so a concurrent write can only make
+    the body newer than its tag, which costs one extra refetch, never a stale 304.
+    """
+    return not_modified_since(request, response, user_id, await get_data_version(session, user_id), *extra)
+
+
+def not_modified_since(request: Request, response: Response, user_id: str, version: int, *extra) -> Response | None:
+    """
+    not_modified() for a data version the endpoint has read itself. Bodies served from a cache
+    must be at least as new as `version`.
+    """
+    user_tag = hashlib.sha256(user_id.encode()).hexdigest()[:12]
+    etag = 'W/"' + "-".join(str(part) for part in (user_tag, version, *extra)) + '"'
+
+    # Let the webview cache the body but revalidate it on every request, per account
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-Telegram-Init-Data"}
+
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+
+# Column order of exported rows (CSV header and NDJSON keys)
+EXPORT_FIELDS = ("id", "date", "type", "category", "amount", "original_amount", "currency", "note")
+
+
+def _export_row(row) -> dict:
+    """
+    Normalizes one result row. Amounts stay strings so no precision is lost;
+    legacy rows without original_amount were stored in USD.
+    """
+    original_amount = row["original_amount"]
+    currency = row["currency"]
+    if original_amount is None:
+        original_amount, currency = row["amount"], "USD"
+
+    return {
+        "id": row["id"],
+        "date": row["date"].isoformat() if row["date"] else None,
+        "type": row["type"],
+        "category": row["category"],
+        "amount": str(row["amount"]),
+        "original_amount": str(original_amount),
+        "currency": currency,
+        "note": row["note"],
+    }
+
+
+def format_csv(batch: Iterable, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(_export_row(row) for row in batch)
+    return buffer.getvalue().encode()
+
+
+def format_ndjson(batch: Iterable, header: bool = False) -> bytes:
+    lines = (json.dumps(_export_row(row), ensure_ascii=False) + "\n" for row in batch)
+    return "".join(lines).encode()
+
+
+FORMATTERS = {"csv": format_csv, "ndjson": format_ndjson}
+
+
+async def encode_batches(batches: AsyncIterable, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Turns batches of rows into chunks of the requested format, one chunk per batch.
+    """
+    formatter = FORMATTERS[fmt]
+    first = True
+    async for batch in batches:
+        yield formatter(batch, header=first)
+        first = False
+
+    if first:
+        # No rows at all: still emit the CSV header so the file is well-formed
+        yield formatter((), header=True)
+
+
+async def gzip_chunks(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Incrementally gzips a byte stream without buffering it.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
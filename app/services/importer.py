@@ -0,0 +1,333 @@
+import codecs
+import csv
+from collections.abc import AsyncIterable, AsyncIterator
+from datetime import UTC, date, datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import DateTime, Integer, Numeric, String, Text, column, func, literal, select, table, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import CategoryDB, TransactionDB
+from app.services.balance import apply_balance_delta, signed_total
+from app.services.base_currency import rate_table
+from app.services.currency import CurrencyService
+from app.services.data_version import bump_data_version
+from app.services.rollup import apply_rollup_delta, rollup_rows, utc_day
+from app.services.user_settings import get_user_settings
+
+# Rows parsed, resolved and COPY'd into the staging table per round trip
+IMPORT_BATCH_SIZE = 5000
+# Per-row errors returned in the response; the total count is always reported
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+REQUIRED_COLUMNS = ("date", "amount", "category")
+TRANSACTION_TYPES = ("expense", "income")
+# transactions.amount / original_amount are NUMERIC(10, 2)
+MAX_AMOUNT = Decimal("100000000")
+CENT = Decimal("0.01")
+
+STAGING_TABLE = "import_staging"
+STAGING_COLUMNS = ("line_no", "original_amount", "currency", "date", "category_id", "note")
+
+_staging = table(
+    STAGING_TABLE,
+    column("line_no", Integer),
+    column("original_amount", Numeric),
+    column("currency", String),
+    column("date", DateTime(timezone=True)),
+    column("category_id", Integer),
+    column("note", Text),
+)
+
+
+class ImportFormatError(ValueError):
+    """The upload as a whole cannot be imported (e.g. missing header columns)."""
+
+
+async def iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, list[str]]]:
+    """
+    Incrementally parses a CSV byte stream into (line number, fields) records.
+    Quoted fields may span lines: a record ends once its double quotes are balanced.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    record: list[str] = []
+    quotes = 0
+    line_no = 0
+    record_line = 1
+
+    def flush():
+        try:
+            return next(csv.reader(record), [])
+        except csv.Error as e:
+            return e
+
+    async for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            line_no += 1
+            record.append(line + "\n")
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                yield record_line, flush()
+                record, quotes, record_line = [], 0, line_no + 1
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        record.append(pending)
+    if record:
+        yield record_line, flush()
+
+
+class TransactionImporter:
+    """
+    Loads a CSV export into a user's transactions:
+    rows are validated in Python, category names resolved (missing user categories are created),
+    rates looked up once per distinct (currency, day), and each batch is COPY'd into a
+    temporary staging table. A single INSERT ... SELECT then converts and merges the staging rows,
+    updating the stored balance and analytics rollup in the same statement.
+
+    Only that last statement locks the user's row (bump_data_version), so a slow upload doesn't
+    hold up the user's other writes. It re-checks the base currency the rates were fetched for
+    and, if it changed meanwhile, runs again with rates into the new one.
+    """
+
+    def __init__(self, session: AsyncSession, user_id: str, batch_size: int = IMPORT_BATCH_SIZE):
+        self.session = session
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.errors: list[dict] = []
+        self.error_count = 0
+        self._categories: dict[tuple[str, str], int] = {}
+        # (currency, UTC day) -> rate into self._base_currency
+        self._rates: dict[tuple[str, date], Decimal] = {}
+        self._base_currency = "USD"
+        self._copy = None
+
+    def _error(self, line_no: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    async def run(self, chunks: AsyncIterable[bytes]) -> dict:
+        """
+        Imports the CSV stream. Does not commit.
+        """
+        header = None
+        batch = []
+
+        await self._prepare()
+
+        async for line_no, fields in iter_csv_records(chunks):
+            if isinstance(fields, csv.Error):
+                self._error(line_no, f"Malformed CSV: {fields}")
+                continue
+            if not any(field.strip() for field in fields):
+                continue
+            if header is None:
+                header = self._parse_header(fields)
+                continue
+
+            row = self._parse_row(line_no, header, fields)
+            if row:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                await self._load(batch)
+                batch = []
+
+        if header is None:
+            raise ImportFormatError("CSV file is empty")
+        if batch:
+            await self._load(batch)
+
+        imported = await self._merge()
+        return {"imported": imported, "failed": self.error_count, "errors": self.errors}
+
+    async def _prepare(self) -> None:
+        # Not locked: _merge() re-checks it
+        self._base_currency = (await get_user_settings(self.session, self.user_id, "import_transactions")).base_currency
+
+        # User categories override system ones with the same name
+        stmt = (
+            select(CategoryDB.id, CategoryDB.name, CategoryDB.type)
+            .where(((CategoryDB.user_id == self.user_id) | CategoryDB.user_id.is_(None)) & CategoryDB.is_active)
+            .order_by(CategoryDB.user_id.nullsfirst())
+        )
+        for cat_id, name, type_ in (await self.session.execute(stmt)).all():
+            self._categories[(name.casefold(), type_)] = cat_id
+
+        await self.session.execute(
+            text(
+                f"""
+                CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                    line_no integer,
+                    original_amount numeric(10, 2),
+                    currency varchar(3),
+                    date timestamptz,
+                    category_id integer,
+                    note text
+                ) ON COMMIT DROP
+                """
+            )
+        )
+
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        self._copy = raw_connection.driver_connection.copy_records_to_table
+
+    @staticmethod
+    def _parse_header(fields: list[str]) -> dict[str, int]:
+        header = {name.strip().lower(): index for index, name in enumerate(fields)}
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise ImportFormatError(f"Missing required column(s): {', '.join(missing)}")
+        return header
+
+    def _parse_row(self, line_no: int, header: dict[str, int], fields: list[str]):
+        def get(name: str, default: str = "") -> str:
+            index = header.get(name)
+            if index is None or index >= len(fields):
+                return default
+            return fields[index].strip() or default
+
+        try:
+            amount = Decimal(get("amount").replace(",", ".")).quantize(CENT)
+        except InvalidOperation:
+            self._error(line_no, "Invalid amount")
+            return None
+        if not amount.is_finite() or amount <= 0 or amount >= MAX_AMOUNT:
+            self._error(line_no, "Amount must be positive and below 100000000")
+            return None
+
+        try:
+            tx_date = datetime.fromisoformat(get("date"))
+        except ValueError:
+            self._error(line_no, "Invalid date, expected ISO 8601")
+            return None
+        tx_date = tx_date.replace(tzinfo=UTC) if tx_date.tzinfo is None else tx_date.astimezone(UTC)
+
+        currency = get("currency", "USD").upper()
+        if len(currency) != 3 or not currency.isalpha():
+            self._error(line_no, "Invalid currency code")
+            return None
+
+        type_ = get("type", "expense").lower()
+        if type_ not in TRANSACTION_TYPES:
+            self._error(line_no, "Type must be 'expense' or 'income'")
+            return None
+
+        category = get("category")
+        if not category:
+            self._error(line_no, "Category is required")
+            return None
+
+        return line_no, amount, currency, tx_date, category, type_, get("note") or None
+
+    async def _load(self, batch: list[tuple]) -> None:
+        await self._resolve_categories({(row[4], row[5]) for row in batch})
+
+        await self._fetch_rates({(row[2], row[3].date()) for row in batch} - self._rates.keys())
+
+        records = [
+            (line_no, original_amount, currency, tx_date, self._categories[(category.casefold(), type_)], note)
+            for line_no, original_amount, currency, tx_date, category, type_, note in batch
+        ]
+        await self._copy(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+
+    async def _fetch_rates(self, pairs: set[tuple[str, date]]) -> None:
+        currency_service = CurrencyService()
+        for currency, day in pairs:
+            self._rates[(currency, day)] = await currency_service.get_rate(currency, self._base_currency, on=day)
+
+    async def _resolve_categories(self, wanted: set[tuple[str, str]]) -> None:
+        missing = {}
+        for name, type_ in wanted:
+            key = (name.casefold(), type_)
+            if key not in self._categories:
+                missing.setdefault(key, {"user_id": self.user_id, "name": name, "type": type_, "is_active": True})
+        if not missing:
+            return
+
+        stmt = pg_insert(CategoryDB).values(list(missing.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name", "type", "user_id"], set_={"is_active": True}
+        ).returning(CategoryDB.id, CategoryDB.name, CategoryDB.type)
+        for cat_id, name, type_ in (await self.session.execute(stmt)).all():
+            self._categories[(name.casefold(), type_)] = cat_id
+
+    async def _merge(self) -> int:
+        while True:
+            result = (await self.session.execute(self._merge_statement())).one()
+            if result.base_currency == self._base_currency:
+                break
+            # Changed during the upload; the row is locked now, so the next attempt matches
+            self._base_currency = result.base_currency
+            self._rates = {}
+            await self._fetch_rates({tuple(pair) for pair in await self.session.execute(self._staged_pairs())})
+
+        for line_no in result.too_large or ():
+            self._error(line_no, f"Amount in {self._base_currency} is too large")
+        return result.imported
+
+    @staticmethod
+    def _staged_pairs():
+        return select(_staging.c.currency, utc_day(_staging.c.date)).distinct()
+
+    def _merge_statement(self):
+        """
+        Bumps the data version, converts the staged rows with self._rates and inserts those that fit,
+        unless the base currency is no longer self._base_currency. Returns the base currency, the
+        number of rows inserted and the line numbers of those too large in it.
+        """
+        account = bump_data_version(self.user_id, invalidate=("analytics", "categories")).cte("account")
+        rates = rate_table(self._rates)
+        converted = (
+            select(
+                _staging.c.line_no,
+                func.round(_staging.c.original_amount * rates.c.rate, 2).label("amount"),
+                _staging.c.original_amount,
+                _staging.c.currency,
+                _staging.c.date,
+                _staging.c.category_id,
+                _staging.c.note,
+            )
+            .where(_staging.c.currency == rates.c.currency, utc_day(_staging.c.date) == rates.c.day)
+            .cte("converted")
+        )
+        rows = (
+            select(
+                literal(self.user_id),
+                converted.c.amount,
+                converted.c.original_amount,
+                converted.c.currency,
+                converted.c.date,
+                converted.c.category_id,
+                converted.c.note,
+            )
+            .select_from(converted.join(account, account.c.base_currency == self._base_currency))
+            .where(converted.c.amount < MAX_AMOUNT)
+            .order_by(converted.c.line_no)
+        )
+
+        inserted = (
+            pg_insert(TransactionDB)
+            .from_select(["user_id", "amount", "original_amount", "currency", "date", "category_id", "note"], rows)
+            .returning(TransactionDB.amount, TransactionDB.category_id, TransactionDB.date)
+            .cte("inserted")
+        )
+        balance = apply_balance_delta(self.user_id, signed_total(inserted.c.amount, inserted.c.category_id))
+        rollup = apply_rollup_delta(
+            self.user_id,
+            rollup_rows(inserted.c.date, inserted.c.category_id, inserted.c.amount),
+            ready=account.c.rollup_ready,
+        )
+
+        line_no = converted.c.line_no
+        too_large = select(func.array_agg(aggregate_order_by(line_no, line_no))).where(converted.c.amount >= MAX_AMOUNT)
+        return select(
+            account.c.base_currency,
+            select(func.count()).select_from(inserted).scalar_subquery().label("imported"),
+            too_large.scalar_subquery().label("too_large"),
+        ).add_cte(balance.cte("balance"), rollup.cte("rollup"))
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections.abc import Callable, Iterable
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Cross-worker cache invalidation over Postgres LISTEN/NOTIFY. Writes send '<user_id>:<scopes>'
+# (comma-separated) on INVALIDATION_CHANNEL from their own transaction (bump_data_version), so it is
+# delivered exactly when the write commits; after the commit the caches evict locally. Invalidations
+# without a transaction to ride on go through the bus's queue instead. Every worker keeps one
+# dedicated asyncpg connection that LISTENs and evicts the matching entries; the writer's own
+# worker receives the transactional ones too and evicts a second time, which is harmless.
+# The caches keep their TTLs as the fallback while a worker is disconnected from the bus.
+INVALIDATION_CHANNEL = "sana_invalidate"
+# Idle time after which the connection is pinged (a dead one is only noticed on use)
+INVALIDATION_PING_INTERVAL = 15
+INVALIDATION_RECONNECT_DELAY = 2
+# Notifications queued while disconnected beyond this are dropped (caches are cleared on reconnect anyway)
+INVALIDATION_QUEUE_SIZE = 10_000
+
+# scope -> (evict one user's entries, evict everything)
+_scopes: dict[str, tuple[Callable[[str], None], Callable[[], None]]] = {}
+
+
+def register_scope(scope: str, evict_user: Callable[[str], None], evict_all: Callable[[], None]) -> None:
+    """Lets a cache be invalidated from other workers; `evict_*` must only touch the local cache."""
+    _scopes[scope] = (evict_user, evict_all)
+
+
+def invalidation_payload(user_id: str, scopes: Iterable[str]) -> str:
+    return f"{user_id}:{','.join(scopes)}"
+
+
+def _evict_everything() -> None:
+    for _, evict_all in _scopes.values():
+        evict_all()
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._queue: asyncio.Queue[str] | None = None
+        self._connection: asyncpg.Connection | None = None
+        self._server_pid: int | None = None
+        self._stats = {"connected": False, "published": 0, "received": 0, "dropped": 0, "reconnects": 0}
+
+    def publish(self, user_id: str, scope: str) -> None:
+        """
+        Queues an invalidation for the other workers; a no-op outside a running app. For callers
+        without a write transaction: writes notify through bump_data_version() instead.
+        """
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(f"{user_id}:{scope}")
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+
+    async def start(self, dsn: str) -> None:
+        """Infinite loop: (re)connects, LISTENs and sends the queued notifications."""
+        self._queue = asyncio.Queue(maxsize=INVALIDATION_QUEUE_SIZE)
+        connected_before = False
+        try:
+            while True:
+                try:
+                    self._connection = await asyncpg.connect(dsn)
+                    self._server_pid = self._connection.get_server_pid()
+                    await self._connection.add_listener(INVALIDATION_CHANNEL, self._on_notification)
+                    self._stats["connected"] = True
+                    if connected_before:
+                        # Notifications sent while we were away are lost: start over
+                        self._stats["reconnects"] += 1
+                        _evict_everything()
+                    connected_before = True
+                    logger.info(f"Listening for cache invalidations on {INVALIDATION_CHANNEL}")
+                    await self._send_queued()
+                except Exception as e:
+                    logger.error(f"Invalidation bus connection failed: {e}")
+                finally:
+                    self._stats["connected"] = False
+                    await self._close()
+                await asyncio.sleep(INVALIDATION_RECONNECT_DELAY)
+        finally:
+            self._queue = None
+
+    async def _send_queued(self) -> None:
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=INVALIDATION_PING_INTERVAL)
+            except TimeoutError:
+                await self._connection.execute("SELECT 1")
+                continue
+
+            payloads = [first]
+            while not self._queue.empty():
+                payloads.append(self._queue.get_nowait())
+            # One round-trip for everything queued meanwhile; duplicates collapse
+            unique = list(dict.fromkeys(payloads))
+            try:
+                await self._connection.execute(
+                    "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload", INVALIDATION_CHANNEL, unique
+                )
+            except Exception:
+                # Sent after reconnecting
+                for payload in unique:
+                    self.publish(*payload.rsplit(":", 1))
+                raise
+            self._stats["published"] += len(unique)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        if pid == self._server_pid:
+            # Our own, already evicted locally
+            return
+        self._stats["received"] += 1
+        user_id, _, scopes = payload.rpartition(":")
+        for scope in scopes.split(","):
+            if scope in _scopes:
+                _scopes[scope][0](user_id)
+            else:
+                logger.warning(f"Unknown invalidation scope: {payload}")
+
+    async def _close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=5)
+            except Exception:
+                connection.terminate()
+
+    def status(self) -> dict:
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {**self._stats, "pending": pending}
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import async_session_maker
+from app.models.sql import JobDB
+
+logger = logging.getLogger(__name__)
+
+# Background jobs started by API requests. The job runs in the worker that started it, but its
+# state lives in the jobs table, so any worker can report it and it outlives restarts. The running
+# worker writes progress every JOB_HEARTBEAT_INTERVAL seconds; a job without a heartbeat for
+# JOB_STALE_AFTER seconds lost its worker and is reported as failed. Finished jobs stay queryable
+# for JOB_RETENTION seconds.
+JOB_HEARTBEAT_INTERVAL = 5
+JOB_STALE_AFTER = 60
+JOB_RETENTION = 3600
+JOB_PRUNE_INTERVAL = 600
+
+ACTIVE_STATUSES = ("pending", "running")
+INTERRUPTED = "Interrupted: the worker running it stopped"
+
+# Keep references to running tasks to avoid GC
+_tasks: set[asyncio.Task] = set()
+
+
+def _stale():
+    return JobDB.updated_at < func.now() - timedelta(seconds=JOB_STALE_AFTER)
+
+
+def _as_dict(job: JobDB) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "target": job.target,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def _fail_stale(session: AsyncSession, *where) -> None:
+    """Marks unfinished jobs whose worker stopped sending heartbeats as failed. Does not commit."""
+    await session.execute(
+        update(JobDB)
+        .where(JobDB.status.in_(ACTIVE_STATUSES), _stale(), *where)
+        .values(status="failed", error=INTERRUPTED, finished_at=func.now())
+    )
+
+
+async def start_job(
+    session: AsyncSession,
+    user_id: str,
+    kind: str,
+    work: Callable[[dict], Awaitable[dict | None]],
+    target: str | None = None,
+) -> dict:
+    """
+    Records the job, commits, and runs `work(job)` in the background; returns the job. `work` may
+    update job["progress"] while it runs; its return value becomes job["result"].
+    A job of the same kind already running for the user (in any worker) is returned instead of
+    starting another; callers compare its "target" with theirs.
+    """
+    await _fail_stale(session, JobDB.user_id == user_id, JobDB.kind == kind)
+    while True:
+        stmt = (
+            pg_insert(JobDB)
+            .values(id=uuid4().hex, user_id=user_id, kind=kind, target=target)
+            .on_conflict_do_nothing(index_elements=["user_id", "kind"], index_where=JobDB.status.in_(ACTIVE_STATUSES))
+            .returning(JobDB)
+        )
+        created = (await session.execute(stmt)).scalar_one_or_none()
+        if created is not None:
+            break
+        if running := await find_active_job(session, user_id, kind):
+            await session.commit()
+            return running
+        # Finished in between: try again
+
+    job = _as_dict(created)
+    await session.commit()
+
+    session_maker = async_sessionmaker(session.bind, expire_on_commit=False)
+    task = asyncio.create_task(_run(session_maker, job, work))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def _save(session_maker: async_sessionmaker, job: dict, finished: bool = False) -> None:
+    values = {"status": job["status"], "progress": job["progress"], "updated_at": func.now()}
+    if finished:
+        values.update(result=job["result"], error=job["error"], finished_at=func.now())
+    async with session_maker() as session:
+        await session.execute(update(JobDB).where(JobDB.id == job["id"]).values(**values))
+        await session.commit()
+
+
+async def _heartbeat(session_maker: async_sessionmaker, job: dict) -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            await _save(session_maker, job)
+        except Exception as e:
+            logger.warning(f"Job {job['kind']} {job['id']} heartbeat failed: {e}")
+
+
+async def _run(session_maker: async_sessionmaker, job: dict, work: Callable[[dict], Awaitable[dict | None]]) -> None:
+    job["status"] = "running"
+    heartbeat = None
+    try:
+        await _save(session_maker, job)
+        heartbeat = asyncio.create_task(_heartbeat(session_maker, job))
+        job["result"] = await work(job)
+        job["status"] = "done"
+    except Exception as e:
+        logger.exception(f"Job {job['kind']} {job['id']} failed")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        if heartbeat is not None:
+            # Wait for it so a write in flight can't land after the final one
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        try:
+            await _save(session_maker, job, finished=True)
+        except Exception:
+            # Reported as interrupted once its heartbeat goes stale
+            logger.exception(f"Job {job['kind']} {job['id']} could not record its outcome")
+
+
+async def find_active_job(session: AsyncSession, user_id: str, kind: str) -> dict | None:
+    """The user's unfinished job of this kind; one whose worker stopped does not count."""
+    stmt = select(JobDB).where(
+        JobDB.user_id == user_id, JobDB.kind == kind, JobDB.status.in_(ACTIVE_STATUSES), ~_stale()
+    )
+    job = (await session.execute(stmt)).scalar_one_or_none()
+    return _as_dict(job) if job is not None else None
+
+
+async def get_job(session: AsyncSession, user_id: str, job_id: str) -> dict | None:
+    """The job as shown to its owner; None for unknown, expired or foreign jobs."""
+    stmt = select(JobDB, _stale().label("stale")).where(JobDB.id == job_id, JobDB.user_id == user_id)
+    row = (await session.execute(stmt)).one_or_none()
+    if row is None:
+        return None
+    job = _as_dict(row.JobDB)
+    if row.stale and job["status"] in ACTIVE_STATUSES:
+        job.update(status="failed", error=INTERRUPTED)
+    return job
+
+
+async def prune_jobs() -> float:
+    """Scheduled job: fails abandoned jobs and drops expired ones. Returns the seconds until the next run."""
+    try:
+        async with async_session_maker() as session:
+            await _fail_stale(session)
+            expired = func.now() - timedelta(seconds=JOB_RETENTION)
+            await session.execute(delete(JobDB).where(JobDB.finished_at < expired))
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Job cleanup failed: {e}")
+    return JOB_PRUNE_INTERVAL
@@ -0,0 +1,170 @@
+import logging
+from datetime import UTC, date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.services.analytics_cache import invalidate_analytics_cache
+from app.services.balance import recompute_balance
+from app.services.data_version import bump_data_version
+from app.services.rollup import rebuild_rollup
+
+logger = logging.getLogger(__name__)
+
+# transactions is RANGE-partitioned on `date`, one partition per UTC month
+# (transactions_y2026m01 = [2026-01-01, 2026-02-01)), plus transactions_default for everything else.
+PARENT_TABLE = "transactions"
+DEFAULT_PARTITION = "transactions_default"
+
+# Partitions kept ready ahead of the current month
+PARTITION_MONTHS_AHEAD = 3
+PARTITION_CHECK_INTERVAL = 6 * 3600
+
+# Serializes maintenance across workers and manage.py runs
+_MAINTENANCE_LOCK_KEY = "sana_partition_maintenance"
+
+
+def month_floor(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_month(value: str) -> date:
+    """'2026-01' -> date(2026, 1, 1)"""
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+async def list_partitions(session: AsyncSession) -> list[str]:
+    result = await session.execute(
+        text(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+            ORDER BY child.relname
+            """
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    return list(result.scalars())
+
+
+async def _stored_columns(session: AsyncSession) -> str:
+    """Column list of the parent without generated columns, for copying rows between partitions."""
+    result = await session.execute(
+        text(
+            """
+            SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position)
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :parent AND is_generated = 'NEVER'
+            """
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    return result.scalar_one()
+
+
+async def create_month_partition(session: AsyncSession, month: date) -> str:
+    """
+    Creates the partition for `month`. Rows already sitting in the default partition for that
+    month are moved into it (Postgres refuses the new partition while the default holds them).
+    Does not commit.
+    """
+    name = partition_name(month)
+    bounds = {"start": datetime.combine(month, datetime.min.time(), UTC)}
+    bounds["end"] = datetime.combine(add_months(month, 1), datetime.min.time(), UTC)
+    columns = await _stored_columns(session)
+
+    await session.execute(
+        text(
+            f"""
+            CREATE TEMPORARY TABLE moved_transactions ON COMMIT DROP AS
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *
+            )
+            SELECT {columns} FROM moved
+            """
+        ),
+        bounds,
+    )
+    start, end = (bounds[key].isoformat() for key in ("start", "end"))
+    await session.execute(
+        text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{start}') TO ('{end}')")
+    )
+    await session.execute(text(f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM moved_transactions"))
+    await session.execute(text("DROP TABLE moved_transactions"))
+    return name
+
+
+async def ensure_partitions(
+    session: AsyncSession, months_ahead: int = PARTITION_MONTHS_AHEAD, since: date | None = None
+) -> list[str]:
+    """
+    Makes sure monthly partitions exist from `since` (default: the current month) through
+    `months_ahead` months ahead, and commits. Returns the names of the partitions created.
+    """
+    current = month_floor(datetime.now(UTC).date())
+    first = month_floor(since) if since else current
+
+    await session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": _MAINTENANCE_LOCK_KEY})
+    existing = set(await list_partitions(session))
+
+    created = []
+    month = first
+    while month <= add_months(current, months_ahead):
+        if partition_name(month) not in existing:
+            created.append(await create_month_partition(session, month))
+        month = add_months(month, 1)
+
+    await session.commit()
+    return created
+
+
+async def detach_partition(session: AsyncSession, month: date) -> tuple[str, int]:
+    """
+    Detaches the partition for `month`, leaving it as a standalone table for archiving or dropping.
+    The table is renamed (<partition>_detached_<timestamp>) so the month can be created again.
+    Balances and rollups of the affected users are rebuilt without those rows. Commits.
+    Returns the new table name and the number of users affected.
+    """
+    name = partition_name(month)
+    if name not in await list_partitions(session):
+        raise ValueError(f"{name} is not a partition of {PARENT_TABLE}")
+
+    await session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": _MAINTENANCE_LOCK_KEY})
+    await session.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    detached = f"{name}_detached_{datetime.now(UTC):%Y%m%d%H%M%S}"
+    await session.execute(text(f"ALTER TABLE {name} RENAME TO {detached}"))
+
+    user_ids = (await session.execute(text(f"SELECT DISTINCT user_id FROM {detached}"))).scalars().all()
+    for user_id in user_ids:
+        await session.execute(recompute_balance(user_id))
+        await rebuild_rollup(session, user_id)
+        await session.execute(bump_data_version(user_id))
+
+    await session.commit()
+    for user_id in user_ids:
+        invalidate_analytics_cache(user_id, notified=True)
+    return detached, len(user_ids)
+
+
+async def maintain_partitions() -> float:
+    """Scheduled job keeping future partitions in place. Returns the seconds until the next check."""
+    try:
+        async with async_session_maker() as session:
+            created = await ensure_partitions(session)
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+    except Exception as e:
+        logger.error(f"Error in partition maintenance: {e}")
+    return PARTITION_CHECK_INTERVAL
@@ -0,0 +1,71 @@
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.sql import CategoryDB, DailyCategoryTotalDB, TransactionDB, UserBalanceDB
+from app.services.analytics_cache import invalidate_analytics_cache
+from app.services.balance import apply_balance_delta, signed_total
+from app.services.categories import invalidate_category_cache
+from app.services.data_version import bump_data_version
+from app.services.rollup import apply_rollup_delta, rollup_rows
+from app.services.user_settings import invalidate_user_settings
+
+# Transactions deleted per statement (and per DB transaction) by a reset
+RESET_BATCH_SIZE = 5000
+
+
+async def _delete_batch(session: AsyncSession, user_id: str, batch_size: int) -> int:
+    """
+    Deletes up to `batch_size` of the user's transactions, taking them out of the stored
+    balance and rollup in the same statement so reads stay consistent mid-reset. Commits.
+    """
+    batch = select(TransactionDB.id).where(TransactionDB.user_id == user_id).limit(batch_size).scalar_subquery()
+    deleted = (
+        delete(TransactionDB)
+        .where(TransactionDB.user_id == user_id, TransactionDB.id.in_(batch))
+        .returning(TransactionDB.amount, TransactionDB.category_id, TransactionDB.date)
+        .cte("deleted")
+    )
+    balance = apply_balance_delta(user_id, -signed_total(deleted.c.amount, deleted.c.category_id))
+    version = bump_data_version(user_id).cte("version")
+    rollup = apply_rollup_delta(
+        user_id,
+        rollup_rows(deleted.c.date, deleted.c.category_id, deleted.c.amount, sign=-1),
+        ready=version.c.rollup_ready,
+    )
+    stmt = select(func.count()).select_from(deleted).add_cte(balance.cte("balance"), version, rollup.cte("rollup"))
+    count = (await session.execute(stmt)).scalar_one()
+    await session.commit()
+    return count
+
+
+async def delete_user_data(session_maker: async_sessionmaker, user_id: str, job: dict) -> dict:
+    """
+    Deletes all of the user's data in short transactions of RESET_BATCH_SIZE rows, reporting
+    progress in job["progress"]. Categories, settings and derived tables go last in one
+    small transaction.
+    """
+    async with session_maker() as session:
+        count_stmt = select(func.count()).select_from(TransactionDB).where(TransactionDB.user_id == user_id)
+        total = (await session.execute(count_stmt)).scalar_one()
+        job["progress"] = {"total": total, "deleted": 0}
+
+        while deleted := await _delete_batch(session, user_id, RESET_BATCH_SIZE):
+            job["progress"]["deleted"] += deleted
+            invalidate_analytics_cache(user_id, notified=True)
+
+        # Also cascades to anything written against user categories while the batches ran
+        await session.execute(delete(CategoryDB).where(CategoryDB.user_id == user_id))
+        # Keep the users row so data_version keeps increasing; derived data is rebuilt on the next read
+        await session.execute(
+            bump_data_version(
+                user_id, invalidate=("analytics", "categories", "settings"), base_currency="USD", rollup_ready=False
+            )
+        )
+        await session.execute(delete(UserBalanceDB).where(UserBalanceDB.user_id == user_id))
+        await session.execute(delete(DailyCategoryTotalDB).where(DailyCategoryTotalDB.user_id == user_id))
+        await session.commit()
+
+    invalidate_analytics_cache(user_id, notified=True)
+    invalidate_category_cache(user_id, notified=True)
+    invalidate_user_settings(user_id, notified=True)
+    return {"deleted_transactions": job["progress"]["deleted"]}
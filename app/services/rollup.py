@@ -0,0 +1,121 @@
+from datetime import UTC, date, datetime, time, timedelta
+
+from sqlalchemy import Numeric, delete, func, literal, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import DailyCategoryTotalDB, TransactionDB, UserDB
+
+# daily_category_totals is maintained like user_balances:
+#   * a user's rollup is built from scratch on their first analytics read (users.rollup_ready);
+#   * every transaction write upserts its per-(day, category) deltas in the same statement;
+#   * writes for users whose rollup is not built yet are no-ops.
+# Builds and writes serialize on the users row: a build locks it before aggregating, and a
+# write reads rollup_ready only once its bump_data_version() holds the lock. A write racing a
+# build therefore either waits for it and sees the flag set (its row is not in the aggregate),
+# or commits first and is included in the aggregate.
+
+
+def utc_day(column):
+    return func.date(func.timezone("UTC", column))
+
+
+def rollup_rows(tx_date, category_id, amount, sign: int = 1):
+    """
+    Delta rows (day, category_id, amount, tx_count) for transactions being added (sign=1) or removed (sign=-1).
+    Accepts CTE columns or plain Python values.
+    """
+    if isinstance(tx_date, datetime):
+        return select(
+            literal(tx_date.astimezone(UTC).date()).label("day"),
+            literal(category_id).label("category_id"),
+            literal(amount * sign, Numeric).label("amount"),
+            literal(sign).label("tx_count"),
+        )
+    return select(
+        utc_day(tx_date).label("day"),
+        category_id.label("category_id"),
+        (amount * sign).label("amount"),
+        literal(sign).label("tx_count"),
+    )
+
+
+def apply_rollup_delta(user_id: str, *deltas, ready=None):
+    """
+    INSERT ... ON CONFLICT adding the grouped `deltas` to the user's buckets.
+    Meant to be attached to a transaction write as a CTE.
+    `ready` is the rollup_ready column of a bump_data_version() CTE in the same statement; without
+    it, the write must have run bump_data_version() earlier in its transaction.
+    """
+    if ready is None:
+        ready = select(UserDB.rollup_ready).where(UserDB.id == user_id).scalar_subquery()
+    else:
+        ready = select(ready).scalar_subquery()
+    rows = (union_all(*deltas) if len(deltas) > 1 else deltas[0]).subquery("rollup_delta")
+    grouped = (
+        select(literal(user_id), rows.c.day, rows.c.category_id, func.sum(rows.c.amount), func.sum(rows.c.tx_count))
+        .where(func.coalesce(ready, False))
+        .group_by(rows.c.day, rows.c.category_id)
+    )
+    stmt = pg_insert(DailyCategoryTotalDB).from_select(["user_id", "day", "category_id", "total", "tx_count"], grouped)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "category_id"],
+        set_={
+            "total": DailyCategoryTotalDB.total + stmt.excluded.total,
+            "tx_count": DailyCategoryTotalDB.tx_count + stmt.excluded.tx_count,
+        },
+    )
+
+
+async def rebuild_rollup(session: AsyncSession, user_id: str) -> None:
+    """
+    Replaces the user's buckets with a fresh aggregation of their transactions and marks them ready.
+    Callers hold the lock on the user's users row (see ensure_rollup). Does not commit.
+    """
+    day = utc_day(TransactionDB.date)
+    aggregated = (
+        select(
+            TransactionDB.user_id,
+            day,
+            TransactionDB.category_id,
+            func.sum(TransactionDB.amount),
+            func.count(),
+        )
+        .where(TransactionDB.user_id == user_id, TransactionDB.date.isnot(None))
+        .group_by(TransactionDB.user_id, day, TransactionDB.category_id)
+    )
+    await session.execute(delete(DailyCategoryTotalDB).where(DailyCategoryTotalDB.user_id == user_id))
+    await session.execute(
+        pg_insert(DailyCategoryTotalDB).from_select(["user_id", "day", "category_id", "total", "tx_count"], aggregated)
+    )
+    await session.execute(update(UserDB).where(UserDB.id == user_id).values(rollup_ready=True))
+
+
+async def ensure_rollup(session: AsyncSession, user_id: str) -> bool:
+    """
+    Returns True when the user's rollup can be read, building it first if needed.
+    Users without a users row have nothing to mark, so callers aggregate raw transactions instead.
+    """
+    result = await session.execute(select(UserDB.rollup_ready).where(UserDB.id == user_id))
+    ready = result.scalar_one_or_none()
+    if ready is None:
+        return False
+    if not ready:
+        # Waits for in-flight writes and concurrent builds; one of the latter may have finished it
+        locked = select(UserDB.rollup_ready).where(UserDB.id == user_id).with_for_update()
+        if not (await session.execute(locked)).scalar_one():
+            await rebuild_rollup(session, user_id)
+        await session.commit()
+    return True
+
+
+def split_at_day_boundary(start: datetime) -> tuple[datetime, date]:
+    """
+    Splits an open range [start, ...) into the partial UTC day that must be read from raw
+    transactions, [start, first full day), and the first day fully covered by the rollup.
+    """
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=UTC)
+    start = start.astimezone(UTC)
+    first_full_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    return datetime.combine(first_full_day, time.min, tzinfo=UTC), first_full_day
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Periodic jobs with side effects (provider calls, DDL) run in one worker only: the leader, i.e. the
+# process holding a session-level advisory lock on a connection it keeps open. Postgres releases the
+# lock when that connection goes away, so a surviving worker takes over on its next check.
+# Other workers run the job's `follow` callback instead, e.g. to pick up what the leader stored.
+LEADER_LOCK_KEY = "sana_scheduler_leader"
+LEADER_CHECK_INTERVAL = 30
+
+# A job callback returns the seconds until it should run again
+JobCallback = Callable[[], Awaitable[float]]
+
+
+class Scheduler:
+    def __init__(self, db_engine: AsyncEngine, lock_key: str = LEADER_LOCK_KEY):
+        self._engine = db_engine
+        self._lock_key = lock_key
+        self._connection: AsyncConnection | None = None
+        self._jobs: list[dict] = []
+        self.is_leader = False
+
+    def add_job(self, name: str, run: JobCallback, follow: JobCallback | None = None) -> None:
+        """Registers a job: `run` on the leader, `follow` (if any) on every other worker."""
+        self._jobs.append({"name": name, "run": run, "follow": follow, "due": 0.0, "runs": 0, "last_run": None})
+
+    async def start(self) -> None:
+        """Infinite loop: renews leadership, then runs whichever job callbacks are due."""
+        logger.info(f"Starting scheduler with jobs: {', '.join(job['name'] for job in self._jobs)}")
+        try:
+            while True:
+                await self.tick()
+                await asyncio.sleep(LEADER_CHECK_INTERVAL)
+        finally:
+            await self.release()
+
+    async def tick(self) -> None:
+        try:
+            leader = await self._hold_lease()
+        except Exception as e:
+            logger.error(f"Leader election failed: {e}")
+            leader = False
+
+        if leader != self.is_leader:
+            logger.info("This worker is now the scheduler leader" if leader else "Scheduler leadership lost")
+            self.is_leader = leader
+            # The new role's callbacks start right away instead of on the old role's schedule
+            for job in self._jobs:
+                job["due"] = 0.0
+
+        for job in self._jobs:
+            callback = job["run"] if leader else job["follow"]
+            if callback is None or time.monotonic() < job["due"]:
+                continue
+            try:
+                delay = await callback()
+            except Exception as e:
+                logger.error(f"Scheduled job {job['name']} failed: {e}")
+                delay = LEADER_CHECK_INTERVAL
+            job["due"] = time.monotonic() + delay
+            job["runs"] += 1
+            job["last_run"] = "leader" if leader else "follower"
+
+    async def _hold_lease(self) -> bool:
+        """True while this process holds the leader lock, acquiring it when free."""
+        if self._connection is not None:
+            try:
+                await self._connection.execute(text("SELECT 1"))
+                await self._connection.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Leader connection lost: {e}")
+                await self._drop_connection()
+
+        connection = await self._engine.connect()
+        try:
+            stmt = text("SELECT pg_try_advisory_lock(hashtext(:key))")
+            acquired = (await connection.execute(stmt, {"key": self._lock_key})).scalar_one()
+            # The lock outlives the transaction; don't leave the connection idle in one
+            await connection.commit()
+        except Exception:
+            await connection.invalidate()
+            raise
+
+        if not acquired:
+            await connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    async def release(self) -> None:
+        """Gives up leadership (on shutdown) so another worker can take over right away."""
+        if self._connection is None:
+            return
+        try:
+            await self._connection.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": self._lock_key})
+            await self._connection.commit()
+            await self._connection.close()
+            self._connection = None
+        except Exception:
+            await self._drop_connection()
+        self.is_leader = False
+
+    async def _drop_connection(self) -> None:
+        # Closing the DBAPI connection ends the Postgres session, which releases the lock
+        connection, self._connection = self._connection, None
+        try:
+            await connection.invalidate()
+        except Exception:
+            pass
+
+    def status(self) -> dict:
+        return {
+            "leader": self.is_leader,
+            "jobs": {job["name"]: {"runs": job["runs"], "last_run": job["last_run"]} for job in self._jobs},
+        }
+
+
+scheduler = Scheduler(engine)
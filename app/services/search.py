@@ -0,0 +1,53 @@
+import re
+
+from sqlalchemy import false, func, literal, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import TransactionDB
+
+SEARCH_CONFIG = "simple"
+
+_WORD_RE = re.compile(r"\w+")
+
+# Whether pg_trgm is installed; checked once per process (see the note search migration)
+_trigram_available: bool | None = None
+
+
+def prefix_tsquery(q: str):
+    """
+    tsquery matching notes that contain every word of `q`, each as a prefix ('gro' finds 'groceries').
+    Returns None when `q` has no searchable words.
+    """
+    words = _WORD_RE.findall(q.lower())
+    if not words:
+        return None
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{word}:*" for word in words))
+
+
+async def has_trigram_support(session: AsyncSession) -> bool:
+    global _trigram_available
+    if _trigram_available is None:
+        result = await session.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"))
+        _trigram_available = bool(result.scalar())
+    return _trigram_available
+
+
+async def note_search_condition(session: AsyncSession, q: str):
+    """
+    WHERE clause for a note search: prefix matching on the indexed tsvector, plus
+    typo-tolerant word similarity on the trigram index when pg_trgm is installed.
+    """
+    conditions = []
+
+    tsquery = prefix_tsquery(q)
+    if tsquery is not None:
+        conditions.append(TransactionDB.note_search.op("@@")(tsquery))
+
+    if await has_trigram_support(session):
+        # `<%` is word_similarity(q, note) above pg_trgm.word_similarity_threshold
+        conditions.append(literal(q).op("<%")(TransactionDB.note))
+
+    if not conditions:
+        # Nothing to match on (e.g. only punctuation)
+        return false()
+    return or_(*conditions)
@@ -0,0 +1,91 @@
+from typing import NamedTuple
+
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.sql import UserDB
+from app.services.invalidation import invalidation_bus, register_scope
+
+
+class UserSettings(NamedTuple):
+    base_currency: str
+
+
+# Per-user settings read by the request paths (base currency). Populated on first access and dropped
+# by the writes that change them (change_base_currency, the reset job), in other workers through the
+# invalidation bus; the short TTL bounds staleness while a worker is disconnected from it. Writes
+# that depend on the base currency verify it in their own statement (see add_transaction) and fall
+# back to the uncached path on a mismatch.
+USER_SETTINGS_CACHE_SIZE = 4096
+USER_SETTINGS_TTL = 60
+
+# Users without a row yet get the defaults the first write will store
+DEFAULT_SETTINGS = UserSettings(base_currency="USD")
+
+_settings_cache = TTLCache(maxsize=USER_SETTINGS_CACHE_SIZE, ttl=USER_SETTINGS_TTL)
+_settings_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "conflicts": 0, "queries_saved": 0}
+# endpoint -> {"requests": get_user_settings() calls, "queries_saved": those answered from the cache}
+_saved_by_endpoint: dict[str, dict[str, int]] = {}
+
+
+def get_settings_cache_stats() -> dict:
+    requests = sum(counts["requests"] for counts in _saved_by_endpoint.values())
+    saved = _settings_cache_stats["queries_saved"]
+    return {
+        **_settings_cache_stats,
+        "size": len(_settings_cache),
+        "queries_saved_per_request": round(saved / requests, 4) if requests else 0.0,
+        "by_endpoint": {endpoint: dict(counts) for endpoint, counts in _saved_by_endpoint.items()},
+    }
+
+
+async def get_user_settings(session: AsyncSession, user_id: str, endpoint: str) -> UserSettings:
+    """The user's settings, read with one query on a miss. `endpoint` labels the lookup in the metrics."""
+    counts = _saved_by_endpoint.setdefault(endpoint, {"requests": 0, "queries_saved": 0})
+    counts["requests"] += 1
+    try:
+        settings = _settings_cache[user_id]
+    except KeyError:
+        _settings_cache_stats["misses"] += 1
+        stmt = select(UserDB.base_currency).where(UserDB.id == user_id)
+        base_currency = (await session.execute(stmt)).scalar_one_or_none()
+        settings = UserSettings(base_currency) if base_currency else DEFAULT_SETTINGS
+        _settings_cache[user_id] = settings
+        return settings
+
+    _settings_cache_stats["hits"] += 1
+    _settings_cache_stats["queries_saved"] += 1
+    counts["queries_saved"] += 1
+    return settings
+
+
+def peek_user_settings(user_id: str) -> UserSettings | None:
+    """The cached settings without querying on a miss, for writes that can read them in their own statement."""
+    settings = _settings_cache.get(user_id)
+    _settings_cache_stats["hits" if settings is not None else "misses"] += 1
+    return settings
+
+
+def remember_user_settings(user_id: str, settings: UserSettings) -> None:
+    """Caches settings read as part of another statement."""
+    _settings_cache[user_id] = settings
+
+
+def invalidate_user_settings(user_id: str, conflict: bool = False, notified: bool = False) -> None:
+    """
+    Drops the user's cached settings in every worker; call after committing a change to them.
+    `notified` means the write's bump_data_version() already told the other workers. `conflict`
+    marks a write that found the cached value out of date (only dropped here: the process that
+    changed it has notified the others).
+    """
+    _settings_cache.pop(user_id, None)
+    if conflict:
+        _settings_cache_stats["conflicts"] += 1
+        return
+    _settings_cache_stats["invalidations"] += 1
+    if not notified:
+        invalidation_bus.publish(user_id, "settings")
+
+
+register_scope("settings", lambda user_id: _settings_cache.pop(user_id, None), _settings_cache.clear)
@@ -0,0 +1,90 @@
+"""
+Conversion throughput: CurrencyService.convert() on a Decimal snapshot with memoized cross rates
+vs the previous per-call path (awaited get_rate building Decimal(str(float)) twice and dividing).
+
+Runs in memory against a synthetic table of ~160 currencies; no database or network needed.
+
+Usage:
+    python -m benchmarks.currency_convert [--conversions 200000]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from decimal import Decimal
+
+from app.services import currency
+from app.services.currency import CurrencyService, RateTable
+
+CODES = [f"C{n:02d}" for n in range(157)] + ["USD", "EUR", "TRY"]
+
+
+def _float_rates() -> dict[str, float]:
+    rng = random.Random(42)
+    return {code: 1.0 if code == "USD" else round(rng.uniform(0.01, 40000), 6) for code in CODES}
+
+
+class _LegacyService:
+    """The rate lookup as it was: a float dict, converted to Decimal on every call."""
+
+    def __init__(self, rates: dict[str, float]):
+        self._rates = rates
+
+    def _get_rate_value(self, code: str) -> Decimal:
+        if code in self._rates:
+            return Decimal(str(self._rates[code]))
+        return Decimal("1.00")
+
+    async def get_rate(self, from_currency: str, to_currency: str = "USD") -> Decimal:
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+        if from_currency == to_currency:
+            return Decimal("1.00")
+        return (Decimal("1.00") / self._get_rate_value(from_currency)) * self._get_rate_value(to_currency)
+
+
+def _pairs(count: int) -> list[tuple[Decimal, str, str]]:
+    # A user's history: a handful of source currencies into one base currency
+    rng = random.Random(7)
+    sources = ["EUR", "TRY", "C01", "C02", "C03"]
+    return [(Decimal(rng.randint(100, 99999)) / 100, rng.choice(sources), "USD") for _ in range(count)]
+
+
+async def _bench_legacy(pairs) -> float:
+    service = _LegacyService(_float_rates())
+    started = time.perf_counter()
+    for amount, source, target in pairs:
+        amount * await service.get_rate(source, target)
+    return time.perf_counter() - started
+
+
+def _bench_convert(pairs) -> float:
+    service = CurrencyService()
+    service._snapshot = RateTable(_float_rates())
+    started = time.perf_counter()
+    for amount, source, target in pairs:
+        service.convert(amount, source, target)
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversions", type=int, default=200_000)
+    args = parser.parse_args()
+
+    # rate() short-circuits to 1.00 without a configured provider key
+    currency.EXCHANGE_RATE_API_KEY = currency.EXCHANGE_RATE_API_KEY or "benchmark"
+
+    pairs = _pairs(args.conversions)
+    legacy = await _bench_legacy(pairs)
+    snapshot = _bench_convert(pairs)
+
+    print(f"conversions:               {args.conversions}")
+    print(f"awaited get_rate (before): {args.conversions / legacy:,.0f} conversions/s")
+    print(f"convert() (after):         {args.conversions / snapshot:,.0f} conversions/s")
+    print(f"speedup:                   {legacy / snapshot:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Import throughput: POST /api/transactions/import (COPY into staging + one merge)
+vs one POST /api/transactions per row.
+
+Generates a synthetic CSV for a throwaway user in DATABASE_URL, imports it and
+prints rows per second for both paths. The synthetic rows are removed afterwards.
+
+Usage:
+    python -m benchmarks.import_csv [--rows 50000] [--baseline-rows 500]
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+
+from app.database import async_session_maker, engine
+from app.dependencies import verify_telegram_authentication
+from main import app
+
+BENCH_USER_ID = "bench-import"
+CATEGORIES = ("Food", "Transport", "Housing", "Fun", "Health")
+CURRENCIES = ("USD", "EUR", "TRY")
+
+
+def _csv_chunks(rows: int, chunk_rows: int = 1000):
+    start = datetime(2020, 1, 1, tzinfo=UTC)
+    yield b"date,amount,currency,category,type,note\n"
+    for offset in range(0, rows, chunk_rows):
+        lines = []
+        for n in range(offset, min(offset + chunk_rows, rows)):
+            date = (start + timedelta(minutes=n)).isoformat()
+            lines.append(f"{date},{n % 500 + 1}.25,{CURRENCIES[n % 3]},{CATEGORIES[n % 5]},expense,row {n}\n")
+        yield "".join(lines).encode()
+
+
+async def _cleanup() -> None:
+    async with async_session_maker() as session:
+        for table in ("transactions", "categories", "daily_category_totals", "user_balances", "users"):
+            column = "id" if table == "users" else "user_id"
+            await session.execute(text(f"DELETE FROM {table} WHERE {column} = :user_id"), {"user_id": BENCH_USER_ID})
+        await session.commit()
+
+
+async def _bench_import(client: AsyncClient, rows: int) -> float:
+    async def body():
+        for chunk in _csv_chunks(rows):
+            yield chunk
+
+    started = time.perf_counter()
+    response = await client.post("/api/transactions/import", content=body(), headers={"Content-Type": "text/csv"})
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    assert response.json()["imported"] == rows, response.text
+    return elapsed
+
+
+async def _bench_single(client: AsyncClient, rows: int) -> float:
+    categories = (await client.get("/api/categories", params={"type": "expense"})).json()
+    category_id = categories[0]["id"]
+
+    started = time.perf_counter()
+    for n in range(rows):
+        currency = CURRENCIES[n % 3]
+        payload = {"amount": n % 500 + 1, "currency": currency, "category_id": category_id, "date": "2020-01-01"}
+        response = await client.post("/api/transactions", json=payload)
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def main(rows: int, baseline_rows: int) -> None:
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": BENCH_USER_ID}
+    await _cleanup()
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            import_s = await _bench_import(client, rows)
+            single_s = await _bench_single(client, baseline_rows) if baseline_rows else None
+
+        print(f"rows={rows}")
+        print(f"  import (COPY)        : {rows / import_s:10.0f} rows/s ({import_s:.2f} s)")
+        if single_s:
+            print(f"  POST /transactions   : {baseline_rows / single_s:10.0f} rows/s ({baseline_rows} rows)")
+    finally:
+        await _cleanup()
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--baseline-rows", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.baseline_rows))
@@ -0,0 +1,103 @@
+"""
+Deep-page latency: LIMIT/OFFSET vs keyset cursor on GET /api/transactions.
+
+Seeds a synthetic user in DATABASE_URL, walks to the same deep page with both
+modes and prints median latencies. The synthetic rows are removed afterwards.
+
+Usage:
+    python -m benchmarks.pagination [--rows 50000] [--page-size 50] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+
+from app.database import async_session_maker, engine
+from app.dependencies import verify_telegram_authentication
+from main import app
+
+BENCH_USER_ID = "bench-pagination"
+
+
+async def _seed(rows: int) -> None:
+    async with async_session_maker() as session:
+        category_id = (
+            await session.execute(
+                text(
+                    "INSERT INTO categories (name, type, user_id, is_active) "
+                    "VALUES ('Bench', 'expense', :user_id, true) RETURNING id"
+                ),
+                {"user_id": BENCH_USER_ID},
+            )
+        ).scalar_one()
+        await session.execute(
+            text(
+                """
+                INSERT INTO transactions (user_id, amount, original_amount, currency, date, category_id)
+                SELECT :user_id, 1, 1, 'USD', now() - (n * INTERVAL '1 minute'), :category_id
+                FROM generate_series(1, :rows) AS n
+                """
+            ),
+            {"user_id": BENCH_USER_ID, "category_id": category_id, "rows": rows},
+        )
+        await session.commit()
+
+
+async def _cleanup() -> None:
+    async with async_session_maker() as session:
+        await session.execute(text("DELETE FROM transactions WHERE user_id = :user_id"), {"user_id": BENCH_USER_ID})
+        await session.execute(text("DELETE FROM categories WHERE user_id = :user_id"), {"user_id": BENCH_USER_ID})
+        await session.commit()
+
+
+async def _timed_get(client: AsyncClient, params: dict, repeat: int) -> tuple[float, str | None]:
+    samples = []
+    next_cursor = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get("/api/transactions", params=params)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        next_cursor = response.headers.get("X-Next-Cursor")
+    return statistics.median(samples), next_cursor
+
+
+async def main(rows: int, page_size: int, repeat: int) -> None:
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": BENCH_USER_ID}
+    await _cleanup()
+    await _seed(rows)
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            deep_offset = rows - page_size
+
+            # Walk the cursor chain once to obtain the cursor for the deepest page
+            cursor = None
+            for _ in range(deep_offset // page_size):
+                params = {"limit": page_size, **({"cursor": cursor} if cursor else {})}
+                response = await client.get("/api/transactions", params=params)
+                cursor = response.headers.get("X-Next-Cursor")
+
+            offset_ms, _ = await _timed_get(client, {"limit": page_size, "offset": deep_offset}, repeat)
+            cursor_ms, _ = await _timed_get(client, {"limit": page_size, "cursor": cursor}, repeat)
+
+        print(f"rows={rows} page_size={page_size} deep_offset={deep_offset}")
+        print(f"  offset : {offset_ms:8.2f} ms (median of {repeat})")
+        print(f"  cursor : {cursor_ms:8.2f} ms (median of {repeat})")
+    finally:
+        await _cleanup()
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.page_size, args.repeat))
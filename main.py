@@ -2,14 +2,21 @@ import asyncio
 import os
 from contextlib import asynccontextmanager
 
+import httpx
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.bot.lifecycle import start_bot, stop_bot
-from app.routers import ai, categories, transactions, users, webhook
-from app.services.currency import CurrencyService
+from app.database import async_session_maker, engine
+from app.routers import ai, categories, system, transactions, users, webhook
+from app.services.categories import seed_default_categories
+from app.services.currency import RATES_HTTP_TIMEOUT, CurrencyService
+from app.services.invalidation import invalidation_bus
+from app.services.jobs import prune_jobs
+from app.services.partitions import maintain_partitions
+from app.services.scheduler import scheduler
 
 # --- Global Cache ---
 SPA_HTML_CACHE = None
@@ -31,25 +38,50 @@ async def lifespan(app: FastAPI):
     # 2. Start Services
     await start_bot()
 
+    # 2.1. Load stored exchange rates: the history for conversions at a transaction's date
+    # and the last good snapshot as current rates. The provider is only called in the background.
+    async with async_session_maker() as session:
+        days = await CurrencyService().load_history(session)
+        print(f"✅ Loaded {days} day(s) of exchange rates ({CurrencyService().rates_status()['source']})")
+
+        # Default categories: normally already seeded by the migration; a no-op then
+        added = await seed_default_categories(session)
+        if added:
+            print(f"✅ Seeded {added} default categories")
+
+    # 2.2. One pooled client for provider requests, kept alive across refreshes
+    rates_client = httpx.AsyncClient(timeout=RATES_HTTP_TIMEOUT, limits=httpx.Limits(max_connections=4))
+    CurrencyService().use_http_client(rates_client)
+
     # 3. Start Background Tasks
+    # Periodic jobs run on the elected leader worker only; the others read the rates it stores
+    scheduler.add_job("exchange_rates", CurrencyService().refresh, follow=CurrencyService().sync_from_storage)
+    scheduler.add_job("partitions", maintain_partitions)
+    scheduler.add_job("jobs", prune_jobs)
     # Keep specific reference to avoid GC
-    currency_task = asyncio.create_task(CurrencyService().start_periodic_update())
-
-    # 3.1. Warmup Cache (Avoid Race Condition)
-    # Ensure rates are loaded (or attempted) before accepting requests
-    print("⏳ Warming up currency cache...")
-    await CurrencyService().get_all_rates()
-    print("✅ Currency cache warmup complete")
+    scheduler_task = asyncio.create_task(scheduler.start())
+    # Evicts cache entries written by other workers (one LISTEN connection per worker)
+    listen_dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    invalidation_task = asyncio.create_task(invalidation_bus.start(listen_dsn))
 
     yield
 
     # 4. Graceful Shutdown
     print("🛑 Shutting down background tasks...")
-    currency_task.cancel()
+    scheduler_task.cancel()
     try:
-        await currency_task
+        await scheduler_task
     except asyncio.CancelledError:
-        print("✅ Currency task cancelled")
+        print("✅ Scheduler task cancelled")
+
+    invalidation_task.cancel()
+    try:
+        await invalidation_task
+    except asyncio.CancelledError:
+        print("✅ Invalidation listener cancelled")
+
+    CurrencyService().use_http_client(None)
+    await rates_client.aclose()
 
     await stop_bot()
 
@@ -73,6 +105,7 @@ app.include_router(transactions.router, prefix="/api")
 app.include_router(categories.router, prefix="/api")
 app.include_router(ai.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
+app.include_router(system.router, prefix="/api")
 app.include_router(webhook.router)
 
 
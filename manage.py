@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select, update
+
+from app.database import async_session_maker, engine
+from app.models.sql import UserBalanceDB, UserDB
+from app.services.balance import find_balance_drift
+from app.services.partitions import PARTITION_MONTHS_AHEAD, detach_partition, ensure_partitions, parse_month
+from app.services.rollup import rebuild_rollup
+
+
+async def check_balances(fix: bool) -> int:
+    """
+    Recomputes every stored balance from the transactions table and reports drift.
+    """
+    async with async_session_maker() as session:
+        drift = await find_balance_drift(session)
+
+        for row in drift:
+            print(f"⚠️ user={row['user_id']} stored={row['stored']} actual={row['actual']}")
+
+        if drift and fix:
+            for row in drift:
+                stmt = (
+                    update(UserBalanceDB).where(UserBalanceDB.user_id == row["user_id"]).values(balance=row["actual"])
+                )
+                await session.execute(stmt)
+            await session.commit()
+            print(f"✅ Fixed {len(drift)} balance(s)")
+        elif not drift:
+            print("✅ All balances are consistent")
+
+    return 1 if drift and not fix else 0
+
+
+async def backfill_rollups(user_id: str | None) -> int:
+    """
+    Rebuilds daily_category_totals from transactions, one user per DB transaction.
+    """
+    async with async_session_maker() as session:
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = (await session.execute(select(UserDB.id).order_by(UserDB.id))).scalars().all()
+
+        for uid in user_ids:
+            await rebuild_rollup(session, uid)
+            await session.commit()
+
+    print(f"✅ Rebuilt rollups for {len(user_ids)} user(s)")
+    return 0
+
+
+async def create_partitions(months_ahead: int, since: str | None) -> int:
+    """
+    Creates missing monthly transaction partitions, moving matching rows out of the default partition.
+    """
+    async with async_session_maker() as session:
+        created = await ensure_partitions(session, months_ahead, parse_month(since) if since else None)
+
+    for name in created:
+        print(f"➕ {name}")
+    print(f"✅ Created {len(created)} partition(s)")
+    return 0
+
+
+async def detach_month(month: str) -> int:
+    """
+    Detaches a month of transactions into a standalone table and rebuilds the affected users' derived data.
+    """
+    async with async_session_maker() as session:
+        try:
+            name, users = await detach_partition(session, parse_month(month))
+        except ValueError as e:
+            print(f"⚠️ {e}")
+            return 1
+
+    print(f"✅ Detached {name} ({users} user(s) affected); archive or DROP TABLE it when done")
+    return 0
+
+
+async def main() -> int:
+    """
+    Maintenance commands. Usage: python manage.py <command> [options]
+    """
+    parser = argparse.ArgumentParser(description="Sana maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    balances = commands.add_parser("check-balances", help="Report user_balances rows that drifted from transactions")
+    balances.add_argument("--fix", action="store_true", help="Overwrite drifted balances with recomputed values")
+
+    rollups = commands.add_parser("backfill-rollups", help="Rebuild daily_category_totals from transactions")
+    rollups.add_argument("--user", help="Only rebuild this user id")
+
+    partitions = commands.add_parser("create-partitions", help="Create upcoming monthly transaction partitions")
+    partitions.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    partitions.add_argument("--since", help="First month to create (YYYY-MM), defaults to the current one")
+
+    detach = commands.add_parser("detach-partition", help="Detach a month of transactions from the table")
+    detach.add_argument("month", help="Month to detach (YYYY-MM)")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "check-balances":
+            return await check_balances(args.fix)
+        if args.command == "backfill-rollups":
+            return await backfill_rollups(args.user)
+        if args.command == "create-partitions":
+            return await create_partitions(args.months_ahead, args.since)
+        if args.command == "detach-partition":
+            return await detach_month(args.month)
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,9 +1,24 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
 
 import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from app.models.sql import CategoryDB, TransactionDB, UserDB
+from app.dependencies import verify_telegram_authentication
+from app.models.sql import CategoryDB, DailyCategoryTotalDB, TransactionDB, UserDB
 from app.services.analytics import AnalyticsService
+from app.services.analytics_cache import (
+    ANALYTICS_GENERATIONS_SIZE,
+    _analytics_cache,
+    _generations,
+    cached_analytics,
+    invalidate_analytics_cache,
+)
+from app.services.invalidation import INVALIDATION_CHANNEL, InvalidationBus
+from app.services.rollup import ensure_rollup, rebuild_rollup
+from main import app
 
 
 @pytest.fixture
@@ -94,3 +109,159 @@ async def test_empty_data(session):
 
     txs = await service.get_significant_transactions(user_id="999", start_date=datetime.min)
     assert txs == []
+
+
+@pytest.mark.asyncio
+async def test_rollup_is_built_lazily_and_maintained(client, session, analytics_data, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": "1"}
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1"))
+    service = AnalyticsService(session)
+
+    # First read builds the rollup from the existing history
+    summary = await service.get_aggregated_summary(user_id="1", start_date=datetime.min)
+    assert summary["expense"] == 1349.0
+    buckets = (await session.execute(select(func.sum(DailyCategoryTotalDB.tx_count)))).scalar()
+    assert buckets == 4
+
+    # Writes now keep the rollup current
+    created = await client.post(
+        "/api/transactions", json={"amount": 1, "currency": "USD", "category_id": 2, "date": "2020-01-01"}
+    )
+    tx_id = created.json()["id"]
+    summary = await service.get_aggregated_summary(user_id="1", start_date=datetime.min)
+    assert summary["expense"] == 1350.0
+
+    await client.patch(f"/api/transactions/{tx_id}", json={"amount": 11, "currency": "USD", "category_id": 1})
+    summary = await service.get_aggregated_summary(user_id="1", start_date=datetime.min)
+    assert summary["expense"] == 1349.0
+    assert summary["income"] == 1011.0
+
+    await client.delete(f"/api/transactions/{tx_id}")
+    summary = await service.get_aggregated_summary(user_id="1", start_date=datetime.min)
+    assert summary["income"] == 1000.0
+    assert [c["name"] for c in summary["categories"]].count("Salary") == 1
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_rollup_builds_are_serialized_with_writes(client, session, analytics_data, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": "1"}
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1"))
+    session_maker = async_sessionmaker(session.bind)
+
+    async def tx_count():
+        return (await session.execute(select(func.sum(DailyCategoryTotalDB.tx_count)))).scalar()
+
+    # Concurrent first reads: one builds, the other waits for it and finds the rollup ready
+    async with session_maker() as first, session_maker() as second:
+        assert await asyncio.gather(ensure_rollup(first, "1"), ensure_rollup(second, "1")) == [True, True]
+    assert await tx_count() == 4
+
+    # A write arriving while a build is in progress waits for it, then adds its own delta
+    await session.execute(update(UserDB).where(UserDB.id == "1").values(rollup_ready=False))
+    await session.commit()
+    async with session_maker() as builder:
+        await builder.execute(select(UserDB.rollup_ready).where(UserDB.id == "1").with_for_update())
+        await rebuild_rollup(builder, "1")
+
+        payload = {"amount": 1, "currency": "USD", "category_id": 2, "date": "2020-01-01"}
+        write = asyncio.create_task(client.post("/api/transactions", json=payload))
+        await asyncio.sleep(0.2)
+        assert not write.done()
+        await builder.commit()
+        assert (await write).status_code == 200
+
+    assert await tx_count() == 5
+    summary = await AnalyticsService(session).get_aggregated_summary(user_id="1", start_date=datetime.min)
+    assert summary["expense"] == 1350.0
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_summary_splits_partial_first_day(session, analytics_data):
+    day = datetime(2021, 6, 15, tzinfo=UTC)
+    session.add_all(
+        [
+            TransactionDB(user_id="1", category_id=2, amount=7, date=day + timedelta(hours=3)),
+            TransactionDB(user_id="1", category_id=2, amount=11, date=day + timedelta(hours=20)),
+        ]
+    )
+    await session.commit()
+    service = AnalyticsService(session)
+
+    # The 03:00 row is before the range start, the 20:00 row after it (same UTC day)
+    summary = await service.get_aggregated_summary(user_id="1", start_date=day + timedelta(hours=12))
+
+    assert summary["expense"] == 11.0 + 1349.0
+
+
+@pytest.mark.asyncio
+async def test_analytics_responses_are_cached_until_a_write(client, session, analytics_data, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": "1"}
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1"))
+    compute = mocker.spy(AnalyticsService, "get_category_totals")
+    now = datetime.now(UTC)
+
+    async def summary():
+        response = await client.get("/api/analytics/summary?type=expense&range=year")
+        assert response.status_code == 200
+        return {row["category"]: float(row["total"]) for row in response.json()}
+
+    async def calendar():
+        response = await client.get(f"/api/analytics/calendar?month={now.month}&year={now.year}")
+        assert response.status_code == 200
+        return response.json()["month_summary"]
+
+    first = await summary()
+    assert await summary() == first
+    assert compute.call_count == 1
+    month = await calendar()
+    assert await calendar() == month
+
+    stats = (await client.get("/api/health")).json()["analytics_cache"]
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+    assert stats["hit_ratio"] == 0.5
+
+    # Any write by the user drops their cached responses
+    payload = {"amount": 5, "currency": "USD", "category_id": 2, "date": now.isoformat()}
+    await client.post("/api/transactions", json=payload)
+    assert (await summary())["Food"] == first["Food"] + 5
+    assert compute.call_count == 2
+    assert (await calendar())["expense"] == month["expense"] + 5
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_responses_computed_across_an_invalidation_are_not_cached():
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def compute():
+        started.set()
+        await release.wait()
+        return {"expense": 1}
+
+    def from_bus(user_id):
+        InvalidationBus()._on_notification(None, -1, INVALIDATION_CHANNEL, f"{user_id}:analytics")
+
+    # A write committing (here or in another worker) while the response is computed
+    for invalidate in (invalidate_analytics_cache, from_bus):
+        started.clear()
+        release.clear()
+        task = asyncio.create_task(cached_analytics("1", ("summary",), compute))
+        await started.wait()
+        invalidate("1")
+        release.set()
+        assert await task == {"expense": 1}
+        assert ("1", "summary") not in _analytics_cache
+
+    # Nothing in between: stored
+    assert await cached_analytics("1", ("summary",), compute) == {"expense": 1}
+    assert _analytics_cache[("1", "summary")] == {"expense": 1}
+
+    # The counters of users who wrote don't pile up in a long-running worker
+    for user_id in range(ANALYTICS_GENERATIONS_SIZE + 100):
+        invalidate_analytics_cache(str(user_id))
+    assert len(_generations) == ANALYTICS_GENERATIONS_SIZE
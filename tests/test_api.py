@@ -1,15 +1,83 @@
-from datetime import datetime
+import asyncio
+import csv
+import gzip
+import io
+import json
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, timedelta
 from decimal import Decimal
 
 import pytest
+from sqlalchemy import Numeric, event, literal, select, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from app.dependencies import verify_telegram_authentication
-from app.models.sql import CategoryDB, TransactionDB
+from app.models.sql import CategoryDB, JobDB, TransactionDB, UserDB
+from app.routers.transactions import _filtered_list_query, _paginate
+from app.services import reset as reset_service
+from app.services.balance import apply_balance_delta, find_balance_drift
+from app.services.categories import DEFAULT_CATEGORIES, _category_cache, seed_default_categories
+from app.services.data_version import bump_data_version
+from app.services.invalidation import InvalidationBus
+from app.services.partitions import (
+    add_months,
+    detach_partition,
+    ensure_partitions,
+    list_partitions,
+    month_floor,
+    partition_name,
+)
+from app.services.scheduler import Scheduler
+from app.services.search import note_search_condition
+from app.services.user_settings import UserSettings, _settings_cache, get_settings_cache_stats
 from main import app
 
 MOCK_USER = {"id": "12345", "first_name": "TestUser", "username": "testuser"}
 
 
+@contextmanager
+def _recorded_statements(session):
+    """Collects the SQL sent through the test session's engine."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(session.bind.sync_engine, "before_cursor_execute", record)
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, stmt):
+        self.stmt = stmt
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.stmt, **kw)
+
+
+async def _explain(session, stmt) -> str:
+    result = await session.execute(Explain(stmt))
+    return "\n".join(result.scalars())
+
+
+async def _wait_for_job(client, job_id: str) -> dict:
+    for _ in range(200):
+        job = (await client.get(f"/api/users/me/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
 @pytest.mark.asyncio
 async def test_create_transaction_with_currency_conversion(client, session, mocker):
     """
@@ -155,9 +223,66 @@ async def test_delete_transaction(client, session):
     response = await client.delete(f"/api/transactions/{tx1.id}")
     assert response.status_code == 200
 
-    # Verify DB
-    deleted_tx = await session.get(TransactionDB, tx1.id)
-    assert deleted_tx is None
+    # Verify DB (the delete runs as a CTE, so the session's identity map still holds the object)
+    deleted_tx = await session.execute(select(TransactionDB.id).where(TransactionDB.id == tx1.id))
+    assert deleted_tx.first() is None
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_accept_the_stored_date(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    category = CategoryDB(name="Coffee", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    category_id = category.id
+
+    tx = TransactionDB(
+        user_id=MOCK_USER["id"],
+        category_id=category_id,
+        amount=5,
+        original_amount=5,
+        currency="USD",
+        date=datetime(2024, 1, 10, tzinfo=UTC),
+    )
+    session.add(tx)
+    await session.commit()
+    await session.refresh(tx)
+    tx_id = tx.id
+    stored = (await client.get("/api/transactions")).json()[0]["date"]
+
+    # The date narrows the row lookup to its partition; an outdated one (re-dated elsewhere) falls back to the id
+    wrong = {"date": "2024-02-10T00:00:00+00:00"}
+    response = await client.patch(f"/api/transactions/{tx_id}", params=wrong, json={"note": "x"})
+    assert response.status_code == 200
+    assert response.json()["note"] == "x"
+    assert (await client.patch("/api/transactions/999999", params=wrong, json={"note": "x"})).status_code == 404
+
+    with _recorded_statements(session) as statements:
+        response = await client.patch(f"/api/transactions/{tx_id}", params={"date": stored}, json={"amount": 7})
+    assert response.status_code == 200
+    writes = [sql for sql in statements if "UPDATE transactions" in sql]
+    assert writes and all("transactions.date =" in sql for sql in writes)
+
+    assert (await client.delete(f"/api/transactions/{tx_id}", params={"date": stored})).status_code == 200
+    assert (await client.get("/api/transactions")).json() == []
+    assert (await client.get("/api/balance")).json()["balance"] == 0
+
+    tx = TransactionDB(
+        user_id=MOCK_USER["id"],
+        category_id=category_id,
+        amount=5,
+        currency="USD",
+        date=datetime(2024, 3, 1, tzinfo=UTC),
+    )
+    session.add(tx)
+    await session.commit()
+    await session.refresh(tx)
+    tx_id = tx.id
+    assert (await client.delete(f"/api/transactions/{tx_id}", params=wrong)).status_code == 200
+    assert (await client.get("/api/transactions")).json() == []
 
     app.dependency_overrides.clear()
 
@@ -183,3 +308,1082 @@ async def test_get_categories(client, session):
     assert "Fun" in names
 
     app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_default_categories_are_seeded_once_and_read_in_one_query(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    assert await seed_default_categories(session) == len(DEFAULT_CATEGORIES)
+    assert await seed_default_categories(session) == 0
+
+    session.add(CategoryDB(name="Fun", type="expense", user_id=MOCK_USER["id"]))
+    await session.commit()
+
+    with _recorded_statements(session) as statements:
+        response = await client.get("/api/categories?type=expense")
+
+    assert response.status_code == 200
+    assert [c["name"] for c in response.json()] == ["Food", "Transport", "Housing", "Other", "Fun"]
+    # The ETag check and the categories themselves
+    assert len(statements) == 2
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_category_cache_serves_writes_and_is_invalidated(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1.00"))
+
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    foreign = CategoryDB(name="Theirs", type="expense", user_id="someone-else")
+    session.add_all([food, foreign])
+    await session.commit()
+
+    assert (await client.get("/api/categories")).status_code == 200
+
+    # Validation and the response's category come from the cache: only the insert itself runs
+    with _recorded_statements(session) as statements:
+        response = await client.post(
+            "/api/transactions", json={"amount": 5, "category_id": food.id, "date": "2024-05-01"}
+        )
+    assert response.status_code == 200
+    assert (response.json()["category"], response.json()["type"]) == ("Food", "expense")
+    tx_id = response.json()["id"]
+    assert len(statements) == 1
+
+    # Categories of other users are rejected before touching transactions
+    response = await client.post(
+        "/api/transactions", json={"amount": 5, "category_id": foreign.id, "date": "2024-05-01"}
+    )
+    assert response.status_code == 404
+    bulk = [
+        {"amount": 1, "category_id": food.id, "date": "2024-05-01"},
+        {"amount": 2, "category_id": 999999, "date": "2024-05-01"},
+    ]
+    assert (await client.post("/api/transactions/bulk", json=bulk)).status_code == 404
+
+    # A category created elsewhere (e.g. another worker) is found by reloading on a miss
+    extra = CategoryDB(name="Travel", type="expense", user_id=MOCK_USER["id"])
+    session.add(extra)
+    await session.commit()
+    response = await client.post("/api/transactions", json={"amount": 7, "category_id": extra.id, "date": "2024-05-02"})
+    assert response.json()["category"] == "Travel"
+
+    # The category endpoints invalidate the user's entry
+    assert (await client.patch(f"/api/categories/{food.id}", json={"name": "Groceries", "type": "expense"})).is_success
+    response = await client.patch(f"/api/transactions/{tx_id}", json={"note": "weekly"})
+    assert response.json()["category"] == "Groceries"
+
+    assert (await client.delete(f"/api/categories/{extra.id}")).is_success
+    names = [c["name"] for c in (await client.get("/api/categories")).json()]
+    assert "Travel" not in names
+    assert "Groceries" in names
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_category_list_is_never_older_than_its_etag(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    session.add(CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"]))
+    await session.commit()
+    first = await client.get("/api/categories")
+    assert [c["name"] for c in first.json()] == ["Food"]
+
+    # Another worker adds a category; its invalidation has not arrived here yet
+    session.add(CategoryDB(name="Travel", type="expense", user_id=MOCK_USER["id"]))
+    await session.execute(bump_data_version(MOCK_USER["id"]))
+    await session.commit()
+
+    # The new ETag comes with a body at least that new, not the cached map
+    response = await client.get("/api/categories", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert [c["name"] for c in response.json()] == ["Food", "Travel"]
+
+    # Read together with the version, the reloaded map serves the next request from the cache
+    with _recorded_statements(session) as statements:
+        assert (await client.get("/api/categories")).json() == response.json()
+    assert len(statements) == 1
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_transactions_cursor_pagination(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    category = CategoryDB(name="Books", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    # Two rows share a timestamp to exercise the id tie-breaker
+    days = [1, 2, 2, 3, 4]
+    session.add_all(
+        [
+            TransactionDB(user_id=MOCK_USER["id"], category_id=category.id, amount=i + 1, date=datetime(2024, 1, day))
+            for i, day in enumerate(days)
+        ]
+    )
+    await session.commit()
+
+    offset_response = await client.get("/api/transactions?limit=10")
+    expected_ids = [tx["id"] for tx in offset_response.json()]
+
+    seen_ids = []
+    response = await client.get("/api/transactions?limit=2")
+    while True:
+        assert response.status_code == 200
+        seen_ids += [tx["id"] for tx in response.json()]
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        response = await client.get("/api/transactions", params={"limit": 2, "cursor": next_cursor})
+
+    assert seen_ids == expected_ids
+
+    bad_response = await client.get("/api/transactions?cursor=not-a-cursor")
+    assert bad_response.status_code == 400
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_transactions_filters(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    rent = CategoryDB(name="Rent", type="expense", user_id=MOCK_USER["id"])
+    salary = CategoryDB(name="Salary", type="income", user_id=MOCK_USER["id"])
+    session.add_all([food, rent, salary])
+    await session.commit()
+
+    rows = [
+        (food, 10, "USD", datetime(2024, 1, 1, tzinfo=UTC)),
+        (food, 25, "EUR", datetime(2024, 1, 15, tzinfo=UTC)),
+        (rent, 500, "EUR", datetime(2024, 2, 1, tzinfo=UTC)),
+        (salary, 2000, "USD", datetime(2024, 2, 10, tzinfo=UTC)),
+    ]
+    for category, amount, currency, day in rows:
+        session.add(
+            TransactionDB(
+                user_id=MOCK_USER["id"],
+                category_id=category.id,
+                amount=amount,
+                original_amount=amount,
+                currency=currency,
+                date=day,
+            )
+        )
+    await session.commit()
+
+    async def amounts(**params):
+        response = await client.get("/api/transactions", params=params)
+        assert response.status_code == 200, response.text
+        return [float(tx["amount"]) for tx in response.json()]
+
+    assert await amounts() == [2000, 500, 25, 10]
+    assert await amounts(**{"from": "2024-01-15", "to": "2024-02-10"}) == [500, 25]
+    assert await amounts(category_id=[food.id, rent.id]) == [500, 25, 10]
+    assert await amounts(type="income") == [2000]
+    assert await amounts(min_amount=20, max_amount=500) == [500, 25]
+    assert await amounts(currency="eur", type="expense", min_amount=100) == [500]
+
+    response = await client.get("/api/transactions", params={"type": "refund"})
+    assert response.status_code == 422
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_transaction_filters_use_indexes(session):
+    category_ids = []
+    for i, type_ in enumerate(["expense"] * 8 + ["income"] * 2):
+        category = CategoryDB(name=f"Cat {i}", type=type_, user_id=None)
+        session.add(category)
+        await session.flush()
+        category_ids.append(category.id)
+
+    # Enough users and rows that a sequential scan is never the cheapest plan
+    await session.execute(
+        text(
+            """
+            INSERT INTO transactions (user_id, amount, original_amount, currency, date, category_id)
+            SELECT 'user-' || (n % 200), (n % 1000) + 0.5, (n % 1000) + 0.5,
+                   (ARRAY['USD', 'EUR', 'TRY', 'RUB'])[n % 4 + 1],
+                   TIMESTAMPTZ '2024-01-01' + n * INTERVAL '7 minutes',
+                   (CAST(:category_ids AS integer[]))[n % 10 + 1]
+            FROM generate_series(1, 60000) AS n
+            """
+        ),
+        {"category_ids": category_ids},
+    )
+    await session.execute(text("ANALYZE transactions"))
+    await session.execute(text("ANALYZE categories"))
+
+    combinations = [
+        {},
+        {"date_from": datetime(2024, 2, 1), "date_to": datetime(2024, 3, 1)},
+        {"category_ids": category_ids[:2]},
+        {"category_ids": category_ids[:1], "date_from": datetime(2024, 2, 1)},
+        {"type": "income"},
+        {"type": "expense", "date_from": datetime(2024, 2, 1), "date_to": datetime(2024, 3, 1)},
+        {"min_amount": Decimal("990"), "max_amount": Decimal("995")},
+        {"min_amount": Decimal("990")},
+        {"currency": "EUR"},
+        {"currency": "EUR", "date_from": datetime(2024, 2, 1)},
+        {"currency": "TRY", "category_ids": category_ids[:1], "min_amount": Decimal("100")},
+    ]
+    for filters in combinations:
+        stmt = _paginate(_filtered_list_query("user-7", **filters), limit=50)
+        plan = await _explain(session, stmt)
+        assert "Seq Scan on transactions" not in plan, (filters, plan)
+        assert "Index" in plan, (filters, plan)
+
+
+@pytest.mark.asyncio
+async def test_read_endpoints_answer_304_until_data_changes(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1.0"))
+    mocker.patch("app.services.currency.CurrencyService.get_all_rates", return_value={"USD": 1})
+
+    endpoints = ["/api/transactions", "/api/balance", "/api/categories", "/api/users/me"]
+
+    async def etags():
+        tags = {}
+        for url in endpoints:
+            response = await client.get(url)
+            assert response.status_code == 200, response.text
+            tags[url] = response.headers["ETag"]
+            revalidated = await client.get(url, headers={"If-None-Match": tags[url]})
+            assert revalidated.status_code == 304
+            assert revalidated.headers["ETag"] == tags[url]
+            assert revalidated.content == b""
+        return tags
+
+    initial = await etags()
+
+    category = (await client.post("/api/categories", json={"name": "Snacks", "type": "expense"})).json()
+    after_category = await etags()
+    assert all(after_category[url] != initial[url] for url in endpoints)
+
+    payload = {"amount": 5, "currency": "USD", "category_id": category["id"], "date": "2024-05-01"}
+    tx = (await client.post("/api/transactions", json=payload)).json()
+    after_add = await etags()
+    assert all(after_add[url] != after_category[url] for url in endpoints)
+
+    await client.patch(f"/api/transactions/{tx['id']}", json={"note": "chips"})
+    after_update = await etags()
+    assert after_update["/api/transactions"] != after_add["/api/transactions"]
+
+    await client.delete(f"/api/transactions/{tx['id']}")
+    after_delete = await etags()
+    assert after_delete["/api/balance"] != after_update["/api/balance"]
+
+    reset = await client.delete("/api/users/me/reset")
+    await _wait_for_job(client, reset.json()["job_id"])
+    after_reset = await etags()
+    assert len(set(after_reset.values()) & {tag for tags in (initial, after_delete) for tag in tags.values()}) == 0
+
+    # A stale tag gets the full body again
+    response = await client.get("/api/balance", headers={"If-None-Match": initial["/api/balance"]})
+    assert response.status_code == 200
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_etags_of_different_users_never_match(client, mocker):
+    """Accounts sharing a webview share its HTTP cache: another user's tag at the same version gets a full body."""
+    mocker.patch("app.services.currency.CurrencyService.get_all_rates", return_value={"USD": 1})
+    other_user = {"id": "67890", "first_name": "Other"}
+
+    for url in ["/api/transactions", "/api/balance", "/api/categories", "/api/users/me"]:
+        app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+        first = await client.get(url)
+        assert first.headers["Vary"] == "X-Telegram-Init-Data"
+
+        app.dependency_overrides[verify_telegram_authentication] = lambda: other_user
+        response = await client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 200, url
+        assert response.headers["ETag"] != first.headers["ETag"]
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_search_transactions_by_note(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    category = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    notes = ["Groceries at market", "Coffee with Anna", "groceries, weekly", "Taxi home", None, "Market coffee beans"]
+    for i, note in enumerate(notes):
+        session.add(
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=category.id, amount=1, note=note, date=datetime(2024, 1, i + 1)
+            )
+        )
+    session.add(
+        TransactionDB(user_id="other", category_id=category.id, amount=1, note="groceries", date=datetime(2024, 1, 1))
+    )
+    await session.commit()
+
+    async def search(q, **params):
+        response = await client.get("/api/transactions/search", params={"q": q, **params})
+        assert response.status_code == 200, response.text
+        return response
+
+    # Prefix match, case-insensitive, newest first, scoped to the user
+    response = await search("groc")
+    assert [tx["note"] for tx in response.json()] == ["groceries, weekly", "Groceries at market"]
+
+    # Every word must match
+    response = await search("coffee mark")
+    assert [tx["note"] for tx in response.json()] == ["Market coffee beans"]
+
+    response = await search("?!")
+    assert response.json() == []
+
+    # Keyset pagination through the results
+    response = await search("groceries", limit=1)
+    assert [tx["note"] for tx in response.json()] == ["groceries, weekly"]
+    response = await search("groceries", limit=1, cursor=response.headers["X-Next-Cursor"])
+    assert [tx["note"] for tx in response.json()] == ["Groceries at market"]
+
+    assert (await client.get("/api/transactions/search")).status_code == 422
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_note_search_uses_gin_index(session):
+    # The planner is free to prefer idx_user_date for small users; check the predicate itself is indexable
+    await session.execute(text("SET LOCAL enable_seqscan = off"))
+    stmt = select(TransactionDB.id).where(await note_search_condition(session, "groc"))
+    plan = await _explain(session, stmt)
+    # Partitions name their copy of idx_transactions_note_search "<partition>_note_search_idx"
+    assert "Index Scan on" in plan and "note_search" in plan.split("Index Scan on", 1)[1], plan
+
+
+@pytest.mark.asyncio
+async def test_export_transactions_streams_csv_and_ndjson(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    category = CategoryDB(name="Rent", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    session.add_all(
+        [
+            TransactionDB(
+                user_id=MOCK_USER["id"],
+                category_id=category.id,
+                amount=Decimal("10.50"),
+                original_amount=Decimal("9.75"),
+                currency="EUR",
+                date=datetime(2024, 1, 2, tzinfo=UTC),
+                note='Deposit, "first"',
+            ),
+            # Legacy row without original_amount
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=category.id, amount=Decimal("3.00"), date=datetime(2024, 1, 1)
+            ),
+            TransactionDB(user_id="other", category_id=category.id, amount=Decimal("99.00"), date=datetime(2024, 1, 1)),
+        ]
+    )
+    await session.commit()
+
+    csv_response = await client.get("/api/transactions/export?format=csv")
+    assert csv_response.status_code == 200
+    assert csv_response.headers["content-type"].startswith("text/csv")
+    assert 'filename="transactions.csv"' in csv_response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(csv_response.text)))
+    assert [(r["amount"], r["original_amount"], r["currency"]) for r in rows] == [
+        ("10.50", "9.75", "EUR"),
+        ("3.00", "3.00", "USD"),
+    ]
+    assert rows[0]["note"] == 'Deposit, "first"'
+    assert rows[0]["category"] == "Rent"
+
+    ndjson_response = await client.get("/api/transactions/export?format=ndjson&gzip=true")
+    assert ndjson_response.status_code == 200
+    assert ndjson_response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(ndjson_response.content).decode().splitlines()
+    assert [json.loads(line)["amount"] for line in lines] == ["10.50", "3.00"]
+
+    bad_response = await client.get("/api/transactions/export?format=xml")
+    assert bad_response.status_code == 422
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_transactions(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    get_rate = mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("0.03"))
+
+    category = CategoryDB(name="Import", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    payload = [
+        {"amount": 100, "currency": "TRY", "category_id": category.id, "date": "2023-10-10"},
+        {"amount": 200, "currency": "TRY", "category_id": category.id, "date": "2023-10-11", "note": "second"},
+        {"amount": 300, "currency": "EUR", "category_id": category.id, "date": "2023-10-12"},
+    ]
+
+    response = await client.post("/api/transactions/bulk", json=payload)
+
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [float(tx["original_amount"]) for tx in data] == [100.0, 200.0, 300.0]
+    assert [float(tx["amount"]) for tx in data] == [3.0, 6.0, 9.0]
+    assert data[1]["note"] == "second"
+    assert all(tx["category"] == "Import" and tx["type"] == "expense" for tx in data)
+    # One rate lookup per distinct (currency, day)
+    assert get_rate.await_count == 3
+
+    too_many = [payload[0]] * 501
+    response = await client.post("/api/transactions/bulk", json=too_many)
+    assert response.status_code == 400
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_import_transactions_csv(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("0.5"))
+
+    category = CategoryDB(name="Groceries", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    body = (
+        "Date,Amount,Currency,Category,Type,Note\r\n"
+        "2024-03-01,10.00,EUR,groceries,expense,weekly\r\n"
+        '2024-03-02T08:30:00+02:00,2500,EUR,Salary,income,"March, paid\nearly"\r\n'
+        "not-a-date,5,EUR,Groceries,expense,\r\n"
+        "2024-03-03,-4,EUR,Groceries,expense,\r\n"
+        "\r\n"
+        "2024-03-04,7.5,EUR,Groceries,refund,\r\n"
+        "2024-03-05,8,,Groceries,,no currency"
+    )
+
+    async def chunks():
+        # Split mid-record to exercise incremental parsing
+        data = body.encode()
+        for i in range(0, len(data), 7):
+            yield data[i : i + 7]
+
+    response = await client.post("/api/transactions/import", content=chunks(), headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["imported"] == 3
+    assert report["failed"] == 3
+    assert [e["line"] for e in report["errors"]] == [5, 6, 8]
+
+    result = await session.execute(
+        select(TransactionDB, CategoryDB)
+        .join(CategoryDB)
+        .where(TransactionDB.user_id == MOCK_USER["id"])
+        .order_by(TransactionDB.date)
+    )
+    rows = result.all()
+    assert [(r.TransactionDB.amount, r.TransactionDB.original_amount, r.TransactionDB.currency) for r in rows] == [
+        (Decimal("5.00"), Decimal("10.00"), "EUR"),
+        (Decimal("1250.00"), Decimal("2500.00"), "EUR"),
+        (Decimal("4.00"), Decimal("8.00"), "USD"),
+    ]
+    assert rows[0].CategoryDB.id == category.id
+    # Missing categories are created for the user
+    assert (rows[1].CategoryDB.name, rows[1].CategoryDB.type, rows[1].CategoryDB.user_id) == (
+        "Salary",
+        "income",
+        MOCK_USER["id"],
+    )
+    assert rows[1].TransactionDB.note == "March, paid\nearly"
+
+    response = await client.post("/api/transactions/import", content="when,how much\n1,2\n")
+    assert response.status_code == 400
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_import_does_not_lock_the_user_during_the_upload(client, session, db_engine, mocker):
+    """Other writes go through while the CSV streams in; a base currency changed meanwhile is picked up."""
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    rates = {"USD": Decimal("0.5"), "EUR": Decimal("2")}
+    mocker.patch(
+        "app.services.currency.CurrencyService.get_rate", side_effect=lambda currency, target, on=None: rates[target]
+    )
+    await session.execute(bump_data_version(MOCK_USER["id"]))
+    await session.commit()
+
+    async def chunks():
+        yield b"date,amount,currency,category\n2024-03-01,10,GBP,Food\n"
+        async with async_sessionmaker(db_engine)() as other:
+            await other.execute(text("SET LOCAL lock_timeout = '2s'"))
+            await other.execute(bump_data_version(MOCK_USER["id"], base_currency="EUR"))
+            await other.commit()
+        yield b"2024-03-02,60000000,GBP,Food\n"
+
+    response = await client.post("/api/transactions/import", content=chunks(), headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "imported": 1,
+        "failed": 1,
+        "errors": [{"line": 3, "error": "Amount in EUR is too large"}],
+    }
+    amounts = await session.execute(select(TransactionDB.amount).where(TransactionDB.user_id == MOCK_USER["id"]))
+    assert amounts.scalars().all() == [Decimal("20.00")]
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_update_transaction_recalculates_amount(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("0.5"))
+
+    session.add(UserDB(id=MOCK_USER["id"], base_currency="EUR"))
+    category = CategoryDB(name="Taxi", type="expense", user_id=MOCK_USER["id"])
+    session.add(category)
+    await session.commit()
+    await session.refresh(category)
+
+    tx = TransactionDB(
+        user_id=MOCK_USER["id"],
+        category_id=category.id,
+        amount=5,
+        original_amount=10,
+        currency="TRY",
+        date=datetime.now(),
+    )
+    session.add(tx)
+    await session.commit()
+    await session.refresh(tx)
+
+    # Amount-only edit converts from the stored currency into the user's base currency
+    response = await client.patch(f"/api/transactions/{tx.id}", json={"amount": 40})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert float(data["original_amount"]) == 40.0
+    assert float(data["amount"]) == 20.0
+    assert data["currency"] == "TRY"
+    assert data["category"] == "Taxi"
+
+    # Note-only edit leaves amounts untouched
+    response = await client.patch(f"/api/transactions/{tx.id}", json={"note": "airport"})
+    assert response.status_code == 200
+    assert response.json()["note"] == "airport"
+    assert float(response.json()["amount"]) == 20.0
+
+    response = await client.patch("/api/transactions/999999", json={"note": "missing"})
+    assert response.status_code == 404
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_balance_is_maintained_by_writes(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1"))
+
+    salary = CategoryDB(name="Salary", type="income", user_id=MOCK_USER["id"])
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([salary, food])
+    await session.commit()
+
+    async def balance():
+        response = await client.get("/api/balance")
+        assert response.status_code == 200
+        return response.json()["balance"]
+
+    # First read initializes the stored balance
+    assert await balance() == 0
+
+    def tx(amount, category):
+        return {"amount": amount, "currency": "USD", "category_id": category.id, "date": "2024-01-01"}
+
+    await client.post("/api/transactions", json=tx(100, salary))
+    expense = (await client.post("/api/transactions", json=tx(30, food))).json()
+    assert await balance() == 70
+
+    await client.post("/api/transactions/bulk", json=[tx(10, food), tx(5, salary)])
+    assert await balance() == 65
+
+    await client.patch(f"/api/transactions/{expense['id']}", json={"amount": 50, "currency": "USD"})
+    assert await balance() == 45
+
+    await client.patch(f"/api/transactions/{expense['id']}", json={"category_id": salary.id})
+    assert await balance() == 145
+
+    await client.delete(f"/api/transactions/{expense['id']}")
+    assert await balance() == 95
+
+    assert await find_balance_drift(session) == []
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_balance_row_creation_does_not_race_with_writes(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("1"))
+
+    salary = CategoryDB(name="Salary", type="income", user_id=MOCK_USER["id"])
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([salary, food])
+    await session.commit()
+    # History written before user_balances had a row for the user
+    session.add(TransactionDB(user_id=MOCK_USER["id"], category_id=salary.id, amount=100))
+    await session.commit()
+
+    # Another worker creates the row from its snapshot and has not committed yet
+    async with async_sessionmaker(session.bind)() as other:
+        await other.execute(apply_balance_delta(MOCK_USER["id"], literal(0, Numeric)))
+
+        tx = {"amount": 30, "currency": "USD", "category_id": food.id, "date": "2024-01-01"}
+        write = asyncio.create_task(client.post("/api/transactions", json=tx))
+        await asyncio.sleep(0.2)
+        # The write waits for that row instead of missing it
+        assert not write.done()
+        await other.commit()
+        assert (await write).status_code == 200
+
+    assert (await client.get("/api/balance")).json()["balance"] == 70
+    assert await find_balance_drift(session) == []
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_calendar_uses_local_month_boundaries(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    salary = CategoryDB(name="Salary", type="income", user_id=MOCK_USER["id"])
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([salary, food])
+    await session.commit()
+
+    # User is at UTC+5 (JS getTimezoneOffset() == -300)
+    session.add_all(
+        [
+            # 2024-03-01 01:00 local -> March
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=food.id, amount=10, date=datetime(2024, 2, 29, 20, tzinfo=UTC)
+            ),
+            # 2024-03-01 10:00 local -> March, same day
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=food.id, amount=5, date=datetime(2024, 3, 1, 5, tzinfo=UTC)
+            ),
+            # 2024-03-31 23:00 local -> March
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=salary.id, amount=100, date=datetime(2024, 3, 31, 18, tzinfo=UTC)
+            ),
+            # 2024-04-01 00:30 local -> April, excluded
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=food.id, amount=999, date=datetime(2024, 3, 31, 19, 30, tzinfo=UTC)
+            ),
+        ]
+    )
+    await session.commit()
+
+    response = await client.get("/api/analytics/calendar?month=3&year=2024", headers={"X-Timezone-Offset": "-300"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert float(data["month_summary"]["income"]) == 100.0
+    assert float(data["month_summary"]["expense"]) == 15.0
+    assert float(data["month_summary"]["net"]) == 85.0
+    assert {day: {k: float(v) for k, v in totals.items()} for day, totals in data["days"].items()} == {
+        "2024-03-01": {"income": 0.0, "expense": 15.0},
+        "2024-03-31": {"income": 100.0, "expense": 0.0},
+    }
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_created_ahead_and_detachable(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    salary = CategoryDB(name="Salary", type="income", user_id=MOCK_USER["id"])
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([salary, food])
+    await session.commit()
+
+    session.add_all(
+        [
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=salary.id, amount=100, date=datetime(2024, 1, 10, tzinfo=UTC)
+            ),
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=food.id, amount=30, date=datetime(2024, 2, 5, tzinfo=UTC)
+            ),
+            TransactionDB(user_id=MOCK_USER["id"], category_id=food.id, amount=5),
+        ]
+    )
+    await session.commit()
+    assert (await client.get("/api/balance")).json()["balance"] == 65
+
+    # Everything starts in the default partition; creating a month moves its rows out
+    created = await ensure_partitions(session, months_ahead=2, since=date(2024, 1, 1))
+    current = month_floor(datetime.now(UTC).date())
+    assert created[0] == "transactions_y2024m01"
+    assert created[-1] == partition_name(add_months(current, 2))
+    assert await ensure_partitions(session, months_ahead=2, since=date(2024, 1, 1)) == []
+
+    placement = await session.execute(
+        text("SELECT tableoid::regclass::text, count(*) FROM transactions GROUP BY 1 ORDER BY 1")
+    )
+    assert placement.all() == [
+        ("transactions_y2024m01", 1),
+        ("transactions_y2024m02", 1),
+        (partition_name(current), 1),
+    ]
+
+    detached = None
+    try:
+        detached, users = await detach_partition(session, date(2024, 1, 1))
+        assert detached.startswith("transactions_y2024m01_detached_")
+        assert users == 1
+
+        assert "transactions_y2024m01" not in await list_partitions(session)
+        assert len((await client.get("/api/transactions")).json()) == 2
+        assert (await client.get("/api/balance")).json()["balance"] == -35
+        assert await find_balance_drift(session) == []
+
+        with pytest.raises(ValueError):
+            await detach_partition(session, date(2024, 1, 1))
+
+        # The detached table no longer holds the name: the month can be created again
+        assert await ensure_partitions(session, months_ahead=2, since=date(2024, 1, 1)) == ["transactions_y2024m01"]
+        assert (await session.execute(text(f"SELECT count(*) FROM {detached}"))).scalar_one() == 1
+    finally:
+        if detached:
+            await session.execute(text(f"DROP TABLE IF EXISTS {detached}"))
+            await session.commit()
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_reset_runs_in_background_batches(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.reset.RESET_BATCH_SIZE", 4)
+    batches = mocker.spy(reset_service, "_delete_batch")
+    mocker.patch("app.services.currency.CurrencyService.get_all_rates", return_value={"USD": 1})
+
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([food, UserDB(id=MOCK_USER["id"], base_currency="EUR")])
+    await session.commit()
+    session.add_all(
+        TransactionDB(
+            user_id=MOCK_USER["id"], category_id=food.id, amount=1, date=datetime(2024, 1, day + 1, tzinfo=UTC)
+        )
+        for day in range(10)
+    )
+    await session.commit()
+    assert (await client.get("/api/balance")).json()["balance"] == -10
+
+    response = await client.delete("/api/users/me/reset")
+    assert response.status_code == 202
+    job = await _wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "done", job
+    assert job["progress"] == {"total": 10, "deleted": 10}
+    assert job["result"] == {"deleted_transactions": 10}
+    # 4 + 4 + 2, then an empty batch ends the loop
+    assert batches.call_count == 4
+    assert (await client.get("/api/transactions")).json() == []
+    assert (await client.get("/api/balance")).json()["balance"] == 0
+    assert (await client.get("/api/users/me")).json()["base_currency"] == "USD"
+
+    # Jobs are only visible to their owner
+    app.dependency_overrides[verify_telegram_authentication] = lambda: {"id": "999"}
+    assert (await client.get(f"/api/users/me/jobs/{job['id']}")).status_code == 404
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_stored_and_abandoned_ones_do_not_block(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    # Left "running" by a worker that went away: no heartbeat for longer than JOB_STALE_AFTER
+    session.add(
+        JobDB(
+            id="lost",
+            user_id=MOCK_USER["id"],
+            kind="reset",
+            status="running",
+            updated_at=datetime.now(UTC) - timedelta(hours=1),
+        )
+    )
+    await session.commit()
+
+    lost = (await client.get("/api/users/me/jobs/lost")).json()
+    assert lost["status"] == "failed"
+    assert lost["error"].startswith("Interrupted")
+
+    response = await client.delete("/api/users/me/reset")
+    job_id = response.json()["job_id"]
+    assert job_id != "lost"
+    assert (await _wait_for_job(client, job_id))["status"] == "done"
+
+    # The state lives in the table, where any worker (or a restarted one) reads it
+    rows = (await session.execute(select(JobDB.id, JobDB.status).order_by(JobDB.created_at))).all()
+    assert rows == [("lost", "failed"), (job_id, "done")]
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_running_base_currency_change_blocks_other_targets(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    session.add(JobDB(id="eur", user_id=MOCK_USER["id"], kind="base_currency", target="EUR", status="running"))
+    await session.commit()
+
+    # The same change joins the running job; a different one would race it
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "eur"})
+    assert response.status_code == 202
+    assert response.json()["job_id"] == "eur"
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "GBP"})
+    assert response.status_code == 409
+    assert (await client.get("/api/users/me/jobs/eur")).json()["target"] == "EUR"
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_base_currency_change_blocks_nothing(client, session):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+
+    # Its worker went away before prune_jobs() has marked it failed
+    stale = datetime.now(UTC) - timedelta(hours=1)
+    session.add(
+        JobDB(
+            id="lost", user_id=MOCK_USER["id"], kind="base_currency", target="EUR", status="running", updated_at=stale
+        )
+    )
+    await session.commit()
+
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "GBP"})
+    assert response.status_code == 200, response.text
+    assert response.json()["new_currency"] == "GBP"
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "EUR"})
+    assert response.status_code == 200, response.text
+    assert response.json()["new_currency"] == "EUR"
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_base_currency_change_recalculates_in_one_update(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    rates = {("EUR", "KZT"): Decimal("500"), ("USD", "KZT"): Decimal("450"), ("KZT", "KZT"): Decimal("1")}
+    get_rate = mocker.patch(
+        "app.services.currency.CurrencyService.get_rate",
+        side_effect=lambda source, target, on=None: rates[(source, target)],
+    )
+
+    food = CategoryDB(name="Food", type="expense", user_id=MOCK_USER["id"])
+    session.add_all([food, UserDB(id=MOCK_USER["id"], base_currency="USD")])
+    await session.commit()
+    for amount, currency in [(10, "EUR"), (20, "EUR"), (5, "USD"), (1000, "KZT")]:
+        session.add(
+            TransactionDB(
+                user_id=MOCK_USER["id"], category_id=food.id, amount=amount, original_amount=amount, currency=currency
+            )
+        )
+    await session.commit()
+    assert (await client.get("/api/balance")).json()["balance"] == -1035
+
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "kzt"})
+    assert response.status_code == 200
+    assert response.json() == {"status": "updated", "recalculated_transactions": 4, "new_currency": "KZT"}
+    # One rate per distinct (currency, day)
+    assert get_rate.call_count == 3
+
+    amounts = sorted(float(tx["amount"]) for tx in (await client.get("/api/transactions")).json())
+    assert amounts == [1000.0, 2250.0, 5000.0, 10000.0]
+    assert float((await client.get("/api/balance")).json()["balance"]) == -18250.0
+    assert await find_balance_drift(session) == []
+
+    # Above the limit the same work runs as a job
+    mocker.patch("app.routers.users.CURRENCY_RECALC_SYNC_LIMIT", 2)
+    rates.update({("EUR", "EUR"): Decimal("1"), ("USD", "EUR"): Decimal("0.5"), ("KZT", "EUR"): Decimal("0.002")})
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "EUR"})
+    assert response.status_code == 202
+    job = await _wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "done", job
+    assert job["result"] == {"recalculated_transactions": 4, "new_currency": "EUR"}
+    assert float((await client.get("/api/balance")).json()["balance"]) == -34.5
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_user_settings_cache_saves_base_currency_queries(client, session, mocker):
+    app.dependency_overrides[verify_telegram_authentication] = lambda: MOCK_USER
+    mocker.patch("app.services.currency.CurrencyService.get_all_rates", return_value={})
+    get_rate = mocker.patch("app.services.currency.CurrencyService.get_rate", return_value=Decimal("2"))
+    user_id = MOCK_USER["id"]
+
+    food = CategoryDB(name="Food", type="expense", user_id=user_id)
+    session.add_all([food, UserDB(id=user_id, base_currency="EUR")])
+    await session.commit()
+
+    # The profile reads the settings with its ETag version (one query) and caches them for writes
+    with _recorded_statements(session) as statements:
+        assert (await client.get("/api/users/me")).json()["base_currency"] == "EUR"
+    assert len(statements) == 1
+    assert _settings_cache[user_id] == UserSettings("EUR")
+
+    # A stale cached value (its invalidation not received yet) never reaches the profile
+    _settings_cache[user_id] = UserSettings("JPY")
+    assert (await client.get("/api/users/me")).json()["base_currency"] == "EUR"
+    assert _settings_cache[user_id] == UserSettings("EUR")
+
+    # Counters are process-wide
+    stats = get_settings_cache_stats()
+
+    # Warm caches: one rate for the known base currency instead of a rate per currency
+    await client.get("/api/categories")
+    payload = {"amount": 10, "currency": "TRY", "category_id": food.id, "date": "2024-05-01"}
+    with _recorded_statements(session) as statements:
+        response = await client.post("/api/transactions", json=payload)
+    assert float(response.json()["amount"]) == 20.0
+    assert len(statements) == 1
+    assert [call.args[:2] for call in get_rate.call_args_list] == [("TRY", "EUR")]
+
+    # Changed by another process: the insert notices in its own statement and converts correctly
+    await session.execute(update(UserDB).where(UserDB.id == user_id).values(base_currency="USD"))
+    await session.commit()
+    get_rate.reset_mock()
+    response = await client.post("/api/transactions", json=payload)
+    assert response.status_code == 200
+    assert ("TRY", "USD") in [call.args[:2] for call in get_rate.call_args_list]
+    assert get_settings_cache_stats()["conflicts"] == stats["conflicts"] + 1
+    assert (await client.get("/api/users/me")).json()["base_currency"] == "USD"
+
+    # Our own change invalidates right away
+    response = await client.post("/api/users/me/settings/currency", json={"base_currency": "GBP"})
+    assert response.status_code == 200
+    assert (await client.get("/api/users/me")).json()["base_currency"] == "GBP"
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_runs_jobs_on_one_leader(db_engine):
+    """Only the worker holding the advisory lock runs a job; the others follow until it lets go."""
+    calls = []
+
+    def job(role: str, worker: str):
+        async def callback() -> float:
+            calls.append((worker, role))
+            return 3600
+
+        return callback
+
+    workers = {}
+    for worker in ["a", "b"]:
+        workers[worker] = Scheduler(db_engine, lock_key="sana_test_scheduler")
+        workers[worker].add_job("rates", job("run", worker), follow=job("follow", worker))
+
+    try:
+        await workers["a"].tick()
+        await workers["b"].tick()
+        assert calls == [("a", "run"), ("b", "follow")]
+        assert workers["a"].status() == {"leader": True, "jobs": {"rates": {"runs": 1, "last_run": "leader"}}}
+
+        # Not due yet: renewing the lease runs nothing
+        await workers["a"].tick()
+        assert len(calls) == 2
+
+        # Shutdown of the leader hands the jobs over on the next check
+        await workers["a"].release()
+        await workers["b"].tick()
+        assert calls[-1] == ("b", "run")
+        assert workers["b"].is_leader
+    finally:
+        for scheduler in workers.values():
+            await scheduler.release()
+
+
+async def _until(predicate, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bus_evicts_entries_in_other_workers(db_engine, session):
+    """A published invalidation evicts the user's entries in every other listening worker within a second."""
+    dsn = db_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    writer, reader = InvalidationBus(), InvalidationBus()
+    tasks = [asyncio.create_task(bus.start(dsn)) for bus in (writer, reader)]
+    try:
+        await _until(lambda: writer.status()["connected"] and reader.status()["connected"], timeout=5)
+        _category_cache[MOCK_USER["id"]] = (0, {})
+        _settings_cache[MOCK_USER["id"]] = UserSettings("EUR")
+
+        writer.publish(MOCK_USER["id"], "categories")
+        await _until(lambda: MOCK_USER["id"] not in _category_cache)
+        assert MOCK_USER["id"] in _settings_cache
+        # A worker skips its own notifications: it evicted locally before publishing
+        assert (writer.status()["received"], reader.status()["received"]) == (0, 1)
+
+        # Any session can publish, e.g. from SQL
+        await session.execute(text("SELECT pg_notify('sana_invalidate', :payload)"), {"payload": "12345:settings"})
+        await session.commit()
+        await _until(lambda: MOCK_USER["id"] not in _settings_cache)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_writes_notify_other_workers_when_they_commit(db_engine, session):
+    """bump_data_version() sends the invalidation from the write's transaction: only a commit delivers it."""
+    dsn = db_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    reader = InvalidationBus()
+    task = asyncio.create_task(reader.start(dsn))
+    try:
+        await _until(lambda: reader.status()["connected"], timeout=5)
+        _category_cache[MOCK_USER["id"]] = (0, {})
+        _settings_cache[MOCK_USER["id"]] = UserSettings("EUR")
+
+        await session.execute(bump_data_version(MOCK_USER["id"], invalidate=("categories", "settings")))
+        await session.rollback()
+        await asyncio.sleep(0.3)
+        assert reader.status()["received"] == 0
+        assert MOCK_USER["id"] in _category_cache and MOCK_USER["id"] in _settings_cache
+
+        await session.execute(bump_data_version(MOCK_USER["id"], invalidate=("categories", "settings")))
+        await session.commit()
+        await _until(lambda: MOCK_USER["id"] not in _category_cache and MOCK_USER["id"] not in _settings_cache)
+        assert reader.status()["received"] == 1
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,66 @@
+import hashlib
+import hmac
+import json
+import time
+import urllib.parse
+
+import pytest
+from fastapi import HTTPException
+
+from app import dependencies
+from app.dependencies import get_auth_cache_stats, verify_telegram_authentication
+
+TEST_BOT_TOKEN = "123456:TEST-TOKEN"
+TEST_SECRET = hmac.new(b"WebAppData", TEST_BOT_TOKEN.encode(), hashlib.sha256).digest()
+
+
+def _sign_init_data(user: dict, auth_date: int) -> str:
+    fields = {"auth_date": str(auth_date), "query_id": "AAHdF60UAAAAAN0XrRT9", "user": json.dumps(user)}
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    fields["hash"] = hmac.new(TEST_SECRET, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urllib.parse.urlencode(fields)
+
+
+@pytest.fixture(autouse=True)
+def bot_token(mocker):
+    mocker.patch.object(dependencies, "BOT_TOKEN", TEST_BOT_TOKEN)
+    mocker.patch.object(dependencies, "WEBAPP_SECRET_KEY", TEST_SECRET)
+    dependencies._auth_cache.clear()
+    yield
+    dependencies._auth_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_valid_init_data_is_cached():
+    init_data = _sign_init_data({"id": 42, "first_name": "Test"}, int(time.time()))
+    before = get_auth_cache_stats()
+
+    first = await verify_telegram_authentication(init_data)
+    second = await verify_telegram_authentication(init_data)
+
+    assert first == second == {"id": "42", "first_name": "Test"}
+    after = get_auth_cache_stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+
+@pytest.mark.asyncio
+async def test_tampered_init_data_is_rejected():
+    init_data = _sign_init_data({"id": 42}, int(time.time()))
+    await verify_telegram_authentication(init_data)
+
+    tampered = init_data.replace("42", "43")
+    with pytest.raises(HTTPException) as exc:
+        await verify_telegram_authentication(tampered)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stale_init_data_is_not_cached():
+    stale_date = int(time.time()) - dependencies.AUTH_MAX_AGE - 60
+    init_data = _sign_init_data({"id": 7}, stale_date)
+
+    user = await verify_telegram_authentication(init_data)
+
+    assert user["id"] == "7"
+    assert get_auth_cache_stats()["size"] == 0
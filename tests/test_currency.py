@@ -1,8 +1,11 @@
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 
+import httpx
 import pytest
 
-from app.services.currency import CurrencyService
+from app.services import currency
+from app.services.currency import EMPTY_RATES, CurrencyService, RateTable
 
 
 @pytest.mark.asyncio
@@ -27,7 +30,7 @@ async def test_currency_cross_rate_calculation(mocker):
     fake_rates = {"EUR": 0.9, "TRY": 30.0}
 
     # Bypass cache update
-    mocker.patch.object(service, "_rates", fake_rates)
+    mocker.patch.object(service, "_snapshot", RateTable(fake_rates))
 
     rate = await service.get_rate("EUR", "TRY")
 
@@ -44,10 +47,192 @@ async def test_currency_api_failure_fallback(mocker):
     if external API fails.
     """
     service = CurrencyService()
-    service._rates = {}  # Simulate empty cache
+    mocker.patch.object(service, "_snapshot", EMPTY_RATES)  # Simulate empty cache
     # Note: get_rate no longer calls API directly, so we don't need to mock httpx failures.
 
     rate = await service.get_rate("USD", "EUR")
 
     # Ensure fail-safe works
     assert rate == Decimal("1.00")
+
+
+@pytest.mark.asyncio
+async def test_all_rates_never_call_the_provider(mocker):
+    """Before the first refresh the profile gets no rates rather than waiting on the provider."""
+    service = CurrencyService()
+    mocker.patch.object(service, "_snapshot", EMPTY_RATES)
+    fetch = mocker.patch.object(service, "_update_rates_from_api")
+
+    assert await service.get_all_rates() == {}
+    fetch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rates_follow_the_transaction_date(session, mocker):
+    """Stored daily rates are loaded in one query and looked up by the UTC day of the conversion."""
+    service = CurrencyService()
+    mocker.patch.object(service, "_snapshot", RateTable({"EUR": 0.8}))
+    mocker.patch.object(service, "_history", {})
+    mocker.patch.object(service, "_history_range", None)
+
+    now = datetime.now(UTC)
+    today = now.date()
+    await service.save_rates(session, today - timedelta(days=10), RateTable({"EUR": 0.9, "TRY": 30.0}), now)
+    await service.save_rates(session, today - timedelta(days=7), RateTable({"EUR": 0.95, "TRY": 32.0}), now)
+    # Overwrites the day, e.g. the next hourly refresh
+    await service.save_rates(session, today - timedelta(days=7), RateTable({"EUR": 0.92, "TRY": 32.0}), now)
+
+    mocker.patch.object(service, "_history", {})
+    mocker.patch.object(service, "_history_range", None)
+    assert await service.load_history(session) == 2
+
+    assert await service.get_rate("EUR", "USD", on=today - timedelta(days=10)) == Decimal("1.00") / Decimal("0.9")
+    # Days between stored days carry the previous rates over
+    assert await service.get_rate("EUR", "USD", on=today - timedelta(days=8)) == Decimal("1.00") / Decimal("0.9")
+    # datetimes convert at their UTC day
+    week_ago = datetime.now(UTC) - timedelta(days=7)
+    assert await service.get_rate("EUR", "USD", on=week_ago) == Decimal("1.00") / Decimal("0.92")
+    # Before the history: oldest rates; after it: the latest ones
+    assert await service.get_rate("EUR", "USD", on=today - timedelta(days=30)) == Decimal("1.00") / Decimal("0.9")
+    assert await service.get_rate("EUR", "USD", on=today) == Decimal("1.00") / Decimal("0.8")
+    assert await service.get_rate("EUR", "USD") == Decimal("1.00") / Decimal("0.8")
+
+
+@pytest.mark.asyncio
+async def test_startup_serves_the_stored_snapshot(session, mocker):
+    """Without a refresh in this process, the newest stored rates are current and their age is reported."""
+    service = CurrencyService()
+    for attribute, value in [("_snapshot", EMPTY_RATES), ("_history", {}), ("_history_range", None)]:
+        mocker.patch.object(service, attribute, value)
+    mocker.patch.object(service, "_last_update", None)
+    mocker.patch.object(service, "_rates_source", None)
+    assert service.rates_status()["stale"] is True
+
+    fetched_at = datetime.now(UTC) - timedelta(hours=5)
+    await service.save_rates(session, fetched_at.date() - timedelta(days=1), RateTable({"EUR": 0.9}), fetched_at)
+    await service.save_rates(session, fetched_at.date(), RateTable({"EUR": 0.92}), fetched_at)
+    mocker.patch.object(service, "_snapshot", EMPTY_RATES)
+
+    await service.load_history(session)
+
+    assert await service.get_rate("EUR", "USD") == Decimal("1.00") / Decimal("0.92")
+    status = service.rates_status()
+    assert status["source"] == "snapshot"
+    assert status["currencies"] == 1
+    assert 5 * 3600 - 60 < status["age_seconds"] < 5 * 3600 + 60
+    assert status["stale"] is True
+
+
+def test_convert_uses_memoized_cross_rates(mocker):
+    """convert() is synchronous and computes each cross rate of a snapshot once."""
+    service = CurrencyService()
+    table = RateTable({"EUR": 0.9, "TRY": 30.0})
+    mocker.patch.object(service, "_snapshot", table)
+    eur_to_try = (Decimal("1.00") / Decimal("0.9")) * Decimal("30.0")
+
+    assert service.convert(Decimal("9"), "eur", "TRY") == Decimal("9") * eur_to_try
+    assert table._cross == {("EUR", "TRY"): eur_to_try}
+
+    # Unknown codes fall back to 1.00 without growing the memo
+    assert service.convert(Decimal("5"), "XXX", "USD") == Decimal("5")
+    assert list(table._cross) == [("EUR", "TRY")]
+
+    # The table itself cannot be modified
+    with pytest.raises(TypeError):
+        table.rates["EUR"] = Decimal("1")
+
+
+@pytest.mark.asyncio
+async def test_refresh_retries_with_backoff_and_honors_next_update(mocker):
+    """5xx responses are retried on the shared client; a 304 keeps the rates; refreshes wait for the provider."""
+    service = CurrencyService()
+    for attribute in ["_last_update", "_rates_source", "_provider_last_update", "_provider_next_update"]:
+        mocker.patch.object(service, attribute, None)
+    mocker.patch.object(service, "_snapshot", EMPTY_RATES)
+    mocker.patch.object(service, "_refresh_stats", dict.fromkeys(service._refresh_stats, 0))
+    mocker.patch.object(currency, "RATES_BACKOFF_BASE", 0)
+
+    published = datetime.now(UTC).replace(microsecond=0) - timedelta(hours=1)
+    next_update = published + timedelta(days=1)
+    requests = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) <= 2:
+            return httpx.Response(503)
+        if "If-Modified-Since" in request.headers:
+            return httpx.Response(304)
+        payload = {
+            "conversion_rates": {"USD": 1, "EUR": 0.9},
+            "time_last_update_unix": int(published.timestamp()),
+            "time_next_update_unix": int(next_update.timestamp()),
+        }
+        return httpx.Response(200, json=payload)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+        mocker.patch.object(service, "_http_client", client)
+
+        assert await service._update_rates_from_api("USD") is True
+        assert await service.get_rate("EUR", "USD") == Decimal("1.00") / Decimal("0.9")
+        assert service._provider_next_update == next_update
+        assert not service._provider_has_newer_rates()
+
+        # Conditional request: unchanged rates are not downloaded again
+        assert await service._update_rates_from_api("USD") is True
+        assert requests[-1].headers["If-Modified-Since"] == published.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+    status = service.rates_status()
+    assert status["stale"] is False
+    assert status["refresh"]["success"] == 1
+    assert status["refresh"]["not_modified"] == 1
+    assert status["refresh"]["retries"] == 2
+    assert status["refresh"]["requests"] == 4
+    assert status["refresh"]["avg_latency_ms"] is not None
+
+
+@pytest.mark.asyncio
+async def test_refresh_does_not_retry_client_errors(mocker):
+    """A 4xx other than 429 (e.g. a bad key) fails the refresh without retrying."""
+    service = CurrencyService()
+    mocker.patch.object(service, "_refresh_stats", dict.fromkeys(service._refresh_stats, 0))
+    mocker.patch.object(service, "_rates_source", None)
+    calls = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(403)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+        mocker.patch.object(service, "_http_client", client)
+        assert await service._update_rates_from_api("USD") is False
+
+    assert len(calls) == 1
+    assert service._refresh_stats["failure"] == 1
+
+
+@pytest.mark.asyncio
+async def test_followers_adopt_rates_stored_by_the_leader(session, mocker):
+    """Workers that do not call the provider pick up newer stored rates, including the announced next update."""
+    service = CurrencyService()
+    mocker.patch.object(service, "_history", {})
+    mocker.patch.object(service, "_history_range", None)
+    mocker.patch.object(service, "_provider_next_update", None)
+    mocker.patch.object(service, "_rates_source", "snapshot")
+
+    earlier = datetime.now(UTC) - timedelta(hours=2)
+    await service.save_rates(session, earlier.date(), RateTable({"EUR": 0.9}), earlier)
+    mocker.patch.object(service, "_snapshot", RateTable({"EUR": 0.9}))
+    mocker.patch.object(service, "_last_update", earlier)
+    assert await service._load_stored_since(session, earlier) == 0
+
+    # Another worker refreshed
+    now = datetime.now(UTC)
+    next_update = now + timedelta(hours=20)
+    await service.save_rates(session, now.date(), RateTable({"EUR": 0.8}), now, next_update)
+    mocker.patch.object(service, "_snapshot", RateTable({"EUR": 0.9}))
+
+    assert await service._load_stored_since(session, earlier) == 1
+    assert await service.get_rate("EUR", "USD") == Decimal("1.00") / Decimal("0.8")
+    assert service._last_update == now
+    assert service._provider_next_update == next_update
+    assert not service._provider_has_newer_rates()
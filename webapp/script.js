@@ -20,6 +20,7 @@ document.addEventListener("DOMContentLoaded", () => {
     ANALYTICS_SUMMARY: "/api/analytics/summary",
     ANALYTICS_CALENDAR: "/api/analytics/calendar",
     USER_RESET: "/api/users/me/reset",
+    USER_JOBS: "/api/users/me/jobs",
     USER_SETTINGS_CURRENCY: "/api/users/me/settings/currency",
     USER_PROFILE: "/api/users/me",
   };
@@ -60,6 +61,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // Infinite Scroll
     offset: 0,
+    nextCursor: null, // Keyset cursor from X-Next-Cursor (preferred over offset)
     limit: 100,
     isAllLoaded: false,
     isLoadingMore: false,
@@ -748,14 +750,19 @@ document.addEventListener("DOMContentLoaded", () => {
     state.isLoadingMore = true;
     if (!isAppend) {
       state.offset = 0;
+      state.nextCursor = null;
       state.isAllLoaded = false;
       state.transactions = [];
     }
 
     try {
-      const url = `${API_URLS.TRANSACTIONS}?limit=${state.limit}&offset=${state.offset}`;
+      const page = isAppend && state.nextCursor
+        ? `cursor=${encodeURIComponent(state.nextCursor)}`
+        : `offset=${state.offset}`;
+      const url = `${API_URLS.TRANSACTIONS}?limit=${state.limit}&${page}`;
       const response = await apiRequest(url);
       if (!response.ok) throw new Error("Network response was not ok");
+      state.nextCursor = response.headers.get("X-Next-Cursor");
 
       const newTransactions = await response.json();
 
@@ -888,9 +895,15 @@ document.addEventListener("DOMContentLoaded", () => {
     showScreen("full-form-screen");
   }
 
-  async function deleteTransaction(txId) {
+  // The stored date lets the server go straight to the transaction's monthly partition
+  function transactionUrl(txId, storedDate = null) {
+    const url = `${API_URLS.TRANSACTIONS}/${txId}`;
+    return storedDate ? `${url}?date=${encodeURIComponent(storedDate)}` : url;
+  }
+
+  async function deleteTransaction(txId, storedDate = null) {
     try {
-      const response = await apiRequest(`${API_URLS.TRANSACTIONS}/${txId}`, { method: "DELETE" });
+      const response = await apiRequest(transactionUrl(txId, storedDate), { method: "DELETE" });
       if (!response.ok) {
         return false;
       }
@@ -930,7 +943,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
         updateBalanceLocally(-tx.amount, tx.type);
 
-        const success = await deleteTransaction(txId);
+        const success = await deleteTransaction(txId, tx.date);
         
         if (!success) {
            // Revert
@@ -949,13 +962,13 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
-  async function _saveTransaction(txData, txId = null) {
+  async function _saveTransaction(txData, txId = null, storedDate = null) {
     let url = API_URLS.TRANSACTIONS;
     let method = "POST";
     let body = txData;
 
     if (txId) {
-      url = `${API_URLS.TRANSACTIONS}/${txId}`;
+      url = transactionUrl(txId, storedDate);
       method = "PATCH";
       body = { ...txData };
     }
@@ -1298,7 +1311,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
       const txId = state.editTransaction.id;
       // Optimistic Edit
-      await handleOptimisticEdit(txData, txId, _saveTransaction(txData, txId));
+      await handleOptimisticEdit(txData, txId, _saveTransaction(txData, txId, state.editTransaction.date));
       
       DOM.fullForm.saveBtn.disabled = false;
       state.editTransaction = null;
@@ -1407,13 +1420,28 @@ document.addEventListener("DOMContentLoaded", () => {
     DOM.quickModal.saveBtn.disabled = false;
   }
 
-  function openDaySheet(date) {
+  async function fetchDayTransactions(date) {
+    // Local day boundaries, filtered server-side so days beyond the loaded pages are complete too
+    const dayStart = new Date(date.getFullYear(), date.getMonth(), date.getDate());
+    const dayEnd = new Date(date.getFullYear(), date.getMonth(), date.getDate() + 1);
+    const params = new URLSearchParams({ from: dayStart.toISOString(), to: dayEnd.toISOString(), limit: 200 });
+    const response = await apiRequest(`${API_URLS.TRANSACTIONS}?${params}`);
+    if (!response.ok) throw new Error("Network response was not ok");
+    return response.json();
+  }
+
+  async function openDaySheet(date) {
     DOM.daySheet.title.textContent = formatDateForTitle(date);
-    const selectedDateString = getLocalDateString(date);
-    const dayTransactions = state.transactions.filter((tx) => {
-      const txDate = parseDateFromUTC(tx.date);
-      return getLocalDateString(txDate) === selectedDateString;
-    });
+    let dayTransactions;
+    try {
+      dayTransactions = await fetchDayTransactions(date);
+    } catch (error) {
+      const selectedDateString = getLocalDateString(date);
+      dayTransactions = state.transactions.filter((tx) => {
+        const txDate = parseDateFromUTC(tx.date);
+        return getLocalDateString(txDate) === selectedDateString;
+      });
+    }
 
     DOM.daySheet.list.innerHTML = "";
     if (dayTransactions.length === 0) {
@@ -1630,7 +1658,7 @@ document.addEventListener("DOMContentLoaded", () => {
              if (index > -1) state.transactions.splice(index, 1);
 
              // API Call
-             const success = await deleteTransaction(txId);
+             const success = await deleteTransaction(txId, tx && tx.date);
 
              if (!success) {
                   // Revert
@@ -1905,6 +1933,16 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // --- SETTINGS ---
+  async function waitForJob(jobId, intervalMs = 500) {
+    while (true) {
+      const response = await apiRequest(`${API_URLS.USER_JOBS}/${jobId}`);
+      if (!response.ok) throw new Error("Job status unavailable");
+      const job = await response.json();
+      if (job.status === "done" || job.status === "failed") return job;
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  }
+
   async function handleResetData() {
     DOM.settings.resetDataBtn.disabled = true;
     DOM.settings.resetDataBtn.textContent = "Resetting...";
@@ -1921,6 +1959,7 @@ document.addEventListener("DOMContentLoaded", () => {
     state.transactions = [];
     state.categories = []; // Will be re-fetched 
     state.offset = 0;
+    state.nextCursor = null;
     state.isAllLoaded = true;
 
     // Clear Storage
@@ -1965,6 +2004,11 @@ document.addEventListener("DOMContentLoaded", () => {
       const response = await apiRequest(API_URLS.USER_RESET, { method: "DELETE" });
       if (!response.ok) throw new Error("Reset failed");
 
+      // The server deletes in the background; wait for it before reloading
+      const { job_id: jobId } = await response.json();
+      const job = await waitForJob(jobId);
+      if (job.status !== "done") throw new Error(job.error || "Reset failed");
+
       // Success: Re-fetch default categories (created by server on reset)
       await loadAllCategories();
       // We can also re-fetch transactions to be 100% sure we are in sync (should be empty)
@@ -2478,6 +2522,12 @@ document.addEventListener("DOMContentLoaded", () => {
           body: JSON.stringify({ base_currency: newCurrency }),
         });
         if (!response.ok) throw new Error("Failed to update currency");
+        // Large histories are recalculated in the background (202 + job id)
+        if (response.status === 202) {
+          const { job_id: jobId } = await response.json();
+          const job = await waitForJob(jobId);
+          if (job.status !== "done") throw new Error(job.error || "Failed to update currency");
+        }
         state.baseCurrencyCode = newCurrency;
         state.currencySymbol = CURRENCY_SYMBOLS[newCurrency] || "$";
         tg.CloudStorage.setItem("currency_symbol", state.currencySymbol);
@@ -2633,6 +2683,7 @@ document.addEventListener("DOMContentLoaded", () => {
           const txData = await transactionsRes.json();
           state.transactions = txData;
           state.offset = txData.length;
+          state.nextCursor = transactionsRes.headers.get("X-Next-Cursor");
           if (txData.length < state.limit) state.isAllLoaded = true;
           renderTransactions(state.transactions);
         }